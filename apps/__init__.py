@@ -1,13 +1,13 @@
-import os
-
-from flask import Flask
+from flask import Flask, g
 from flask_login import LoginManager
-from flask_sqlalchemy import SQLAlchemy
 from importlib import import_module
 from flask_migrate import Migrate
+from apps.assets import init_assets
+from apps.database import RoutingSQLAlchemy, mark_primary_sticky
+from apps.serialization import AppJSONEncoder
 
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 login_manager = LoginManager()
 
 
@@ -25,20 +25,20 @@ def register_blueprints(app):
 
 def configure_database(app):
 
-    @app.before_first_request
-    def initialize_database():
-        try:
-            db.create_all()
-        except Exception as e:
-
-            print('> Error: DBMS Exception: ' + str(e) )
-
-            # fallback to SQLite
-            basedir = os.path.abspath(os.path.dirname(__file__))
-            app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'db.sqlite3')
-
-            print('> Fallback to SQLite ')
-            db.create_all()
+    # Schema creation is an explicit deploy step (`flask init-db`), not part of serving
+    # requests. Only the primary is created; the replica receives it through replication.
+    @app.cli.command('init-db')
+    def init_db():
+        """Create any missing tables on the primary database."""
+        db.create_all(bind=None)
+        print('> Database tables created: ' + app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1])
+
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        # Read-your-writes: this user's next reads skip the replica until it has caught up
+        if g.get('db_wrote'):
+            mark_primary_sticky()
+        return response
 
     @app.teardown_request
     def shutdown_session(exception=None):
@@ -48,7 +48,9 @@ def configure_database(app):
 def create_app(config):
     app = Flask(__name__)
     app.config.from_object(config)
+    app.json_encoder = AppJSONEncoder
     register_extensions(app)
+    init_assets(app)
     register_blueprints(app)
     configure_database(app)
     # Assuming `app` is your Flask application and `db` is the SQLAlchemy database instance
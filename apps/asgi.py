@@ -0,0 +1,85 @@
+"""
+ASGI entry point pieces.
+
+create_asgi_app() serves a small table of native-async endpoints directly
+on the event loop and hands every other request to the Flask app through
+asgiref's WsgiToAsgi, which runs it in a thread pool. Served by uvicorn:
+
+    uvicorn asgi:application --workers 4
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+from asgiref.wsgi import WsgiToAsgi
+
+from apps.async_db import dispose_async_db, init_async_db
+from apps.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def header(scope, name: bytes) -> Optional[str]:
+    """First value of a request header; name must be lowercase bytes."""
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def read_body(receive, limit: int) -> bytes:
+    """Read the request body, raising BodyTooLarge past limit bytes."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def send_json(send, obj: Dict[str, Any], status: int = 200):
+    body = dumps(obj)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def create_asgi_app(flask_app):
+    from apps.trading import async_routes
+
+    # (method, path) -> ASGI callable
+    native_routes = {
+        ('POST', '/trading/webhook'): async_routes.webhook,
+    }
+    wsgi = WsgiToAsgi(flask_app)
+    init_async_db(flask_app)
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await dispose_async_db()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] == 'http':
+            endpoint = native_routes.get((scope['method'], scope['path']))
+            if endpoint is not None:
+                return await endpoint(scope, receive, send)
+        return await wsgi(scope, receive, send)
+
+    return application
@@ -0,0 +1,163 @@
+"""
+Static asset pipeline.
+
+`flask build-assets` minifies the CSS/JS under static/assets, writes a
+content-hashed copy next to each file (css/adminlte.min.<hash>.css, so
+relative url()s and source maps keep resolving) with precompressed .gz and,
+when the brotli package is installed, .br siblings for nginx's *_static
+modules, and records original -> hashed paths in manifest.json.
+
+At runtime AssetLoader rewrites /static/assets/... references in template
+source to the hashed names and strips indentation and comments from the HTML
+once, when Jinja compiles the template. Compiled templates are cached by
+Jinja, so nothing is minified per response.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from jinja2 import BaseLoader
+
+ASSETS_URL = '/static/assets/'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 10
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{%d}\.(css|js)$' % HASH_LENGTH)
+# Fingerprinted assets never change under the same URL
+IMMUTABLE_MAX_AGE = 31536000
+
+ASSET_REFERENCE = re.compile(re.escape(ASSETS_URL) + r'''([^"'\s?#)]+)''')
+# Blocks whose whitespace is significant; left untouched by minify_html()
+PRESERVED_BLOCK = re.compile(r'(<(pre|textarea|script)\b.*?</\2\s*>)', re.S | re.I)
+HTML_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.S)
+LEADING_WHITESPACE = re.compile(r'^[ \t]+', re.M)
+BLANK_LINES = re.compile(r'\n{2,}')
+
+
+def _minify(path, content):
+    """Minified CSS/JS source; files already shipped as .min are left as they are."""
+    if '.min.' in os.path.basename(path):
+        return content
+    if path.endswith('.css'):
+        import rcssmin
+        return rcssmin.cssmin(content.decode('utf-8')).encode('utf-8')
+    import jsmin
+    return jsmin.jsmin(content.decode('utf-8'), quote_chars='\'"`').encode('utf-8')
+
+
+def _compressed(path, content):
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(path + '.br', 'wb') as f:
+        f.write(brotli.compress(content))
+
+
+def _remove_previous_build(assets_dir):
+    for root, _, files in os.walk(assets_dir):
+        for name in files:
+            base = name[:-3] if name.endswith(('.gz', '.br')) else name
+            if FINGERPRINTED.search(base):
+                os.remove(os.path.join(root, name))
+
+
+def build_assets(assets_dir):
+    """Minify and fingerprint every CSS/JS file under assets_dir; returns the manifest."""
+    _remove_previous_build(assets_dir)
+    manifest = {}
+    for root, _, files in os.walk(assets_dir):
+        for name in sorted(files):
+            if not name.endswith(('.css', '.js')):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                content = _minify(path, f.read())
+            digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+            stem, ext = os.path.splitext(name)
+            hashed = os.path.join(root, f'{stem}.{digest}{ext}')
+            with open(hashed, 'wb') as f:
+                f.write(content)
+            _compressed(hashed, content)
+            manifest[os.path.relpath(path, assets_dir).replace(os.sep, '/')] = \
+                os.path.relpath(hashed, assets_dir).replace(os.sep, '/')
+
+    with open(os.path.join(assets_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=0, sort_keys=True)
+    return manifest
+
+
+def load_manifest(assets_dir):
+    try:
+        with open(os.path.join(assets_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def rewrite_asset_urls(source, manifest):
+    return ASSET_REFERENCE.sub(lambda m: ASSETS_URL + manifest.get(m.group(1), m.group(1)), source)
+
+
+def minify_html(source):
+    """Drop indentation, blank lines and comments outside <pre>, <textarea> and <script>."""
+    parts = PRESERVED_BLOCK.split(source)
+    out = []
+    # split() yields text, block, tag name, text, block, tag name, ...
+    for index in range(0, len(parts), 3):
+        text = parts[index]
+        # Comments wrapping template tags may hold blocks or macros, keep those
+        text = HTML_COMMENT.sub(lambda m: m.group(0) if '{%' in m.group(0) or '{{' in m.group(0) else '', text)
+        text = LEADING_WHITESPACE.sub('', text)
+        out.append(BLANK_LINES.sub('\n', text))
+        if index + 1 < len(parts):
+            out.append(parts[index + 1])
+    return ''.join(out)
+
+
+class AssetLoader(BaseLoader):
+    """Wraps the app's template loader to fingerprint asset URLs and minify HTML at compile time."""
+
+    def __init__(self, loader, manifest, minify=True):
+        self.loader = loader
+        self.manifest = manifest
+        self.minify = minify
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = self.loader.get_source(environment, template)
+        if self.manifest:
+            source = rewrite_asset_urls(source, self.manifest)
+        if self.minify and template.endswith('.html'):
+            source = minify_html(source)
+        return source, filename, uptodate
+
+    def list_templates(self):
+        return self.loader.list_templates()
+
+
+def init_assets(app):
+    """Install AssetLoader and far-future caching of fingerprinted files served by Flask."""
+    assets_dir = os.path.join(app.static_folder, 'assets')
+    if not app.debug:
+        # In debug, templates reference the source files so edits show up without a rebuild
+        loader = AssetLoader(app.create_global_jinja_loader(), load_manifest(assets_dir))
+        app.jinja_options = dict(app.jinja_options, loader=loader)
+
+    default_max_age = app.get_send_file_max_age
+
+    def get_send_file_max_age(filename):
+        if filename and FINGERPRINTED.search(filename):
+            return IMMUTABLE_MAX_AGE
+        return default_max_age(filename)
+
+    app.get_send_file_max_age = get_send_file_max_age
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Minify and fingerprint static CSS/JS and write the asset manifest."""
+        built = build_assets(assets_dir)
+        print(f'> Built {len(built)} assets into {assets_dir}')
@@ -0,0 +1,59 @@
+"""
+Async SQLAlchemy engine for the native-async request paths served under ASGI.
+
+The models are the regular Flask-SQLAlchemy ones; only the session differs.
+AsyncSession never lazy-loads, so queries on this path must load every
+relationship they touch up front.
+"""
+
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from apps.database import async_engine_options
+
+# Sync driver URL prefix -> async driver
+ASYNC_DRIVERS = {
+    'postgres://': 'postgresql+asyncpg://',
+    'postgresql://': 'postgresql+asyncpg://',
+    'postgresql+psycopg2://': 'postgresql+asyncpg://',
+    'sqlite://': 'sqlite+aiosqlite://',
+    'mysql://': 'mysql+aiomysql://',
+    'mysql+pymysql://': 'mysql+aiomysql://',
+}
+
+_engine = None
+_session_factory = None
+
+
+def async_database_url(url: str) -> str:
+    """Map the configured sync database URL to its async driver equivalent."""
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            url = async_prefix + url[len(prefix):]
+            break
+    if url.startswith('postgresql+asyncpg') and os.getenv('DB_PGBOUNCER', 'false').lower() in ('1', 'true', 'yes'):
+        url += ('&' if '?' in url else '?') + 'prepared_statement_cache_size=0'
+    return url
+
+
+def init_async_db(app):
+    """Create the async engine from the app's SQLALCHEMY_DATABASE_URI."""
+    global _engine, _session_factory
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    _engine = create_async_engine(async_database_url(uri), **async_engine_options(uri))
+    _session_factory = sessionmaker(_engine, class_=AsyncSession, expire_on_commit=False)
+    return _engine
+
+
+def async_session() -> AsyncSession:
+    """New AsyncSession; use as `async with async_session() as session:`."""
+    if _session_factory is None:
+        raise RuntimeError('Async database is not initialized; call init_async_db(app) first')
+    return _session_factory()
+
+
+async def dispose_async_db():
+    if _engine is not None:
+        await _engine.dispose()
@@ -3,8 +3,12 @@
 Copyright (c) 2019 - present AppSeed.us
 """
 
+import hashlib
+import os
+import time
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy.orm import joinedload
 
 from apps import db, login_manager
 
@@ -18,6 +22,7 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(64), unique=True)
     email = db.Column(db.String(64), unique=True)
     password = db.Column(db.LargeBinary)
+    api_token_hash = db.Column(db.String(64), unique=True, index=True, nullable=True)  # sha256 of the API token
 
     roles = db.relationship('Role', secondary='user_roles', backref=db.backref('users', lazy='dynamic'))
     profile = db.relationship('UserProfile', backref='user', uselist=False, cascade='all, delete-orphan')
@@ -35,6 +40,7 @@ class User(db.Model, UserMixin):
         db.session.add(self)
         if commit:
             db.session.commit()
+            invalidate_cached_user(self.id)
 
     def __init__(self, **kwargs):
         for property, value in kwargs.items():
@@ -107,6 +113,7 @@ class UserProfile(db.Model):
         db.session.add(self)
         if commit:
             db.session.commit()
+            invalidate_cached_user(self.user_id)
 
     def delete(self, commit=True):
         """Delete the profile from the database."""
@@ -153,14 +160,97 @@ class Notification(db.Model):
     read_at = db.Column(db.DateTime)
 
 
+class CachedUser(UserMixin):
+    """
+    Lightweight, session-independent snapshot of a user's identity and roles,
+    returned by the user_loader. Only id, username, email and roles are cached;
+    anything else raises AttributeError, so use load() for the full User row.
+    """
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.roles = frozenset(role.name for role in user.roles)
+
+    def has_role(self, role_name):
+        """Check if the user has a specific role."""
+        return role_name in self.roles
+
+    def load(self):
+        """The full User row, queried on every call."""
+        return User.query.get(self.id)
+
+    def __repr__(self):
+        return str(self.username)
+
+
+# user_id -> (expires_at, CachedUser)
+_user_cache = {}
+USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 60))
+
+
+def invalidate_cached_user(user_id):
+    """Drop a user's cached identity after a role or profile change."""
+    if user_id is not None:
+        _user_cache.pop(int(user_id), None)
+
+
 @login_manager.user_loader
 def user_loader(id):
-    return User.query.filter_by(id=id).first()
+    user_id = int(id)
+    entry = _user_cache.get(user_id)
+    now = time.monotonic()
+    if entry and entry[0] > now:
+        return entry[1]
+
+    user = User.query.options(joinedload(User.roles)).filter_by(id=user_id).first()
+    if not user:
+        _user_cache.pop(user_id, None)
+        return None
+    cached = CachedUser(user)
+    _user_cache[user_id] = (now + USER_CACHE_TTL, cached)
+    return cached
+
+
+# sha256(token) -> (expires_at, user_id or None); misses are cached too
+_token_cache = {}
+TOKEN_CACHE_MAX_SIZE = 10000
+
+
+def hash_api_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def invalidate_cached_tokens():
+    """Forget all cached token lookups, e.g. after a token is issued or revoked."""
+    _token_cache.clear()
+
+
+def load_user_from_token(token):
+    """Resolve an API token to a cached user identity, touching the DB at most once per TTL."""
+    token_hash = hash_api_token(token)
+    now = time.monotonic()
+    entry = _token_cache.get(token_hash)
+    if entry is None or entry[0] <= now:
+        row = db.session.query(User.id).filter_by(api_token_hash=token_hash).first()
+        if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+            _token_cache.clear()
+        entry = (now + USER_CACHE_TTL, row.id if row else None)
+        _token_cache[token_hash] = entry
+    return user_loader(entry[1]) if entry[1] is not None else None
 
 
 @login_manager.request_loader
 def request_loader(request):
-    username = request.form.get('username')
-    user = User.query.filter_by(username=username).first()
-    return user if user else None
+    """
+    Session-less authentication for API clients via 'Authorization: Bearer <token>'.
+    Requests without the header (form posts, TradingView webhooks) are not
+    looked up at all; webhooks authenticate with their own passphrase check.
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    token = auth_header[len('Bearer '):].strip()
+    return load_user_from_token(token) if token else None
 
@@ -133,6 +133,17 @@ def create_role():
     else:
         return jsonify({'status': 'error', 'message': result['message']}), 400
     
+
+@blueprint.route('/api-token', methods=['POST'])
+@login_required
+def generate_api_token():
+    result = UserService.generate_api_token(current_user.id)
+
+    if result['status'] == 'success':
+        return jsonify({'status': 'success', 'token': result['token']}), 201
+    else:
+        return jsonify({'status': 'error', 'message': result['message']}), 400
+
     
 # @blueprint.route('/change-password', methods=['GET', 'POST'])
 # @login_required
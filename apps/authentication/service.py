@@ -1,8 +1,9 @@
+import secrets
 from flask_login import current_user, login_user, logout_user
 from werkzeug.security import generate_password_hash
 from apps import db
-from apps.authentication.util import verify_pass
-from apps.authentication.models import Role, User, UserProfile
+from apps.authentication.util import HashingBusy, verify_pass_bounded
+from apps.authentication.models import Role, User, UserProfile, hash_api_token, invalidate_cached_tokens, invalidate_cached_user
 
 class UserService:
     @staticmethod
@@ -47,13 +48,39 @@ class UserService:
 
         # Check if user exists
         user = User.query.filter((User.username == username_or_email) | (User.email == username_or_email)).first()
-        if user and verify_pass(password, user.password):
+        try:
+            valid = user is not None and verify_pass_bounded(password, user.password)
+        except HashingBusy:
+            return {'status': 'error', 'message': 'Too many login attempts in progress. Please try again.'}
+        if valid:
             # Assuming the use of Flask-Login for session management
             login_user(user)
             return {'status': 'success', 'message': 'User authenticated successfully.'}
         
         return {'status': 'error', 'message': 'Invalid username/email or password.'}
 
+    @staticmethod
+    def generate_api_token(user_id):
+        """
+        Issues a new API token for a user, replacing any previous one.
+        Only the token's hash is stored, so the plain token is returned once.
+        :param user_id: ID of the user.
+        :return: Status and the new token.
+        """
+        user = User.query.get(user_id)
+        if not user:
+            return {'status': 'error', 'message': 'User not found.'}
+
+        token = secrets.token_urlsafe(32)
+        try:
+            user.api_token_hash = hash_api_token(token)
+            db.session.commit()
+            invalidate_cached_tokens()
+            return {'status': 'success', 'message': 'API token generated successfully.', 'token': token}
+        except Exception as e:
+            db.session.rollback()
+            return {'status': 'error', 'message': f'Failed to generate API token: {e}'}
+
     @staticmethod
     def initialize_user_profile(user_id):
         """
@@ -127,6 +154,7 @@ class UserService:
 
         user.roles.append(role)
         db.session.commit()
+        invalidate_cached_user(user.id)
         return {'status': 'success', 'message': f'Role {role_name} assigned to user {user.username} successfully.'}
 
     @staticmethod
@@ -153,6 +181,7 @@ class UserService:
 
         user.roles.remove(role)
         db.session.commit()
+        invalidate_cached_user(user.id)
         return {'status': 'success', 'message': f'Role {role_name} removed from user {user.username} successfully.'}
     
     @staticmethod
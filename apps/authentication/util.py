@@ -5,7 +5,9 @@ Copyright (c) 2019 - present AppSeed.us
 
 import os
 import hashlib
+import hmac
 import binascii
+import threading
 
 # Inspiration -> https://www.vitoshacademy.com/hashing-passwords-in-python/
 
@@ -31,4 +33,27 @@ def verify_pass(provided_password, stored_password):
                                   salt.encode('ascii'),
                                   100000)
     pwdhash = binascii.hexlify(pwdhash).decode('ascii')
-    return pwdhash == stored_password
+    return hmac.compare_digest(pwdhash, stored_password)
+
+
+# PBKDF2 releases the GIL, so hashes run on the request thread; a semaphore bounds
+# how many run at once so a burst of logins can't monopolise the worker's CPU.
+AUTH_HASH_WORKERS = int(os.getenv('AUTH_HASH_WORKERS', 2))
+# How long a login waits for a free slot before it is turned away
+AUTH_HASH_WAIT = float(os.getenv('AUTH_HASH_WAIT', 0.5))
+_hash_slots = threading.BoundedSemaphore(AUTH_HASH_WORKERS)
+
+
+class HashingBusy(Exception):
+    """Every hashing slot is taken."""
+
+
+def verify_pass_bounded(provided_password, stored_password, wait=AUTH_HASH_WAIT):
+    """Verify a password while holding a hashing slot; raises HashingBusy if none frees up within wait seconds"""
+
+    if not _hash_slots.acquire(timeout=wait):
+        raise HashingBusy()
+    try:
+        return verify_pass(provided_password, stored_password)
+    finally:
+        _hash_slots.release()
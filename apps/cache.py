@@ -0,0 +1,158 @@
+"""
+Fragment cache for rendered dashboard pages.
+
+Keys carry the version of the data they were rendered from (see
+TradingBot.cache_version), so entries are never invalidated explicitly:
+bumping a bot's version makes its old entries unreachable and they age out.
+The backend is chosen by FRAGMENT_CACHE_URL:
+
+    (unset)                 in-process LRU of FRAGMENT_CACHE_MAX_ENTRIES entries
+    redis://host:6379/0     shared across workers; any Redis-protocol server, needs the redis package
+    fake://                 in-process stand-in for the Redis client, for tests
+    none://                 disabled
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_CACHE_URL = os.getenv('FRAGMENT_CACHE_URL', '')
+FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', 300))
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 1024))
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str, ttl: int = FRAGMENT_CACHE_TTL):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FakeRedis:
+    """The slice of the redis.Redis API that RedisCache uses, held in memory."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}  # name -> (expires_at or None, bytes)
+
+    def get(self, name):
+        with self.lock:
+            entry = self.data.get(name)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                del self.data[name]
+                return None
+            return entry[1]
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        with self.lock:
+            self.data[name] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(self.data.pop(name, None) is not None for name in names)
+
+    def flushdb(self):
+        with self.lock:
+            self.data.clear()
+        return True
+
+
+class RedisCache:
+    """Fragment cache on a Redis-API client. Errors are logged and treated as misses."""
+
+    def __init__(self, client, prefix: str = 'fragment:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f'Fragment cache get failed: {str(e)}')
+            return None
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key: str, value: str, ttl: int = FRAGMENT_CACHE_TTL):
+        try:
+            self.client.set(self.prefix + key, value.encode('utf-8'), ex=max(1, int(ttl)))
+        except Exception as e:
+            logger.warning(f'Fragment cache set failed: {str(e)}')
+
+    def delete(self, key: str):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            logger.warning(f'Fragment cache delete failed: {str(e)}')
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class NullCache:
+
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def set(self, key: str, value: str, ttl: int = FRAGMENT_CACHE_TTL):
+        pass
+
+    def delete(self, key: str):
+        pass
+
+    def clear(self):
+        pass
+
+
+def create_cache(url: str = FRAGMENT_CACHE_URL):
+    """Cache backend for a FRAGMENT_CACHE_URL value."""
+    if not url:
+        return LRUCache()
+    if url.startswith('none:'):
+        return NullCache()
+    if url.startswith('fake:'):
+        return RedisCache(FakeRedis())
+    if url.startswith(('redis:', 'rediss:', 'unix:')):
+        import redis  # Optional dependency, only needed for a shared cache
+        return RedisCache(redis.Redis.from_url(url, socket_timeout=0.25))
+    raise ValueError(f'Unsupported FRAGMENT_CACHE_URL: {url}')
+
+
+fragment_cache = create_cache()
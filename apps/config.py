@@ -5,6 +5,8 @@ Copyright (c) 2019 - present AppSeed.us
 
 import os, random, string
 
+from apps.database import engine_options
+
 class Config(object):
 
     basedir = os.path.abspath(os.path.dirname(__file__))
@@ -55,6 +57,15 @@ class Config(object):
         # This will create a file in <app> FOLDER
         SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'db.sqlite3') 
 
+    # Pool sizing, pre-ping and statement caching, see apps/database.py
+    PROCESS_TYPE = os.getenv('PROCESS_TYPE', 'web')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, PROCESS_TYPE)
+
+    # Optional read replica for the dashboard/marketplace reads, see apps.database.read_replica
+    DB_REPLICA_URL = os.getenv('DB_REPLICA_URL')
+    if DB_REPLICA_URL:
+        SQLALCHEMY_BINDS = {'replica': DB_REPLICA_URL}
+
     # RabbitMQ Configuration
     CLOUDAMQP_URL = os.getenv('CLOUDAMQP_URL', 'your-default-cloudamqp-url-if-any')
 
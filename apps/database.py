@@ -0,0 +1,292 @@
+"""
+Database engine configuration and connection pool metrics.
+
+engine_options() builds SQLALCHEMY_ENGINE_OPTIONS from the environment,
+with pool defaults sized per process type (PROCESS_TYPE=web|worker):
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW   pool size and burst connections
+    DB_POOL_TIMEOUT                 seconds to wait for a free connection
+    DB_POOL_RECYCLE                 seconds before a connection is replaced
+    DB_CONNECT_TIMEOUT              seconds to establish a connection
+    DB_STATEMENT_TIMEOUT_MS         server-side statement timeout, 0 disables
+    DB_QUERY_CACHE_SIZE             SQLAlchemy compiled statement cache entries
+    DB_PGBOUNCER                    'true' behind PgBouncer in transaction mode
+
+Service methods decorated with @read_replica run their queries against the
+'replica' bind (SQLALCHEMY_BINDS, from DB_REPLICA_URL) when one is configured:
+
+    DB_REPLICA_MAX_LAG              seconds of replay lag before reads fall back to the primary
+    DB_REPLICA_CHECK_INTERVAL       seconds between replica lag probes
+    DB_REPLICA_STICKY_SECONDS       seconds a user reads from the primary after their own write
+"""
+
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, session as flask_session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event, orm, text
+from sqlalchemy.pool import NullPool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 5))
+REPLICA_STICKY_SECONDS = float(os.getenv('DB_REPLICA_STICKY_SECONDS', 10))
+
+# Flask session key holding the wall-clock time until which the user reads from the primary
+PRIMARY_UNTIL_KEY = '_db_primary_until'
+
+# 0 when the standby has replayed everything it received, else seconds since the last replayed
+# commit; NULL on a server that is not in recovery
+REPLICA_LAG_SQL = text(
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+# Rows fetched per round trip by server-side cursors (Query.yield_per) in streaming responses
+STREAM_YIELD_PER = int(os.getenv('DB_STREAM_YIELD_PER', 500))
+
+# Process type -> (pool_size, max_overflow). Web workers serve many short
+# requests; background workers hold few long transactions.
+POOL_DEFAULTS = {
+    'web': (5, 10),
+    'worker': (2, 2),
+}
+
+
+def _env_flag(name, default='false'):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+class PoolMetrics:
+    """Process-wide counters for connection checkouts and the time spent waiting for them."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_avg': round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.record(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(uri, process_type=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the given database URI and process type."""
+    if not uri or uri.startswith('sqlite'):
+        # SQLite uses SQLAlchemy's own pool selection and takes no pool sizing
+        return {}
+
+    process_type = process_type or os.getenv('PROCESS_TYPE', 'web')
+    pool_size, max_overflow = POOL_DEFAULTS.get(process_type, POOL_DEFAULTS['web'])
+    pgbouncer = _env_flag('DB_PGBOUNCER')
+
+    options = {
+        'pool_pre_ping': True,
+        'query_cache_size': int(os.getenv('DB_QUERY_CACHE_SIZE', 1200)),
+    }
+
+    if pgbouncer and _env_flag('DB_PGBOUNCER_NULLPOOL', 'true'):
+        # PgBouncer already pools; holding idle connections here only pins server slots
+        options['poolclass'] = NullPool
+    else:
+        options.update({
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': int(os.getenv('DB_POOL_SIZE', pool_size)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', max_overflow)),
+            'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        })
+
+    if uri.startswith(('postgresql', 'postgres')):
+        connect_args = {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            'application_name': f'tradingbot-{process_type}',
+        }
+        statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))
+        if statement_timeout and not pgbouncer:
+            # Startup parameters are rejected by PgBouncer in transaction mode
+            connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+        options['connect_args'] = connect_args
+        # Batch executemany (bulk inserts/updates) into multi-row VALUES / execute_batch pages
+        options['executemany_mode'] = 'values_plus_batch'
+        options['executemany_values_page_size'] = int(os.getenv('DB_EXECUTEMANY_PAGE_SIZE', 1000))
+        options['executemany_batch_page_size'] = int(os.getenv('DB_EXECUTEMANY_PAGE_SIZE', 1000))
+
+    return options
+
+
+def async_engine_options(uri):
+    """create_async_engine() options matching engine_options() for the async path."""
+    if not uri or uri.startswith('sqlite'):
+        return {}
+    options = {key: value for key, value in engine_options(uri).items()
+               if key not in ('connect_args', 'executemany_mode', 'executemany_values_page_size',
+                              'executemany_batch_page_size', 'poolclass')}
+    if _env_flag('DB_PGBOUNCER'):
+        # asyncpg prepares statements per connection, which breaks under transaction pooling;
+        # async_database_url() also turns off SQLAlchemy's prepared statement cache
+        options['poolclass'] = NullPool
+        options['connect_args'] = {'statement_cache_size': 0}
+        for key in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle'):
+            options.pop(key, None)
+    return options
+
+
+def pool_status(engine):
+    """Live pool gauges plus the process-wide checkout/wait counters."""
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+    status.update(pool_metrics.snapshot())
+    return status
+
+
+# Set for the duration of a @read_replica call
+_read_only = contextvars.ContextVar('db_read_only', default=False)
+
+# replica engine url -> (expires_at, usable)
+_replica_health = {}
+
+
+def read_replica(func):
+    """Route the queries made inside func to the read replica when it is safe to do so."""
+    if inspect.isgeneratorfunction(func):
+        # The body runs on each next(), after the call returned: route every resumption,
+        # but not the caller's code in between
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    token = _read_only.set(True)
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        _read_only.reset(token)
+                    yield item
+            finally:
+                generator.close()
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+def replica_lag(engine):
+    """Replay lag of the replica in seconds; 0 for engines that are not Postgres standbys."""
+    if engine.dialect.name != 'postgresql':
+        return 0.0
+    with engine.connect() as connection:
+        lag = connection.execute(REPLICA_LAG_SQL).scalar()
+    return float(lag or 0)
+
+
+def replica_usable(engine):
+    """Whether the replica is reachable and within DB_REPLICA_MAX_LAG, probed at most every check interval."""
+    key = str(engine.url)
+    now = time.monotonic()
+    cached = _replica_health.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+    try:
+        lag = replica_lag(engine)
+        usable = lag <= REPLICA_MAX_LAG
+        if not usable:
+            logger.warning(f'Replica lag {lag:.1f}s exceeds {REPLICA_MAX_LAG}s; reading from primary')
+    except Exception as e:
+        logger.warning(f'Replica unavailable, reading from primary: {str(e)}')
+        usable = False
+    _replica_health[key] = (now + REPLICA_CHECK_INTERVAL, usable)
+    return usable
+
+
+def mark_primary_sticky():
+    """Pin the current user's reads to the primary for DB_REPLICA_STICKY_SECONDS (read-your-writes)."""
+    flask_session[PRIMARY_UNTIL_KEY] = time.time() + REPLICA_STICKY_SECONDS
+
+
+def _primary_sticky():
+    return has_request_context() and flask_session.get(PRIMARY_UNTIL_KEY, 0) > time.time()
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends reads made under @read_replica to the replica bind."""
+
+    def get_bind(self, mapper=None, *args, **kwargs):
+        if _read_only.get() and not self._flushing and REPLICA_BIND in (self.app.config.get('SQLALCHEMY_BINDS') or {}):
+            info = getattr(getattr(mapper, 'persist_selectable', None), 'info', {})
+            # Models on their own bind key are left alone
+            if not info.get('bind_key') and not _primary_sticky():
+                engine = get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+                if replica_usable(engine):
+                    return engine
+        return super().get_bind(mapper, *args, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy extension whose sessions are RoutingSession."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
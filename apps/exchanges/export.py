@@ -0,0 +1,86 @@
+"""
+Streaming encoders for exports: each takes the column names and an iterable
+of row batches and yields the encoded file a chunk per batch, so only one
+batch is held in memory however long the history is.
+
+Parquet needs the optional pyarrow package.
+"""
+
+import csv
+import io
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_chunks(columns, batches, schema):
+    """One row group per batch. schema is a list of (name, pyarrow type) in column order."""
+    import pyarrow as pa  # Optional dependency, only needed for Parquet exports
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(schema)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for rows in batches:
+            data = {name: [row[index] for row in rows] for index, name in enumerate(columns)}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()  # Writes the footer
+    yield sink.drain()
+
+
+def transaction_parquet_schema():
+    import pyarrow as pa
+    return [
+        ('id', pa.int64()),
+        ('account_id', pa.int64()),
+        ('transaction_type', pa.string()),
+        ('amount', pa.decimal128(20, 8)),
+        ('currency', pa.string()),
+        ('timestamp', pa.timestamp('us')),
+    ]
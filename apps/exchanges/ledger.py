@@ -0,0 +1,114 @@
+"""
+Account balance history from the ledger (AccountLedgerEntry).
+
+compact_ledger() periodically folds each account's new entries into an
+AccountBalanceSnapshot. Snapshots bound the work needed to rebuild a
+balance at any point: balance_history() starts from the nearest snapshot
+instead of summing the account's whole history. Entries older than a
+snapshot can then be pruned.
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, literal, select
+
+from apps import db
+from apps.exchanges.models import Account, AccountBalanceSnapshot, AccountLedgerEntry
+
+# Entries newer than this are left for the next run, so a credit whose
+# transaction commits after a later id was written is never skipped
+LEDGER_SETTLE_SECONDS = 60
+
+
+def latest_snapshot(account_id, before_entry_id=None):
+    """(balance, last_entry_id) of the account's newest snapshot (covering only ids below before_entry_id)."""
+    query = db.session.query(AccountBalanceSnapshot.balance, AccountBalanceSnapshot.last_entry_id) \
+        .filter(AccountBalanceSnapshot.account_id == account_id)
+    if before_entry_id is not None:
+        query = query.filter(AccountBalanceSnapshot.last_entry_id < before_entry_id)
+    snapshot = query.order_by(AccountBalanceSnapshot.last_entry_id.desc()).first()
+    return (snapshot.balance, snapshot.last_entry_id) if snapshot else (Decimal('0'), 0)
+
+
+def open_missing_balances():
+    """
+    Give accounts that predate the ledger an 'opening_balance' entry, so their entries
+    sum to the balance. Each is one INSERT ... SELECT, which sees any concurrent credit
+    either in both the balance and the ledger or in neither.
+    """
+    opened = db.session.query(AccountLedgerEntry.id).filter(
+        AccountLedgerEntry.account_id == Account.id, AccountLedgerEntry.reason == 'opening_balance').exists()
+    account_ids = [account_id for account_id, in db.session.query(Account.id).filter(~opened)]
+    for account_id in account_ids:
+        credited = select(func.coalesce(func.sum(AccountLedgerEntry.delta), 0)) \
+            .where(AccountLedgerEntry.account_id == account_id).scalar_subquery()
+        db.session.execute(AccountLedgerEntry.__table__.insert().from_select(
+            ['account_id', 'delta', 'reason', 'created_at'],
+            select(Account.id, func.coalesce(Account.balance, 0) - credited, literal('opening_balance'),
+                   literal(datetime.utcnow()))
+            .where(Account.id == account_id)
+        ))
+    db.session.commit()
+    return len(account_ids)
+
+
+def compact_ledger(settle_seconds=LEDGER_SETTLE_SECONDS, prune_days=None):
+    """
+    Snapshot every account that has settled entries since its last snapshot.
+    :param prune_days: Also delete entries older than this many days that a snapshot covers.
+    :return: (snapshots written, entries pruned).
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settle_seconds)
+    snapshots = pruned = 0
+    for account_id, in db.session.query(Account.id).order_by(Account.id).all():
+        balance, last_entry_id = latest_snapshot(account_id)
+        total, max_id = db.session.query(func.sum(AccountLedgerEntry.delta), func.max(AccountLedgerEntry.id)) \
+            .filter(AccountLedgerEntry.account_id == account_id, AccountLedgerEntry.id > last_entry_id,
+                    AccountLedgerEntry.created_at <= cutoff).one()
+        if max_id is not None:
+            db.session.add(AccountBalanceSnapshot(account_id=account_id, balance=balance + total, last_entry_id=max_id))
+            last_entry_id = max_id
+            snapshots += 1
+        if prune_days is not None and last_entry_id:
+            pruned += AccountLedgerEntry.query.filter(
+                AccountLedgerEntry.account_id == account_id, AccountLedgerEntry.id <= last_entry_id,
+                AccountLedgerEntry.created_at < now - timedelta(days=prune_days)
+            ).delete(synchronize_session=False)
+        db.session.commit()
+    return snapshots, pruned
+
+
+def balance_history(account_id, limit=100, before_id=None):
+    """
+    Newest-first page of an account's ledger entries, each with the balance after it.
+    The running balance starts from the nearest snapshot below the page, so a page costs
+    the same however long the history is.
+    :param before_id: Return entries with ids below this (the next_before of the previous page).
+    :return: (entries as dicts, next_before or None).
+    """
+    query = AccountLedgerEntry.query.filter(AccountLedgerEntry.account_id == account_id)
+    if before_id is not None:
+        query = query.filter(AccountLedgerEntry.id < before_id)
+    entries = query.order_by(AccountLedgerEntry.id.desc()).limit(limit + 1).all()
+    next_before = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_before = entries[-1].id
+    if not entries:
+        return [], None
+
+    oldest_id = entries[-1].id
+    balance, last_entry_id = latest_snapshot(account_id, before_entry_id=oldest_id)
+    gap = db.session.query(func.coalesce(func.sum(AccountLedgerEntry.delta), 0)).filter(
+        AccountLedgerEntry.account_id == account_id,
+        AccountLedgerEntry.id > last_entry_id, AccountLedgerEntry.id < oldest_id).scalar()
+    balance += Decimal(gap)
+
+    history = []
+    for entry in reversed(entries):
+        balance += entry.delta
+        history.append(dict(entry.to_dict(), balance_after=float(balance)))
+    history.reverse()
+    return history, next_before
@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta
 from apps import db
+from apps.serialization import model_serializer
+from apps.trading.models import TradingBot
 from decimal import Decimal
-from sqlalchemy import Numeric
+from sqlalchemy import Numeric, insert, update
 
 class Exchange(db.Model):
     __tablename__ = 'exchanges'
@@ -100,21 +102,9 @@ class Account(db.Model):
     transactions = db.relationship('Transaction', back_populates='account', lazy='dynamic')
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'account_name': self.account_name,
-            'status': self.status,
-            'balance': float(self.balance),
-            'open_orders': self.open_orders,
-            'closed_orders': self.closed_orders,
-            'taker_fee': self.taker_fee,
-            'maker_fee': self.maker_fee,
-            'margin_info': self.margin_info,
-            'last_accessed': self.last_accessed.isoformat() if self.last_accessed else None,
-            'rate_limit_status': self.rate_limit_status,
-            'exchange_name': self.exchange.name
-        }
+        data = _serialize_account(self)
+        data['exchange_name'] = self.exchange.name
+        return data
 
     @classmethod
     def find_by_id(cls, account_id):
@@ -125,11 +115,40 @@ class Account(db.Model):
         return cls.query.filter_by(name=name).first()
 
     def update_account(self, **kwargs):
+        balance = kwargs.pop('balance', None)
+        if balance is not None:
+            # Lock the row and reload it before applying the other fields (populate_existing would
+            # overwrite them), so credits committed meanwhile are in the delta and the balance ends
+            # at the typed value
+            Account.query.filter_by(id=self.id).with_for_update().populate_existing().one()
         for key, value in kwargs.items():
             if hasattr(self, key):
                 setattr(self, key, value)
+        # Bot pages show the account's name and balance: drop their cached fragments
+        db.session.execute(TradingBot.cache_version_bump(account_id=self.id))
+        if balance is not None:
+            # A manual correction is recorded in the ledger like any other balance change
+            delta = Decimal(str(balance)) - (self.balance or Decimal('0'))
+            if delta:
+                for statement in Account.balance_credit(self.id, delta, 'adjustment'):
+                    db.session.execute(statement)
         self.save()
 
+    @classmethod
+    def balance_credit(cls, account_id, delta, reason, position_id=None):
+        """
+        Statements recording delta in the ledger and adding it to the balance, for the
+        caller's transaction on either the sync or the async session. The balance moves
+        with one UPDATE ... SET balance = balance + :delta rather than a read-modify-write,
+        so concurrent credits to an account can't overwrite each other; execute them last
+        before committing, so the row lock is held only for the commit.
+        """
+        entry = insert(AccountLedgerEntry.__table__).values(
+            account_id=account_id, delta=delta, reason=reason, position_id=position_id, created_at=datetime.utcnow())
+        balance = update(cls).where(cls.id == account_id).values(balance=cls.balance + delta) \
+            .execution_options(synchronize_session='evaluate')
+        return entry, balance
+
     def save(self, commit=True):
         db.session.add(self)
         if commit:
@@ -154,6 +173,10 @@ class APICredentials(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    # Pagination and export walk an account's history in (timestamp, id) order
+    __table_args__ = (
+        db.Index('ix_transactions_account_timestamp_id', 'account_id', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
@@ -165,11 +188,64 @@ class Transaction(db.Model):
     account = db.relationship('Account', back_populates='transactions')
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'account_id': self.account_id,
-            'transaction_type': self.transaction_type,
-            'amount': float(self.amount),
-            'currency': self.currency,
-            'timestamp': self.timestamp.isoformat()
-        }
+        return _serialize_transaction(self)
+
+    @classmethod
+    def bulk_create(cls, rows, commit=True):
+        """
+        Insert many transactions as one executemany (batched into multi-row VALUES on Postgres).
+        :param rows: Dicts of column values; timestamp defaults to now.
+        """
+        if not rows:
+            return 0
+        now = datetime.utcnow()
+        db.session.execute(insert(cls.__table__), [dict(row, timestamp=row.get('timestamp') or now) for row in rows])
+        if commit:
+            db.session.commit()
+        return len(rows)
+
+
+class AccountLedgerEntry(db.Model):
+    """
+    Append-only record of every change to an account balance. An account's entries sum
+    to its balance, starting from an 'opening_balance' entry.
+    """
+    __tablename__ = 'account_ledger'
+    __table_args__ = (
+        db.Index('ix_account_ledger_account_id_id', 'account_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id', ondelete='CASCADE'), nullable=False)
+    delta = db.Column(Numeric(precision=20, scale=8), nullable=False)
+    reason = db.Column(db.String(32), nullable=False)  # e.g., 'opening_balance', 'realized_pnl', 'adjustment'
+    position_id = db.Column(db.Integer, db.ForeignKey('positions.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    account = db.relationship('Account', backref=db.backref('ledger_entries', lazy='dynamic', passive_deletes=True))
+
+    def to_dict(self):
+        return _serialize_ledger_entry(self)
+
+
+class AccountBalanceSnapshot(db.Model):
+    """Balance of an account as of a ledger entry, written by `flask accounts compact-ledger`."""
+    __tablename__ = 'account_balance_snapshots'
+    __table_args__ = (
+        db.Index('ix_account_balance_snapshots_account_id_last_entry_id', 'account_id', 'last_entry_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id', ondelete='CASCADE'), nullable=False)
+    balance = db.Column(Numeric(precision=20, scale=8), nullable=False)
+    last_entry_id = db.Column(db.Integer, nullable=False)  # Sum of the account's entries up to and including this id
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+# Column projections built once per model rather than per instance
+_serialize_account = model_serializer(Account, fields=[
+    'id', 'user_id', 'account_name', 'status', 'balance', 'open_orders', 'closed_orders',
+    'taker_fee', 'maker_fee', 'margin_info', 'last_accessed', 'rate_limit_status'
+], converters={'last_accessed': datetime.isoformat})
+_serialize_transaction = model_serializer(Transaction, converters={'timestamp': datetime.isoformat})
+_serialize_ledger_entry = model_serializer(AccountLedgerEntry, converters={'created_at': datetime.isoformat})
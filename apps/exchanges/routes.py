@@ -1,16 +1,23 @@
 import json
 import logging
-from flask import Blueprint, render_template, request, jsonify, flash
+import click
+from flask import Blueprint, Response, render_template, request, jsonify, flash, stream_with_context
 from flask_login import login_required, current_user
-from apps.exchanges.service import AccountService, ExchangeService, TransactionService
+from apps.exchanges.ledger import LEDGER_SETTLE_SECONDS, compact_ledger, open_missing_balances
+from apps.exchanges.export import EXPORT_FORMATS, csv_chunks, parquet_chunks, transaction_parquet_schema
+from apps.exchanges.service import (EXPORT_COLUMNS, TRANSACTIONS_PAGE_SIZE, AccountService, ExchangeService,
+                                    TransactionService, parse_transaction_cursor)
+from apps.serialization import json_response, streaming_json_response
 logger = logging.getLogger(__name__)
 
-blueprint = Blueprint('main', __name__)
+blueprint = Blueprint('main', __name__, cli_group='accounts')  # flask accounts <command>
 
 @blueprint.route('/accounts')
 @login_required
 def list_accounts():
     user_id = current_user.id
+    if request.args.get('stream'):
+        return streaming_json_response(AccountService.iter_accounts(user_id))
     logger.info(f'retreiving accounts for user ID: {current_user.id}')
     response = AccountService.get_accounts(user_id)
     print(json.dumps(response, indent=2))
@@ -50,9 +57,34 @@ def delete_account(account_id):
     else:
         return jsonify({'message': response['message']}), 400
 
+@blueprint.route('/accounts/<int:account_id>/ledger')
+@login_required
+def account_ledger(account_id):
+    if not TransactionService.owns_account(current_user.id, account_id):
+        return jsonify({'message': 'Account not found'}), 404
+    response = AccountService.get_balance_history(
+        account_id, request.args.get('limit', 100, type=int), request.args.get('before', type=int))
+    if response['status'] == 'success':
+        return json_response({'data': response['data'], 'next_before': response['next_before']})
+    else:
+        return jsonify({'message': response['message']}), 400
+
+@blueprint.cli.command('compact-ledger')
+@click.option('--prune-days', type=int, default=None,
+              help='Also delete ledger entries older than this many days that a snapshot covers.')
+@click.option('--settle-seconds', type=int, default=LEDGER_SETTLE_SECONDS,
+              help='Leave entries younger than this for the next run.')
+def compact_ledger_command(prune_days, settle_seconds):
+    """Open ledgers for accounts that predate them, then snapshot every account's balance."""
+    opened = open_missing_balances()
+    snapshots, pruned = compact_ledger(settle_seconds, prune_days)
+    print(f'> Opened {opened} ledgers, wrote {snapshots} snapshots, pruned {pruned} entries')
+
 @blueprint.route('/exchanges')
 @login_required
 def list_exchanges():
+    if request.args.get('stream'):
+        return streaming_json_response(ExchangeService.iter_exchanges())
     response = ExchangeService.get_exchanges()
     if response['status'] == 'success':
         return render_template('exchanges/list.html', data=response['data'])
@@ -92,13 +124,47 @@ def delete_exchange(exchange_id):
 @blueprint.route('/transactions/<int:account_id>')
 @login_required
 def list_transactions(account_id):
-    response = TransactionService.get_transactions(account_id)
+    if not TransactionService.owns_account(current_user.id, account_id):
+        return jsonify({'message': 'Account not found'}), 404
+    if request.args.get('stream'):
+        # Everything from the cursor onwards, instead of one page
+        try:
+            after = parse_transaction_cursor(request.args.get('cursor'))
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        return streaming_json_response(TransactionService.iter_transactions(account_id, after))
+    limit = request.args.get('limit', TRANSACTIONS_PAGE_SIZE, type=int)
+    response = TransactionService.get_transactions(account_id, limit, request.args.get('cursor'))
     if response['status'] == 'success':
-        return render_template('transactions/list.html', data=response['data'])
+        if request.args.get('format') == 'json':
+            return json_response({'data': response['data'], 'next_cursor': response['next_cursor']})
+        return render_template('transactions/list.html', data=response['data'], next_cursor=response['next_cursor'])
     else:
         flash(response['message'], 'error')
         return jsonify({'message': response['message']}), 400
 
+@blueprint.route('/transactions/<int:account_id>/export')
+@login_required
+def export_transactions(account_id):
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'message': f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if not TransactionService.owns_account(current_user.id, account_id):
+        return jsonify({'message': 'Account not found'}), 404
+
+    batches = TransactionService.iter_export_batches(account_id)
+    if export_format == 'parquet':
+        try:
+            chunks = parquet_chunks(EXPORT_COLUMNS, batches, transaction_parquet_schema())
+        except ImportError:
+            return jsonify({'message': 'Parquet export needs the pyarrow package'}), 400
+    else:
+        chunks = csv_chunks(EXPORT_COLUMNS, batches)
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f'transactions-{account_id}.{extension}'
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @blueprint.route('/transactions/create', methods=['POST'])
 @login_required
 def create_transaction():
@@ -109,6 +175,15 @@ def create_transaction():
     else:
         return jsonify({'message': response['message']}), 400
 
+@blueprint.route('/transactions/bulk', methods=['POST'])
+@login_required
+def create_transactions():
+    response = TransactionService.create_transactions(current_user.id, request.json)
+    if response['status'] == 'success':
+        return jsonify({'message': response['message'], 'count': response['count']}), 201
+    else:
+        return jsonify({'message': response['message']}), 400
+
 @blueprint.route('/transactions/update/<int:transaction_id>', methods=['POST'])
 @login_required
 def update_transaction(transaction_id):
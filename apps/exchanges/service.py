@@ -2,14 +2,40 @@
 
 
 import logging
+import os
 from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
 from apps import db
-from apps.exchanges.models import Account, Exchange, Transaction
+from apps.database import STREAM_YIELD_PER, read_replica
+from apps.exchanges.ledger import balance_history
+from apps.exchanges.models import Account, AccountLedgerEntry, Exchange, Transaction
+from apps.strategies.util import decode_cursor, encode_cursor
 
 logger = logging.getLogger(__name__)
 
+TRANSACTIONS_PAGE_SIZE = int(os.getenv('TRANSACTIONS_PAGE_SIZE', 100))
+TRANSACTIONS_MAX_PAGE_SIZE = 1000
+TRANSACTIONS_MAX_BULK = int(os.getenv('TRANSACTIONS_MAX_BULK', 10000))
+TRANSACTIONS_EXPORT_BATCH = int(os.getenv('TRANSACTIONS_EXPORT_BATCH', 5000))
+TRANSACTION_FIELDS = ('account_id', 'transaction_type', 'amount', 'currency')
+EXPORT_COLUMNS = ('id', 'account_id', 'transaction_type', 'amount', 'currency', 'timestamp')
+
+
+def parse_transaction_cursor(cursor):
+    """(timestamp, id) position of a transactions next_cursor, None for no cursor; raises ValueError."""
+    if not cursor:
+        return None
+    try:
+        last_timestamp, last_id = decode_cursor(cursor)
+        return datetime.fromisoformat(last_timestamp), last_id
+    except TypeError as e:
+        raise ValueError(str(e))
+
 class AccountService:
     @staticmethod
+    @read_replica
     def get_accounts(user_id):
         try:
             accounts = Account.query.filter_by(user_id=user_id).all()
@@ -18,21 +44,39 @@ class AccountService:
         except Exception as e:
             logger.error(f"Failed to retrieve accounts: {str(e)}")
             return {'status': 'error', 'message': 'Failed to retrieve accounts'}
-        finally:
-            db.session.remove()
+
+    @staticmethod
+    @read_replica
+    def iter_accounts(user_id):
+        """A user's accounts, serialized one at a time from a server-side cursor."""
+        accounts = Account.query.filter_by(user_id=user_id).options(joinedload(Account.exchange)) \
+            .order_by(Account.id).yield_per(STREAM_YIELD_PER)
+        for account in accounts:
+            yield account.to_dict()
 
     @staticmethod
     def create_account(data):
         try:
             new_account = Account(**data)
             db.session.add(new_account)
+            db.session.add(AccountLedgerEntry(account=new_account, delta=new_account.balance or 0,
+                                              reason='opening_balance'))
             db.session.commit()
             return {'status': 'success', 'data': new_account.to_dict()}
         except Exception as e:
             logger.error(f"Failed to create account: {str(e)}")
             return {'status': 'error', 'message': 'Failed to create account'}
-        finally:
-            db.session.remove()
+
+    @staticmethod
+    @read_replica
+    def get_balance_history(account_id, limit=100, before_id=None):
+        """Ledger entries of an account, newest first, with the balance after each."""
+        try:
+            entries, next_before = balance_history(account_id, max(1, min(limit, 1000)), before_id)
+            return {'status': 'success', 'data': entries, 'next_before': next_before}
+        except Exception as e:
+            logger.error(f"Failed to retrieve balance history: {str(e)}")
+            return {'status': 'error', 'message': 'Failed to retrieve balance history'}
 
     @staticmethod
     def update_account(account_id, data):
@@ -45,8 +89,6 @@ class AccountService:
         except Exception as e:
             logger.error(f"Failed to update account: {str(e)}")
             return {'status': 'error', 'message': 'Failed to update account'}
-        finally:
-            db.session.remove()
 
     @staticmethod
     def delete_account(account_id):
@@ -59,8 +101,6 @@ class AccountService:
         except Exception as e:
             logger.error(f"Failed to delete account: {str(e)}")
             return {'status': 'error', 'message': 'Failed to delete account'}
-        finally:
-            db.session.remove()
 
 class ExchangeService:
     @staticmethod
@@ -72,8 +112,12 @@ class ExchangeService:
         except Exception as e:
             logger.error(f"Failed to retrieve exchanges: {str(e)}")
             return {'status': 'error', 'message': 'Failed to retrieve exchanges'}
-        finally:
-            db.session.remove()
+
+    @staticmethod
+    @read_replica
+    def iter_exchanges():
+        for exchange in Exchange.query.order_by(Exchange.id).yield_per(STREAM_YIELD_PER):
+            yield exchange.to_dict()
 
     @staticmethod
     def create_exchange(data):
@@ -85,8 +129,6 @@ class ExchangeService:
         except Exception as e:
             logger.error(f"Failed to create exchange: {str(e)}")
             return {'status': 'error', 'message': 'Failed to create exchange'}
-        finally:
-            db.session.remove()
 
     @staticmethod
     def update_exchange(exchange_id, data):
@@ -99,8 +141,6 @@ class ExchangeService:
         except Exception as e:
             logger.error(f"Failed to update exchange: {str(e)}")
             return {'status': 'error', 'message': 'Failed to update exchange'}
-        finally:
-            db.session.remove()
 
     @staticmethod
     def delete_exchange(exchange_id):
@@ -113,21 +153,83 @@ class ExchangeService:
         except Exception as e:
             logger.error(f"Failed to delete exchange: {str(e)}")
             return {'status': 'error', 'message': 'Failed to delete exchange'}
-        finally:
-            db.session.remove()
 
 class TransactionService:
     @staticmethod
-    def get_transactions(account_id):
+    @read_replica
+    def get_transactions(account_id, limit=TRANSACTIONS_PAGE_SIZE, cursor=None):
+        """
+        One page of an account's transactions, newest first. Keyset pagination on
+        (timestamp, id), so every page costs the same however deep it is.
+        :param cursor: next_cursor of the previous page.
+        """
         try:
-            transactions = Transaction.query.filter_by(account_id=account_id).all()
+            after = parse_transaction_cursor(cursor)
+        except ValueError:
+            return {'status': 'error', 'message': 'Invalid cursor'}
+        limit = max(1, min(limit, TRANSACTIONS_MAX_PAGE_SIZE))
+        try:
+            query = Transaction.query.filter(Transaction.account_id == account_id)
+            if after is not None:
+                query = query.filter(tuple_(Transaction.timestamp, Transaction.id) < tuple_(*after))
+            # One extra row tells whether there is a next page
+            transactions = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(limit + 1).all()
+            next_cursor = None
+            if len(transactions) > limit:
+                transactions = transactions[:limit]
+                next_cursor = encode_cursor(transactions[-1].timestamp, transactions[-1].id)
             transaction_list = [transaction.to_dict() for transaction in transactions]
-            return {'status': 'success', 'data': transaction_list}
+            return {'status': 'success', 'data': transaction_list, 'next_cursor': next_cursor}
         except Exception as e:
             logger.error(f"Failed to retrieve transactions: {str(e)}")
             return {'status': 'error', 'message': 'Failed to retrieve transactions'}
-        finally:
+
+    @staticmethod
+    @read_replica
+    def iter_transactions(account_id, after=None):
+        """
+        Every transaction of an account after the (timestamp, id) position (see
+        parse_transaction_cursor), newest first, serialized one at a time from a server-side cursor.
+        """
+        query = Transaction.query.filter(Transaction.account_id == account_id)
+        if after is not None:
+            query = query.filter(tuple_(Transaction.timestamp, Transaction.id) < tuple_(*after))
+        query = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+        for transaction in query.yield_per(STREAM_YIELD_PER):
+            yield transaction.to_dict()
+
+    @staticmethod
+    @read_replica
+    def owns_account(user_id, account_id):
+        return db.session.query(Account.query.filter_by(id=account_id, user_id=user_id).exists()).scalar()
+
+    @staticmethod
+    @read_replica
+    def export_batch(account_id, after=None, limit=TRANSACTIONS_EXPORT_BATCH):
+        """Up to limit rows of EXPORT_COLUMNS after the (timestamp, id) position, oldest first."""
+        query = db.session.query(*(getattr(Transaction, column) for column in EXPORT_COLUMNS)) \
+            .filter(Transaction.account_id == account_id)
+        if after is not None:
+            query = query.filter(tuple_(Transaction.timestamp, Transaction.id) > tuple_(*after))
+        return query.order_by(Transaction.timestamp, Transaction.id).limit(limit).all()
+
+    @staticmethod
+    def iter_export_batches(account_id, batch_size=TRANSACTIONS_EXPORT_BATCH):
+        """
+        Every transaction of an account in batches. Each batch is its own short query,
+        and the session is released in between, so a slow download never holds a
+        connection or a long-running transaction.
+        """
+        after = None
+        while True:
+            rows = TransactionService.export_batch(account_id, after, batch_size)
             db.session.remove()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1].timestamp, rows[-1].id)
 
     @staticmethod
     def create_transaction(data):
@@ -139,8 +241,41 @@ class TransactionService:
         except Exception as e:
             logger.error(f"Failed to create transaction: {str(e)}")
             return {'status': 'error', 'message': 'Failed to create transaction'}
-        finally:
-            db.session.remove()
+
+    @staticmethod
+    def create_transactions(user_id, items):
+        """
+        Create many transactions in one commit.
+        :param items: List of dicts with account_id, transaction_type, amount, currency
+            and an optional ISO 8601 timestamp. The accounts must belong to user_id.
+        """
+        if not isinstance(items, list) or not items:
+            return {'status': 'error', 'message': 'Expected a non-empty list of transactions'}
+        if len(items) > TRANSACTIONS_MAX_BULK:
+            return {'status': 'error', 'message': f'At most {TRANSACTIONS_MAX_BULK} transactions per request'}
+        rows = []
+        try:
+            for item in items:
+                row = {field: item[field] for field in TRANSACTION_FIELDS}
+                row['account_id'] = int(row['account_id'])
+                row['amount'] = Decimal(str(row['amount']))
+                row['timestamp'] = datetime.fromisoformat(item['timestamp']) if item.get('timestamp') else None
+                rows.append(row)
+        except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+            return {'status': 'error', 'message': f'Invalid transaction at index {len(rows)}: {str(e)}'}
+
+        account_ids = {row['account_id'] for row in rows}
+        owned = {account_id for account_id, in db.session.query(Account.id)
+                 .filter(Account.user_id == user_id, Account.id.in_(account_ids))}
+        if owned != account_ids:
+            return {'status': 'error', 'message': 'Account not found'}
+        try:
+            count = Transaction.bulk_create(rows)
+            return {'status': 'success', 'message': f'{count} transactions created', 'count': count}
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to create transactions: {str(e)}")
+            return {'status': 'error', 'message': 'Failed to create transactions'}
 
     @staticmethod
     def update_transaction(transaction_id, data):
@@ -153,8 +288,6 @@ class TransactionService:
         except Exception as e:
             logger.error(f"Failed to update transaction: {str(e)}")
             return {'status': 'error', 'message': 'Failed to update transaction'}
-        finally:
-            db.session.remove()
 
     @staticmethod
     def delete_transaction(transaction_id):
@@ -167,5 +300,3 @@ class TransactionService:
         except Exception as e:
             logger.error(f"Failed to delete transaction: {str(e)}")
             return {'status': 'error', 'message': 'Failed to delete transaction'}
-        finally:
-            db.session.remove()
@@ -3,11 +3,19 @@
 Copyright (c) 2019 - present AppSeed.us
 """
 
+import hmac
+import os
+
+from apps import db
+from apps.database import pool_status
 from apps.home import blueprint
-from flask import render_template, request
+from flask import abort, jsonify, render_template, request
 from flask_login import login_required
 from jinja2 import TemplateNotFound
 
+# Token for the metrics endpoints; they are hidden (404) while unset
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
 
 @blueprint.route('/index')
 @login_required
@@ -16,6 +24,14 @@ def index():
     return render_template('home/index.html', segment='index')
 
 
+@blueprint.route('/metrics/db')
+def db_metrics():
+    token = request.headers.get('X-Metrics-Token', '')
+    if not METRICS_TOKEN or not hmac.compare_digest(token, METRICS_TOKEN):
+        abort(404)
+    return jsonify(pool_status(db.engine))
+
+
 @blueprint.route('/<template>')
 @login_required
 def route_template(template):
@@ -0,0 +1,134 @@
+"""
+JSON serialization helpers shared by the API routes.
+
+orjson is used when installed; the stdlib encoder is the fallback. Both
+encode Decimal as float and datetime/date as ISO 8601.
+"""
+
+import json
+import operator
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, stream_with_context
+from flask.json import JSONEncoder
+from sqlalchemy import Float, Numeric
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def default(obj):
+    """Fallback hook for types the JSON encoders do not handle natively."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+# Encoded items are sent in chunks of about this size
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def dumps(obj):
+    """Encode obj to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=default, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(obj, status=200):
+    """Drop-in for jsonify(obj), status using the fast encoder."""
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+def iter_json(items, key='data', serialize=None, trailer=None):
+    """
+    Encode {key: [items...], **trailer()} incrementally: the first item is sent as soon as
+    it is ready and the rest in chunks of STREAM_CHUNK_BYTES, so only one chunk is held in
+    memory. trailer is called once the items are exhausted, so it can report figures
+    accumulated while streaming.
+    """
+    chunk = [b'{' + dumps(key) + b':[']
+    size = 0
+    first = True
+    for item in items:
+        encoded = dumps(serialize(item) if serialize is not None else item)
+        if not first:
+            chunk.append(b',')
+        chunk.append(encoded)
+        size += len(encoded)
+        if first or size >= STREAM_CHUNK_BYTES:
+            yield b''.join(chunk)
+            chunk = []
+            size = 0
+        first = False
+    chunk.append(b']')
+    for name, value in (trailer() if trailer is not None else {}).items():
+        chunk.append(b',' + dumps(name) + b':' + dumps(value))
+    chunk.append(b'}')
+    yield b''.join(chunk)
+
+
+def streaming_json_response(items, key='data', serialize=None, trailer=None, status=200):
+    """
+    json_response for result sets too large to build in memory, sent with chunked transfer
+    encoding. A failure mid-stream can only cut the response short, leaving invalid JSON.
+    """
+    return Response(stream_with_context(iter_json(items, key, serialize, trailer)), status=status,
+                    mimetype='application/json')
+
+
+class AppJSONEncoder(JSONEncoder):
+    """Flask encoder (jsonify, |tojson) with the same Decimal/datetime handling as dumps()."""
+
+    def default(self, obj):
+        try:
+            return default(obj)
+        except TypeError:
+            return super().default(obj)
+
+
+def to_float(value):
+    return float(value)
+
+
+def model_serializer(model, fields=None, converters=None):
+    """
+    Build a to_dict function for a model once, instead of per instance.
+    Numeric columns are converted to float unless a converter is given;
+    None values are passed through unconverted.
+    :param model: SQLAlchemy model class.
+    :param fields: Attribute names to include, defaults to all columns.
+    :param converters: Mapping of field name -> callable applied to non-None values.
+    :return: Function taking an instance and returning a dict.
+    """
+    columns = model.__table__.columns
+    names = tuple(fields or [column.name for column in columns])
+    converters = dict(converters or {})
+    for name in names:
+        if name not in converters and name in columns:
+            column_type = columns[name].type
+            if isinstance(column_type, Numeric) and not isinstance(column_type, Float):
+                converters[name] = to_float
+    converted = tuple((name, converters[name]) for name in names if name in converters)
+
+    getter = operator.attrgetter(*names)
+    if len(names) == 1:
+        single = getter
+        getter = lambda instance: (single(instance),)  # noqa: E731
+
+    def serialize(instance):
+        data = dict(zip(names, getter(instance)))
+        for name, convert in converted:
+            value = data[name]
+            if value is not None:
+                data[name] = convert(value)
+        return data
+
+    return serialize
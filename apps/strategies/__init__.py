@@ -4,6 +4,7 @@ blueprint = Blueprint(
     'strategies_blueprint',
     __name__,
     url_prefix='/strategies',  # Set the desired URL prefix for the trading blueprint
+    cli_group='strategies',  # flask strategies <command>
     template_folder='templates'
 )
 
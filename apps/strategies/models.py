@@ -2,12 +2,17 @@ from datetime import datetime, timedelta
 import json
 from flask_login import current_user
 
-import pandas as pd
+from sqlalchemy import case, func, select
 from apps import db
-from apps.strategies.util import normalize_key
+from apps.cache import LRUCache
+from apps.strategies.util import normalize_metrics
+from apps.trading.models import TradingBot
 
 class Strategy(db.Model):
     __tablename__ = 'strategies'
+    __table_args__ = (
+        db.Index('ix_strategies_coin_pair_time_frame', 'coin_pair', 'time_frame'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     developer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     strategy_name = db.Column(db.String(255), nullable=False)
@@ -18,6 +23,12 @@ class Strategy(db.Model):
     coin_pair = db.Column(db.String(20), nullable=False)
     time_frame = db.Column(db.String(10), nullable=False)
     settings_file_path = db.Column(db.String, nullable=True)  # Path to the strategy's configuration or settings file
+
+    # Denormalized counters, maintained by the subscription/review/bot write paths
+    subscriber_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bot_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     developer = db.relationship('User', backref=db.backref('strategies', lazy=True))
@@ -31,7 +42,7 @@ class Strategy(db.Model):
     @property
     def subscribers_count(self):
         """Property to count the number of subscribers a strategy has."""
-        return len(self.subscriptions.all())
+        return self.subscriber_count or 0
     # Add a relationship to TradingBot
 
     # Add method to check if the current user has created a bot from this strategy
@@ -73,6 +84,33 @@ class Strategy(db.Model):
         # Here's how you might incorporate the average rating:
         return strategy_data
 
+    def to_summary_dict(self, is_subscribed=False, is_botified=False):
+        """
+        Marketplace serialization from the counter columns and the per-user flags
+        computed by the listing query, so no relationship beyond the eager-loaded
+        developer and metrics is touched.
+        """
+        return {
+            'id': self.id,
+            'developer_id': self.developer_id,
+            'strategy_name': self.strategy_name,
+            'description': self.description,
+            'status': self.status,
+            'creation_date': self.creation_date.strftime('%Y-%m-%d') if self.creation_date else None,
+            'days_ago': (datetime.utcnow() - self.creation_date).days if self.creation_date else None,
+            'coin_pair': self.coin_pair,
+            'time_frame': self.time_frame,
+            'developer_username': self.developer.username if self.developer else 'Unknown',
+            'settings_file_path': self.settings_file_path,
+            'performance_metrics': self.performance_metrics.to_dict() if self.performance_metrics else None,
+            'average_rating': self.get_average_rating(),
+            'reviews_count': self.rating_count,
+            'subscribers_count': self.subscriber_count,
+            'bot_count': self.bot_count,
+            'is_subscribed': bool(is_subscribed),
+            'is_botified': bool(is_botified)
+        }
+
     @staticmethod
     def list_to_dict(strategies):
         """
@@ -96,14 +134,54 @@ class Strategy(db.Model):
         return f'<Strategy {self.strategy_name} by Developer ID {self.developer_id}>'
 
     def get_average_rating(self):
-        # Here, self.reviews is expected to be a relationship query, not a list
-        total_reviews = len(self.reviews)  # If self.reviews is a list after conversion in to_dict
-        if total_reviews > 0:
-            total_rating = sum(review.rating for review in self.reviews)  # Directly access the attribute
-            return total_rating / total_reviews
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
         return 0
 
-    
+    @classmethod
+    def average_rating_expression(cls):
+        """SQL expression for the average rating, usable for sorting."""
+        return case((cls.rating_count > 0, cls.rating_sum * 1.0 / cls.rating_count), else_=0)
+
+    @classmethod
+    def adjust_counters(cls, strategy_id, **deltas):
+        """
+        Atomically add deltas to the counter columns of a strategy, e.g.
+        adjust_counters(1, subscriber_count=1). Runs in the caller's transaction;
+        the caller is responsible for committing.
+        """
+        if strategy_id is None or not deltas:
+            return
+        values = {getattr(cls, name): getattr(cls, name) + delta for name, delta in deltas.items()}
+        cls.query.filter_by(id=strategy_id).update(values, synchronize_session=False)
+
+    @classmethod
+    def repair_counters(cls):
+        """
+        Recompute every counter column from the underlying rows.
+        :return: Number of strategies whose counters were out of sync.
+        """
+        subscribers = select(func.count(Subscription.id)).where(Subscription.strategy_id == cls.id).scalar_subquery()
+        rating_sum = select(func.coalesce(func.sum(StrategyReview.rating), 0)).where(StrategyReview.strategy_id == cls.id).scalar_subquery()
+        rating_count = select(func.count(StrategyReview.id)).where(StrategyReview.strategy_id == cls.id).scalar_subquery()
+        bots = select(func.count(TradingBot.id)).where(TradingBot.strategy_id == cls.id).scalar_subquery()
+
+        drifted = cls.query.filter(
+            (cls.subscriber_count != subscribers) |
+            (cls.rating_sum != rating_sum) |
+            (cls.rating_count != rating_count) |
+            (cls.bot_count != bots)
+        ).count()
+
+        cls.query.update({
+            cls.subscriber_count: subscribers,
+            cls.rating_sum: rating_sum,
+            cls.rating_count: rating_count,
+            cls.bot_count: bots,
+        }, synchronize_session=False)
+        db.session.commit()
+        return drifted
+
 
 
     @classmethod
@@ -189,6 +267,9 @@ class Subscription(db.Model):
 
 class StrategyMetadata(db.Model):
     __tablename__ = 'strategy_metadata'
+    __table_args__ = (
+        db.UniqueConstraint('strategy_id', 'key', name='uq_strategy_metadata_strategy_key'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     strategy_id = db.Column(db.Integer, db.ForeignKey('strategies.id'), nullable=False)
     key = db.Column(db.String(64), nullable=False)
@@ -221,6 +302,55 @@ class StrategyMetadata(db.Model):
         db.session.commit()
         return existing_metadata
 
+    @classmethod
+    def bulk_upsert(cls, strategy_id, settings, commit=True):
+        """
+        Insert or update many metadata entries for a strategy in one round trip.
+        :param strategy_id: ID of the strategy the settings belong to.
+        :param settings: Mapping of key -> value.
+        :param commit: Commit the transaction once all rows are written.
+        :return: Tuple of (inserted, updated) row counts.
+        """
+        # One SELECT for the current state, then diff in memory
+        existing = dict(
+            db.session.query(cls.key, cls.value).filter(cls.strategy_id == strategy_id).all()
+        )
+        rows = []
+        inserted = updated = 0
+        for key, value in settings.items():
+            value = str(value)
+            if key not in existing:
+                inserted += 1
+            elif existing[key] != value:
+                updated += 1
+            else:
+                continue  # Unchanged, skip the write entirely
+            rows.append({'strategy_id': strategy_id, 'key': key, 'value': value})
+
+        if rows:
+            dialect = db.session.get_bind().dialect.name
+            if dialect in ('postgresql', 'sqlite'):
+                if dialect == 'postgresql':
+                    from sqlalchemy.dialects.postgresql import insert
+                else:
+                    from sqlalchemy.dialects.sqlite import insert
+                stmt = insert(cls.__table__).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['strategy_id', 'key'],
+                    set_={'value': stmt.excluded.value}
+                )
+                db.session.execute(stmt)
+            else:
+                ids = dict(
+                    db.session.query(cls.key, cls.id).filter(cls.strategy_id == strategy_id).all()
+                ) if updated else {}
+                db.session.bulk_insert_mappings(cls, [r for r in rows if r['key'] not in ids])
+                db.session.bulk_update_mappings(cls, [dict(r, id=ids[r['key']]) for r in rows if r['key'] in ids])
+
+        if commit:
+            db.session.commit()
+        return inserted, updated
+
     def delete(self):
         """Delete the metadata entry."""
         db.session.delete(self)
@@ -274,6 +404,7 @@ class StrategyReview(db.Model):
         """Create and save a new review."""
         review = cls(strategy_id=strategy_id, user_id=user_id, rating=rating, comment=comment)
         db.session.add(review)
+        Strategy.adjust_counters(strategy_id, rating_sum=rating, rating_count=1)
         db.session.commit()
         return review
 
@@ -290,6 +421,7 @@ class StrategyReview(db.Model):
     def update_review(self, rating=None, comment=None):
         """Update the rating and/or comment of the review."""
         if rating is not None:
+            Strategy.adjust_counters(self.strategy_id, rating_sum=rating - self.rating)
             self.rating = rating
         if comment is not None:
             self.comment = comment
@@ -297,6 +429,7 @@ class StrategyReview(db.Model):
 
     def delete(self):
         """Delete the review."""
+        Strategy.adjust_counters(self.strategy_id, rating_sum=-self.rating, rating_count=-1)
         db.session.delete(self)
         db.session.commit()
 
@@ -305,26 +438,72 @@ class StrategyReview(db.Model):
         return {column.name: getattr(self, column.name) for column in self.__table__.columns}
     
 
+# Per-process cache of decoded metrics, keyed by (strategy_id, updated_date); shared by request threads
+METRICS_PROJECTION_CACHE_SIZE = 1024
+_metrics_projection_cache = LRUCache(METRICS_PROJECTION_CACHE_SIZE)
+
+
 class StrategyPerformanceMetrics(db.Model):
     __tablename__ = 'strategy_performance_metrics'
     id = db.Column(db.Integer, primary_key=True)
     strategy_id = db.Column(db.Integer, db.ForeignKey('strategies.id'), nullable=False)
     settings=db.Column(db.JSON)
     metrics=db.Column(db.JSON)
+    updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Hot metrics copied out of the JSON for sorting and filtering
+    net_profit = db.Column(db.Float, nullable=True, index=True)
+    net_profit_percent = db.Column(db.Float, nullable=True, index=True)
+    max_drawdown = db.Column(db.Float, nullable=True, index=True)
+    max_drawdown_percent = db.Column(db.Float, nullable=True, index=True)
+    percent_profitable = db.Column(db.Float, nullable=True, index=True)
+    profit_factor = db.Column(db.Float, nullable=True, index=True)
+
+    # Column -> normalized metric key
+    HOT_METRICS = {
+        'net_profit': 'net_profit_all',
+        'net_profit_percent': 'net_profit_percent_all',
+        'max_drawdown': 'max_drawdown',
+        'max_drawdown_percent': 'max_drawdown_percent',
+        'percent_profitable': 'percent_profitable_all',
+        'profit_factor': 'profit_factor_all',
+    }
+
+    def set_metrics(self, raw_metrics, raw_settings=None):
+        """Normalize metrics (and settings) once and populate the hot metric columns."""
+        self.metrics = normalize_metrics(raw_metrics or {})
+        if raw_settings is not None:
+            self.settings = normalize_metrics(raw_settings)
+        for column, key in self.HOT_METRICS.items():
+            value = self.metrics.get(key)
+            setattr(self, column, float(value) if isinstance(value, (int, float)) else None)
+        self.updated_date = datetime.utcnow()
+
+    @staticmethod
+    def _decode(value):
+        """Decode a metrics/settings value; rows written before ingest-time normalization hold JSON text."""
+        if not value:
+            return {}
+        if isinstance(value, str):
+            return normalize_metrics(json.loads(value))
+        return value
 
     def to_dict(self):
         """Serialize the strategy performance metrics to a dictionary."""
-        # Assuming 'metrics' column stores JSON data
-        raw_metrics = json.loads(self.metrics) if self.metrics else {}
-
-        # Normalize and clean each key in the metrics dictionary
-        cleaned_metrics = {normalize_key(k): v for k, v in raw_metrics.items()}
-
+        cache_key = (self.strategy_id, self.updated_date)
+        projection = _metrics_projection_cache.get(cache_key) if self.updated_date else None
+        if projection is None:
+            projection = (self._decode(self.settings), self._decode(self.metrics))
+            if self.updated_date:
+                _metrics_projection_cache.set(cache_key, projection)
+
+        settings, metrics = projection
+        # Normalized mappings are flat, so shallow copies keep callers from mutating the shared cache
         data = {
             'id': self.id,
             'strategy_id': self.strategy_id,
-            'settings': json.loads(self.settings) if self.settings else {},
-            'metrics': cleaned_metrics,
+            'settings': dict(settings),
+            'metrics': dict(metrics),
         }
         return data
 
@@ -350,6 +529,8 @@ class StrategyPerformanceMetrics(db.Model):
     @staticmethod
     def handle_nan(value):
         """Convert NaN values to None."""
+        import pandas as pd  # Values come from a DataFrame, so pandas is already loaded
+
         return None if pd.isna(value) else value
 
     @classmethod
@@ -361,6 +542,19 @@ class StrategyPerformanceMetrics(db.Model):
         db.session.commit()
         return metrics
 
+    @classmethod
+    def renormalize_all(cls):
+        """Rewrite rows stored as raw JSON text into normalized metrics and hot columns."""
+        count = 0
+        for instance in cls.query.all():
+            if isinstance(instance.metrics, str) or isinstance(instance.settings, str) or instance.updated_date is None:
+                raw_metrics = json.loads(instance.metrics) if isinstance(instance.metrics, str) else (instance.metrics or {})
+                raw_settings = json.loads(instance.settings) if isinstance(instance.settings, str) else instance.settings
+                instance.set_metrics(raw_metrics, raw_settings)
+                count += 1
+        db.session.commit()
+        return count
+
     def save(self):
         db.session.add(self)
         db.session.commit()
\ No newline at end of file
@@ -4,13 +4,14 @@ from flask import Blueprint, flash, request, jsonify, redirect, url_for, render_
 from flask_login import login_required, current_user
 from apps.strategies.form import CreateStrategyForm, UpdateStrategyForm
 from apps.strategies.service import StrategyService # Adjust import paths as needed
-from apps.strategies.models import Strategy  # Adjust import path as needed
+from apps.strategies.models import Strategy, StrategyPerformanceMetrics  # Adjust import path as needed
 from apps.strategies import blueprint
 import logging
 from apps import db, login_manager
 from werkzeug.utils import secure_filename
-from apps.strategies.util import allowed_file, process_csv
+from apps.strategies.util import allowed_file, iter_pages, process_csv
 from apps.trading.utillity import generate_trade_uid
+from apps.serialization import streaming_json_response
 
 logger = logging.getLogger(__name__)
 
@@ -130,17 +131,56 @@ def upload_strategy_settings(strategy_id):
 
     return redirect(url_for('strategies.edit', strategy_id=strategy_id))
 
+# Query-string keys that control paging/sorting rather than filtering
+LISTING_ARGS = ('page', 'per_page', 'limit', 'sort', 'order', 'cursor', 'stream')
+
+
+def parse_listing_args(args):
+    """
+    Split marketplace query-string arguments into list_strategies keyword arguments.
+    e.g. ?coin_pair=BTCUSDT.P&time_frame=15min&net_profit_percent__gt=50&max_drawdown_percent__lt=20&sort=profit_factor&limit=20
+    """
+    return {
+        'filter_criteria': {k: v for k, v in args.items() if k not in LISTING_ARGS and '__' not in k},
+        'metric_filters': {k: v for k, v in args.items() if '__' in k},
+        'page': args.get('page', 1, type=int),
+        'per_page': args.get('limit', args.get('per_page', 20, type=int), type=int),
+        'sort_by': args.get('sort', 'creation_date'),
+        'descending': args.get('order', 'desc') != 'asc',
+        'cursor': args.get('cursor'),
+    }
+
+
 @blueprint.route('/list', methods=['GET'])
 @login_required
 def list_strategies():
-    # Example of simple filtering: get filter criteria from query parameters
-    filter_criteria = {key: value for key, value in request.args.items()}
-    
-    
-    strategies_list = StrategyService.list_strategies(filter_criteria=filter_criteria)
+    if request.args.get('stream'):
+        # Every matching strategy rather than one page
+        args = parse_listing_args(request.args)
+        for key in ('page', 'per_page', 'cursor'):
+            args.pop(key)
+        try:
+            strategies = StrategyService.iter_strategies(user_id=current_user.id, **args)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        return streaming_json_response(strategies, key='strategies')
+    strategies_list = StrategyService.list_strategies(user_id=current_user.id, **parse_listing_args(request.args))
     if strategies_list['status'] == 'success':
         # return jsonify(strategies_list['strategies']), 200
-        return render_template('strategies/marketplace.html', strategies=strategies_list['strategies'])
+        pagination = strategies_list['pagination']
+        page_links = list(iter_pages(pagination['page'], pagination['pages'])) if pagination['page'] else []
+        return render_template('strategies/marketplace.html', strategies=strategies_list['strategies'],
+                               pagination=pagination, page_links=page_links)
+    else:
+        return jsonify({'message': strategies_list['message']}), 400
+
+
+@blueprint.route('/search', methods=['GET'])
+@login_required
+def search_strategies():
+    strategies_list = StrategyService.list_strategies(user_id=current_user.id, **parse_listing_args(request.args))
+    if strategies_list['status'] == 'success':
+        return jsonify({'strategies': strategies_list['strategies'], 'pagination': strategies_list['pagination']}), 200
     else:
         return jsonify({'message': strategies_list['message']}), 400
 
@@ -250,6 +290,22 @@ def get_performance(strategy_id):
         return jsonify({'message': result['message']}), 404
 
 
+# CLI
+
+@blueprint.cli.command('repair-counters')
+def repair_counters():
+    """Recompute the denormalized subscriber/rating/bot counters on strategies."""
+    drifted = Strategy.repair_counters()
+    print(f'> Strategy counters repaired ({drifted} out of sync)')
+
+
+@blueprint.cli.command('normalize-metrics')
+def normalize_metrics():
+    """Normalize legacy JSON-text performance metrics and fill the hot metric columns."""
+    count = StrategyPerformanceMetrics.renormalize_all()
+    print(f'> Normalized performance metrics for {count} strategies')
+
+
 # Errors
 
 @login_manager.unauthorized_handler
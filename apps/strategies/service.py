@@ -2,11 +2,14 @@ from datetime import datetime, timedelta
 import json
 import logging
 
-import pandas as pd
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.orm import contains_eager, joinedload
 from apps.authentication.models import User
-from apps.strategies.models import Strategy, StrategyMetadata, StrategyPerformanceMetrics, Subscription
+from apps.strategies.models import Strategy, StrategyMetadata, StrategyPerformanceMetrics, StrategyReview, Subscription
+from apps.trading.models import TradingBot
 from apps import db
-from apps.strategies.util import normalize_key
+from apps.database import STREAM_YIELD_PER, read_replica
+from apps.strategies.util import decode_cursor, encode_cursor, normalize_key
 
 logger = logging.getLogger(__name__)
 
@@ -19,12 +22,9 @@ class StrategyService:
             db.session.add(new_strategy)
             db.session.flush()  # Flush to get the strategy_id before committing
 
-            # Assume performance metrics are to be stored in a single JSON column
-            # Adjust according to your model structure
-            performance_metrics_instance = StrategyPerformanceMetrics(
-                strategy_id=new_strategy.id,
-                metrics=json.dumps(strategy_metrics)  # Assuming a JSON column for simplicity
-            )
+            # Metrics are normalized once here and the hot ones copied into indexed columns
+            performance_metrics_instance = StrategyPerformanceMetrics(strategy_id=new_strategy.id)
+            performance_metrics_instance.set_metrics(strategy_metrics)
             db.session.add(performance_metrics_instance)
 
             # Save each setting as a separate entry in strategy metadata
@@ -59,6 +59,8 @@ class StrategyService:
                 if hasattr(strategy, key):
                     setattr(strategy, key, value)
             strategy.updated_date = datetime.utcnow()  # Manually set updated_date
+            # Bot pages show the strategy's name, pair and timeframe
+            db.session.execute(TradingBot.cache_version_bump(strategy_id=strategy.id))
             db.session.commit()
             return {'status': 'success', 'message': 'Strategy updated successfully.', 'strategy': strategy.to_dict()}
         except Exception as e:
@@ -78,11 +80,14 @@ class StrategyService:
             return {'status': 'error', 'message': 'Strategy not found.'}
 
         try:
+            import pandas as pd  # Deferred: only the CSV paths need pandas
+
             # Load CSV file
             df = pd.read_csv(csv_file_path)
-            # Iterate over rows and update/create metadata entries
-            for _, row in df.iterrows():
-                StrategyMetadata.update_or_create(strategy_id=strategy_id, key=row['Parameter'], value=row['Value'])
+            # Upsert all parameters in a single statement and commit
+            settings = dict(zip(df['Parameter'], df['Value']))
+            inserted, updated = StrategyMetadata.bulk_upsert(strategy_id, settings)
+            logger.info(f'Strategy {strategy_id} settings: {inserted} inserted, {updated} updated.')
             return {'status': 'success', 'message': 'Strategy settings uploaded successfully.'}
         except Exception as e:
             db.session.rollback()
@@ -99,6 +104,8 @@ class StrategyService:
         if not strategy_metadata:
             return {'status': 'error', 'message': 'No settings found for the strategy.'}
 
+        import pandas as pd
+
         # Convert metadata to DataFrame
         df = pd.DataFrame([{'Parameter': md.key, 'Value': md.value} for md in strategy_metadata])
         csv_file_path = f'/path/to/downloaded/settings_strategy_{strategy_id}.csv'  # Define path dynamically
@@ -128,6 +135,7 @@ class StrategyService:
             # Optional: Delete related data (e.g., performance metrics, subscriptions)
             # This step depends on your database design and whether you're using cascading deletes.
             
+            db.session.execute(TradingBot.cache_version_bump(strategy_id=strategy.id))
             db.session.delete(strategy)
             db.session.commit()
             return {'status': 'success', 'message': 'Strategy deleted successfully.'}
@@ -150,28 +158,165 @@ class StrategyService:
         else:
             return {'status': 'error', 'message': 'Strategy not found.'} 
 
+    # Operators accepted as <metric>__<op>=<value> in metric filters
+    METRIC_FILTER_OPERATORS = {
+        'gt': lambda column, value: column > value,
+        'gte': lambda column, value: column >= value,
+        'lt': lambda column, value: column < value,
+        'lte': lambda column, value: column <= value,
+        'eq': lambda column, value: column == value,
+    }
+
     @staticmethod
-    def list_strategies(filter_criteria=None):
+    def _listing_query(filter_criteria, user_id, sort_by, metric_filters):
         """
-        Lists all strategies, optionally filtered by criteria.
-        :param filter_criteria: Criteria for filtering the strategies. This should be a dictionary where
-                                keys are column names and values are the expected column values.
-        :return: A dictionary with the list of serialized strategies or an error message.
+        Marketplace query shared by list_strategies and iter_strategies, filtered but
+        not yet ordered. Rows are (strategy, is_subscribed, is_botified, sort_value).
+        :return: (query, the effective sort_by, its sort column).
+        """
+        is_subscribed = exists().where(and_(Subscription.strategy_id == Strategy.id, Subscription.user_id == user_id))
+        is_botified = exists().where(and_(TradingBot.strategy_id == Strategy.id, TradingBot.user_id == user_id))
+
+        sort_columns = {
+            'creation_date': Strategy.creation_date,
+            'strategy_name': Strategy.strategy_name,
+            'subscribers_count': Strategy.subscriber_count,
+            'average_rating': Strategy.average_rating_expression(),
+            'reviews_count': Strategy.rating_count,
+            'bot_count': Strategy.bot_count,
+        }
+        for metric in StrategyPerformanceMetrics.HOT_METRICS:
+            sort_columns[metric] = getattr(StrategyPerformanceMetrics, metric)
+        if sort_by not in sort_columns:
+            sort_by = 'creation_date'
+        sort_column = sort_columns[sort_by]
+
+        query = db.session.query(
+            Strategy,
+            is_subscribed.label('is_subscribed'),
+            is_botified.label('is_botified'),
+            sort_column.label('sort_value')
+        ).outerjoin(StrategyPerformanceMetrics, StrategyPerformanceMetrics.strategy_id == Strategy.id) \
+         .options(joinedload(Strategy.developer), contains_eager(Strategy.performance_metrics))
+
+        if filter_criteria:
+            for key, value in filter_criteria.items():
+                if key in Strategy.__table__.columns:
+                    query = query.filter(getattr(Strategy, key) == value)
+
+        if metric_filters:
+            for key, value in metric_filters.items():
+                metric, _, op = key.rpartition('__')
+                if metric not in StrategyPerformanceMetrics.HOT_METRICS or op not in StrategyService.METRIC_FILTER_OPERATORS:
+                    raise ValueError(f'Unsupported metric filter: {key}')
+                column = getattr(StrategyPerformanceMetrics, metric)
+                query = query.filter(StrategyService.METRIC_FILTER_OPERATORS[op](column, float(value)))
+
+        return query, sort_by, sort_column
+
+    @staticmethod
+    def _keyset_order(query, sort_column, descending):
+        """
+        Order by (sort_column, id) with NULL sort values last in either direction:
+        creation_date is nullable and metric columns are NULL for strategies without metrics.
+        """
+        if descending:
+            return query.order_by(sort_column.desc().nullslast(), Strategy.id.desc())
+        return query.order_by(sort_column.asc().nullslast(), Strategy.id.asc())
+
+    @staticmethod
+    def _after_cursor(query, sort_column, last_value, last_id, descending):
+        """Rows that follow (last_value, last_id) in _keyset_order; NULLs compare unknown, so they get explicit branches."""
+        beyond = (lambda column, value: column < value) if descending else (lambda column, value: column > value)
+        if last_value is None:
+            # Already in the trailing NULL block
+            return query.filter(sort_column.is_(None), beyond(Strategy.id, last_id))
+        return query.filter(or_(
+            beyond(sort_column, last_value),
+            and_(sort_column == last_value, beyond(Strategy.id, last_id)),
+            sort_column.is_(None),
+        ))
+
+    @staticmethod
+    @read_replica
+    def list_strategies(filter_criteria=None, user_id=None, page=1, per_page=20, sort_by='creation_date',
+                        descending=True, metric_filters=None, cursor=None):
+        """
+        Lists strategies for the marketplace, optionally filtered by criteria.
+        Subscriber counts and ratings come from the denormalized counter columns
+        and the user's subscribed/botified flags from EXISTS subqueries, so the
+        whole page is a single round trip. Metric filters and sorting are
+        evaluated in SQL against the indexed StrategyPerformanceMetrics columns.
+        :param filter_criteria: Dictionary of column name -> expected column value.
+        :param user_id: ID of the viewing user, used for the is_subscribed/is_botified flags.
+        :param page: 1-based page number, ignored when a cursor is given.
+        :param per_page: Number of strategies per page.
+        :param sort_by: One of creation_date, strategy_name, subscribers_count, average_rating,
+                        reviews_count, bot_count or a hot metric column such as profit_factor.
+        :param descending: Sort direction.
+        :param metric_filters: Dictionary of '<metric>__<op>' -> value, e.g. {'net_profit_percent__gt': 50}.
+        :param cursor: Opaque keyset cursor returned as next_cursor by a previous call.
+        :return: A dictionary with the list of serialized strategies and pagination details, or an error message.
         """
         try:
-            query = Strategy.query
-            
-            if filter_criteria:
-                for key, value in filter_criteria.items():
-                    if hasattr(Strategy, key):
-                        query = query.filter(getattr(Strategy, key) == value)
+            query, sort_by, sort_column = StrategyService._listing_query(filter_criteria, user_id, sort_by, metric_filters)
+
+            per_page = max(min(int(per_page), 100), 1)
+
+            if cursor:
+                last_value, last_id = decode_cursor(cursor)
+                if sort_by == 'creation_date' and last_value is not None:
+                    last_value = datetime.fromisoformat(last_value)
+                query = StrategyService._after_cursor(query, sort_column, last_value, last_id, descending)
+            query = StrategyService._keyset_order(query, sort_column, descending)
+
+            if cursor:
+                total = None
+                rows = query.limit(per_page + 1).all()
+            else:
+                page = max(int(page), 1)
+                total = query.order_by(None).count()
+                rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+
+            has_more = len(rows) > per_page
+            rows = rows[:per_page]
+
+            next_cursor = encode_cursor(rows[-1].sort_value, rows[-1][0].id) if has_more else None
 
-            strategies = query.all()
-            return {'status': 'success', 'strategies': Strategy.list_to_dict(strategies)}
+            strategies = [
+                strategy.to_summary_dict(is_subscribed=subscribed, is_botified=botified)
+                for strategy, subscribed, botified, _ in rows
+            ]
+            pagination = {
+                'page': None if cursor else page,
+                'per_page': per_page,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page if total is not None else None,
+                'next_cursor': next_cursor
+            }
+            return {'status': 'success', 'strategies': strategies, 'pagination': pagination}
         except Exception as e:
             # Log the error and return an error message
             return {'status': 'error', 'message': f'Failed to list strategies: {str(e)}'}
 
+    @staticmethod
+    def iter_strategies(filter_criteria=None, user_id=None, sort_by='creation_date', descending=True,
+                        metric_filters=None):
+        """
+        Every strategy matching the marketplace filters (see list_strategies), serialized
+        one at a time from a server-side cursor. Invalid filters raise ValueError here
+        rather than once the response has started.
+        """
+        query, sort_by, sort_column = StrategyService._listing_query(filter_criteria, user_id, sort_by, metric_filters)
+        query = StrategyService._keyset_order(query, sort_column, descending)
+        return StrategyService._summaries(query.yield_per(STREAM_YIELD_PER))
+
+    @staticmethod
+    @read_replica
+    def _summaries(rows):
+        for strategy, subscribed, botified, _ in rows:
+            yield strategy.to_summary_dict(is_subscribed=subscribed, is_botified=botified)
+
     @staticmethod
     def subscribe_to_strategy(user_id, strategy_id, subscription_type):
         """
@@ -195,6 +340,7 @@ class StrategyService:
         new_subscription = Subscription(user_id=user_id, strategy_id=strategy_id, subscription_type=subscription_type)
         db.session.add(new_subscription)
         try:
+            Strategy.adjust_counters(strategy.id, subscriber_count=1)
             db.session.commit()
             return {'status': 'success', 'message': 'Subscription successful'}
         except Exception as e:
@@ -216,6 +362,7 @@ class StrategyService:
         
         db.session.delete(subscription)
         try:
+            Strategy.adjust_counters(subscription.strategy_id, subscriber_count=-1)
             db.session.commit()
             return {'status': 'success', 'message': 'Unsubscribed successfully'}
         except Exception as e:
@@ -251,6 +398,8 @@ class StrategyService:
         """
         # Read the CSV file, assuming the first row contains the optimal metrics
         try:
+            import pandas as pd
+
             df = pd.read_csv(csv_file_path)
             # Select the first row
             optimal_metrics = df.iloc[0].to_dict()
@@ -261,14 +410,10 @@ class StrategyService:
             # Check if there's an existing record for the strategy
             performance_record = StrategyPerformanceMetrics.query.filter_by(strategy_id=strategy_id).first()
             
-            if performance_record:
-                # Update existing record
-                for key, value in performance_data.items():
-                    if hasattr(performance_record, key):
-                        setattr(performance_record, key, value)
-            else:
+            if not performance_record:
                 # Create a new record
-                performance_record = StrategyPerformanceMetrics(strategy_id=strategy_id, **performance_data)
+                performance_record = StrategyPerformanceMetrics(strategy_id=strategy_id)
+            performance_record.set_metrics(performance_data)
             
             # Save the path to the CSV file for future reference
             # Assuming there's a field in the Strategy or StrategyPerformanceMetrics model for this
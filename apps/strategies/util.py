@@ -1,7 +1,11 @@
 # util.py
 
+import base64
+import json
+import math
 import re
-import pandas as pd
+from datetime import datetime
+from functools import lru_cache
 
 
 def format_currency(value):
@@ -74,6 +78,8 @@ def process_csv(filepath):
         details['time_frame'] = time_frame.replace('D', ' day')
     
     try:
+        import pandas as pd  # Deferred: only the CSV upload path needs pandas
+
         # Reading the CSV file
         df = pd.read_csv(filepath)
         
@@ -95,6 +101,7 @@ def process_csv(filepath):
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
     
+@lru_cache(maxsize=2048)
 def normalize_key(key):
     # Clean and normalize the key as specified
     return (key.replace(' ', '_')
@@ -106,5 +113,44 @@ def normalize_key(key):
             .replace('/_', '_')
             .lower())
 
+def to_native(value):
+    """Convert numpy/pandas scalars to plain Python values and NaN to None."""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def normalize_metrics(raw_metrics):
+    """Normalize the keys and values of a raw metrics/settings mapping once, at ingest time."""
+    return {normalize_key(k): to_native(v) for k, v in raw_metrics.items()}
+
+def encode_cursor(value, row_id):
+    """Encode a keyset pagination position (last sort value, last id) as an opaque token."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif hasattr(value, 'is_finite'):  # Decimal
+        value = float(value)
+    payload = json.dumps([value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a token produced by encode_cursor into (value, id)."""
+    value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    return value, int(row_id)
+
+def iter_pages(page, pages, left_edge=1, around=2, right_edge=1):
+    """
+    Page numbers to link around the current page, with None where a run of pages is
+    skipped, e.g. 1 None 8 9 10 11 12 None 40 (as Flask-SQLAlchemy's Pagination.iter_pages).
+    """
+    last = 0
+    for number in range(1, (pages or 0) + 1):
+        if number <= left_edge or abs(number - page) <= around or number > pages - right_edge:
+            if last + 1 != number:
+                yield None
+            yield number
+            last = number
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'csv'}
\ No newline at end of file
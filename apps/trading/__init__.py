@@ -3,5 +3,6 @@ from flask import Blueprint
 blueprint = Blueprint(
     'trading_blueprint',
     __name__,
-    url_prefix='/trading'  # Set the desired URL prefix for the trading blueprint
+    url_prefix='/trading',  # Set the desired URL prefix for the trading blueprint
+    cli_group='trading',  # flask trading <command>
 )
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""
+Native ASGI endpoints for the trading hot path, mounted by apps.asgi.create_asgi_app.
+They mirror the Flask routes of the same path and share their validation.
+"""
+
+import logging
+
+from apps.asgi import BodyTooLarge, header, read_body, send_json
+from apps.trading.async_service import AsyncTradingService
+from apps.trading.webhooks import BAD_SIZE, WEBHOOK_MAX_BODY_BYTES, is_signed, validate_webhook
+
+logger = logging.getLogger(__name__)
+
+
+async def webhook(scope, receive, send):
+    """POST /trading/webhook without leaving the event loop."""
+    content_length = header(scope, b'content-length')
+    if content_length is None or not content_length.isdigit() or int(content_length) > WEBHOOK_MAX_BODY_BYTES:
+        return await send_json(send, *BAD_SIZE)
+    try:
+        body = await read_body(receive, WEBHOOK_MAX_BODY_BYTES)
+    except BodyTooLarge:
+        return await send_json(send, *BAD_SIZE)
+
+    signature = header(scope, b'x-signature')
+    signed_bot_id = header(scope, b'x-bot-id')
+    timestamp = header(scope, b'x-signature-timestamp')
+    # Signed signals: verify HMAC over the timestamp and raw body before decoding any JSON
+    signature_valid = is_signed(signature, signed_bot_id) and \
+        await AsyncTradingService.verify_webhook_signature(signed_bot_id, timestamp, body, signature)
+    payload, error = validate_webhook(body, signature, signed_bot_id, signature_valid)
+    if error:
+        return await send_json(send, *error)
+
+    try:
+        response = await AsyncTradingService.process_order(payload)
+        logger.info(f"{response['status']}: {response['message']}")
+        return await send_json(send, response, 200)
+    except Exception as e:
+        logger.error(f"Exception: {str(e)}")
+        return await send_json(send, {"errorCode": "server_error", "message": str(e)}, 500)
@@ -0,0 +1,111 @@
+"""
+Native-async version of the signal hot path, on AsyncSession.
+
+Business rules live in TradingService (parse_signal, open_position_from_signal,
+apply_fill, apply_pnl); this module only does the I/O, so both paths stay in step.
+"""
+
+import logging
+from typing import Any, Dict
+
+from sqlalchemy import select
+
+from apps.async_db import async_session
+from apps.exchanges.models import Account
+from apps.trading.events import publish_order_events
+from apps.trading.models import Position, TradingBot
+from apps.trading.service import TradingService
+from apps.trading.webhooks import timestamp_fresh, webhook_secrets
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTradingService:
+
+    @staticmethod
+    async def get_webhook_secret(session, bot_id: int) -> bytes:
+        """Async twin of TradingService.get_webhook_secret, sharing its cache."""
+        secret = webhook_secrets.lookup(bot_id)
+        if secret is None:
+            secret = webhook_secrets.store(bot_id, (await session.execute(
+                select(TradingBot.webhook_secret).where(TradingBot.id == bot_id)
+            )).scalar())
+        return secret
+
+    @staticmethod
+    async def verify_webhook_signature(bot_id: str, timestamp: str, body: bytes, signature: str) -> bool:
+        if not bot_id or not signature or not timestamp_fresh(timestamp):
+            return False
+        try:
+            bot_id = int(bot_id)
+        except ValueError:
+            return False
+        async with async_session() as session:
+            secret = await AsyncTradingService.get_webhook_secret(session, bot_id)
+        if not secret:
+            return False
+        return TradingService.signature_matches(secret, timestamp, body, signature)
+
+    @staticmethod
+    async def process_order(data: Dict[str, Any]) -> Dict[str, Any]:
+        async with async_session() as session:
+            try:
+                # Step 1: Get Bot
+                bot = await session.get(TradingBot, int(data['bot_id']))
+                if not bot:
+                    raise ValueError("Trading bot not found")
+
+                # Step 2: Parse Signal Data
+                parsed_data = TradingService.parse_signal(data)
+
+                # Step 3: Execute Order
+                order = TradingService.execute_order(parsed_data, bot)
+
+                # Step 4: Update Position
+                position = (await session.execute(
+                    select(Position).filter_by(trading_bot_id=bot.id, symbol=parsed_data['symbol'], status='open')
+                    .limit(1).with_for_update()
+                )).scalars().first()
+                if not position:
+                    position = TradingService.open_position_from_signal(bot.id, parsed_data)
+                    session.add(position)
+                else:
+                    TradingService.apply_fill(position, parsed_data)
+                await session.flush()
+
+                # Step 5: Commit Order with Position ID
+                order.position_id = position.id
+                session.add(order)
+                await session.execute(TradingBot.cache_version_bump(bot_id=bot.id))
+                await session.commit()
+
+                # Step 6: Calculate PnL
+                account = None
+                if TradingService.needs_pnl(position):
+                    # Locked re-read, as in TradingService.calculate_pnl
+                    position = (await session.execute(
+                        select(Position).filter_by(id=position.id).with_for_update()
+                        .execution_options(populate_existing=True)
+                    )).scalar_one()
+                    account = await session.get(Account, bot.exchange_account_id)
+                    credit = TradingService.apply_pnl(position, parsed_data['order_price'], account)
+                    await session.execute(TradingBot.cache_version_bump(account_id=account.id))
+                    for statement in credit:
+                        await session.execute(statement)
+                    await session.commit()
+
+                # Push the deltas to the owner's live dashboards
+                publish_order_events(bot, order, position, account)
+
+                # Step 7: Manage Risk (Optional)
+                TradingService.manage_risk(parsed_data, position)
+
+                # Step 8: Notify
+                TradingService.send_notifications(parsed_data, order)
+
+                return {'status': 'success', 'message': 'Order executed successfully', 'order': order.to_dict(), 'position': position.to_dict()}
+
+            except Exception as e:
+                logger.error(f"Exception in async process_order: {str(e)}")
+                await session.rollback()
+                return {'status': 'error', 'message': str(e)}
@@ -0,0 +1,245 @@
+"""
+Local OHLCV candle store.
+
+Candles are kept per (exchange, symbol, timeframe) in append-only files of
+fixed-size binary records, read back through numpy.memmap so readers get
+zero-copy views instead of parsed lists:
+
+    <CANDLE_STORE_DIR>/<exchange>/<symbol>/<timeframe>.ohlcv
+
+Only closed candles are stored, in ascending timestamp order. Syncing
+fetches from the last stored bar onwards, so history is downloaded once.
+"""
+
+import logging
+import os
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CANDLE_STORE_DIR = os.getenv('CANDLE_STORE_DIR', os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'candles'))
+CANDLE_FETCH_LIMIT = int(os.getenv('CANDLE_FETCH_LIMIT', 1000))
+
+CANDLE_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+_TIMEFRAME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'M': 2592000, 'y': 31536000}
+_UNSAFE_PATH_CHARS = re.compile(r'[^A-Za-z0-9._-]')
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """'5m' -> 300000, same units as ccxt's Exchange.parse_timeframe."""
+    amount, unit = timeframe[:-1], timeframe[-1]
+    if unit not in _TIMEFRAME_UNITS or not amount.isdigit():
+        raise ValueError(f'Invalid timeframe: {timeframe}')
+    return int(amount) * _TIMEFRAME_UNITS[unit] * 1000
+
+
+def to_records(rows) -> np.ndarray:
+    """CCXT rows [[timestamp, open, high, low, close, volume], ...] as a structured array."""
+    records = np.empty(len(rows), dtype=CANDLE_DTYPE)
+    if len(rows):
+        values = np.asarray(rows, dtype='f8')
+        records['timestamp'] = values[:, 0].astype('i8')
+        for index, name in enumerate(CANDLE_DTYPE.names[1:], start=1):
+            records[name] = values[:, index]
+    return records
+
+
+def to_rows(records: np.ndarray) -> List[list]:
+    """Structured array back to CCXT rows, e.g. for callers expecting fetch_ohlcv output."""
+    return [[int(record[0])] + [float(value) for value in tuple(record)[1:]] for record in records]
+
+
+class CandleStore:
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or CANDLE_STORE_DIR)
+
+    def path(self, exchange_id: str, symbol: str, timeframe: str) -> str:
+        return os.path.join(
+            self.root,
+            _UNSAFE_PATH_CHARS.sub('_', exchange_id),
+            _UNSAFE_PATH_CHARS.sub('_', symbol),
+            _UNSAFE_PATH_CHARS.sub('_', timeframe) + '.ohlcv',
+        )
+
+    def read(self, exchange_id: str, symbol: str, timeframe: str,
+             since: Optional[int] = None, until: Optional[int] = None) -> np.ndarray:
+        """
+        Memory-mapped, read-only view of the stored candles, optionally limited
+        to since <= timestamp < until. Columns are views too: read(...)['close'].
+        """
+        path = self.path(exchange_id, symbol, timeframe)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        # Ignore a trailing partial record left by an interrupted append
+        count = size // CANDLE_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        candles = np.memmap(path, dtype=CANDLE_DTYPE, mode='r', shape=(count,))
+        if since is None and until is None:
+            return candles
+        timestamps = candles['timestamp']
+        start = np.searchsorted(timestamps, since, side='left') if since is not None else 0
+        end = np.searchsorted(timestamps, until, side='left') if until is not None else count
+        return candles[start:end]
+
+    def last_timestamp(self, exchange_id: str, symbol: str, timeframe: str) -> Optional[int]:
+        candles = self.read(exchange_id, symbol, timeframe)
+        return int(candles['timestamp'][-1]) if len(candles) else None
+
+    def append(self, exchange_id: str, symbol: str, timeframe: str, rows) -> int:
+        """
+        Append candles newer than the last stored one. Rows may be CCXT lists or a
+        CANDLE_DTYPE array; duplicates and bars that have not closed yet are dropped.
+        :return: Number of candles written.
+        """
+        records = rows if isinstance(rows, np.ndarray) and rows.dtype == CANDLE_DTYPE else to_records(rows)
+        if not len(records):
+            return 0
+        records = np.sort(records, order='timestamp')
+        _, unique = np.unique(records['timestamp'], return_index=True)
+        records = records[unique]
+
+        last = self.last_timestamp(exchange_id, symbol, timeframe)
+        closed_before = int(time.time() * 1000) - timeframe_to_ms(timeframe)
+        mask = records['timestamp'] <= closed_before
+        if last is not None:
+            mask &= records['timestamp'] > last
+        records = records[mask]
+        if not len(records):
+            return 0
+
+        path = self.path(exchange_id, symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One O_APPEND write per batch so concurrent readers never see reordered rows
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, records.tobytes())
+        finally:
+            os.close(fd)
+        return len(records)
+
+    def gaps(self, exchange_id: str, symbol: str, timeframe: str) -> List[Tuple[int, int]]:
+        """
+        Missing ranges in the stored history as (first_missing, last_missing)
+        timestamps. Some exchanges have real gaps (maintenance windows), so
+        this only reports them; backfill() attempts to fill them.
+        """
+        timestamps = self.read(exchange_id, symbol, timeframe)['timestamp']
+        if len(timestamps) < 2:
+            return []
+        step = timeframe_to_ms(timeframe)
+        indexes = np.flatnonzero(np.diff(timestamps) > step)
+        return [(int(timestamps[i]) + step, int(timestamps[i + 1]) - step) for i in indexes]
+
+    def sync(self, fetch_ohlcv: Callable, exchange_id: str, symbol: str, timeframe: str,
+             since: Optional[int] = None, limit: int = CANDLE_FETCH_LIMIT) -> int:
+        """
+        Fetch only the bars missing after the last stored candle (or from since
+        when the store is empty) and append them.
+        :param fetch_ohlcv: A ccxt exchange's fetch_ohlcv(symbol, timeframe, since, limit).
+        :return: Number of candles appended.
+        """
+        pages = self._sync_pages(exchange_id, symbol, timeframe, since)
+        try:
+            cursor = next(pages)
+            while True:
+                cursor = pages.send(fetch_ohlcv(symbol, timeframe, cursor, limit))
+        except StopIteration as done:
+            return done.value
+
+    async def async_sync(self, fetch_ohlcv: Callable, exchange_id: str, symbol: str, timeframe: str,
+                         since: Optional[int] = None, limit: int = CANDLE_FETCH_LIMIT) -> int:
+        """sync() for ccxt.async_support exchanges."""
+        pages = self._sync_pages(exchange_id, symbol, timeframe, since)
+        try:
+            cursor = next(pages)
+            while True:
+                cursor = pages.send(await fetch_ohlcv(symbol, timeframe, cursor, limit))
+        except StopIteration as done:
+            return done.value
+
+    def _sync_pages(self, exchange_id: str, symbol: str, timeframe: str, since: Optional[int]):
+        """
+        The paging behind sync() and async_sync(): yields the since of each fetch,
+        is sent the rows it returned, and returns the number of candles appended.
+        Exchanges cap a page at their own limit, often below the one requested, so
+        a short page doesn't mean the history is complete; paging stops once a page
+        stores nothing new or the next bar has not closed yet.
+        """
+        step = timeframe_to_ms(timeframe)
+        last = self.last_timestamp(exchange_id, symbol, timeframe)
+        cursor = last + step if last is not None else since
+        appended = 0
+        while True:
+            rows = yield cursor
+            if not rows:
+                break
+            added = self.append(exchange_id, symbol, timeframe, rows)
+            appended += added
+            cursor = int(rows[-1][0]) + step
+            if not added or cursor > int(time.time() * 1000) - step:
+                break
+        if appended:
+            logger.info(f"Stored {appended} {timeframe} candles for {exchange_id} {symbol}")
+        return appended
+
+    def backfill(self, fetch_ohlcv: Callable, exchange_id: str, symbol: str, timeframe: str,
+                 limit: int = CANDLE_FETCH_LIMIT) -> int:
+        """
+        Try to fill detected gaps. Inserting into the middle of an append-only
+        file means rewriting it, so the merged history is written to a temporary
+        file and swapped in with os.replace; open memmaps keep the old copy.
+        :return: Number of candles added.
+        """
+        step = timeframe_to_ms(timeframe)
+        fetched = []
+        for start, end in self.gaps(exchange_id, symbol, timeframe):
+            cursor = start
+            while cursor <= end:
+                rows = fetch_ohlcv(symbol, timeframe, cursor, limit)
+                rows = [row for row in rows or [] if start <= row[0] <= end]
+                if not rows:
+                    break
+                fetched.extend(rows)
+                cursor = int(rows[-1][0]) + step
+        if not fetched:
+            return 0
+
+        existing = self.read(exchange_id, symbol, timeframe)
+        merged = np.concatenate([np.asarray(existing), to_records(fetched)])
+        merged = np.sort(merged, order='timestamp')
+        _, unique = np.unique(merged['timestamp'], return_index=True)
+        merged = merged[unique]
+        added = len(merged) - len(existing)
+
+        path = self.path(exchange_id, symbol, timeframe)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as handle:
+            handle.write(merged.tobytes())
+        os.replace(temporary, path)
+        return added
+
+
+_store = None
+
+
+def get_candle_store() -> CandleStore:
+    global _store
+    if _store is None:
+        _store = CandleStore()
+    return _store
@@ -1,13 +1,33 @@
-import ccxt.async_support as ccxt  # Import asynchronous version of CCXT
-from ccxt.base.errors import OrderNotFound, ExchangeError, NetworkError
 import logging
 import asyncio
+import threading
 from typing import Dict, Any, List, Optional
+from apps.trading.symbols import SymbolRegistry, get_registry, set_registry, strip_suffix
 
 # Configure basic logging for the application
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# ccxt loads every exchange class on import (about a second), so it is imported by
+# load_ccxt() when the first CCXTService is created rather than when the app starts
+ccxt = None  # ccxt.async_support
+OrderNotFound = ExchangeError = NetworkError = None
+
+
+def load_ccxt():
+    """Import ccxt.async_support and its error classes into this module on first use."""
+    global ccxt, OrderNotFound, ExchangeError, NetworkError
+    if ccxt is None:
+        import ccxt.async_support as ccxt_async
+        from ccxt.base.errors import OrderNotFound, ExchangeError, NetworkError
+        ccxt = ccxt_async
+    return ccxt
+
+
+def warm_ccxt():
+    """Import ccxt on a background thread so a worker can serve requests while it loads."""
+    threading.Thread(target=load_ccxt, name='ccxt-import', daemon=True).start()
+
 class CCXTService:
     """
     A class for interacting with cryptocurrency exchanges using the CCXT library,
@@ -25,14 +45,28 @@ class CCXTService:
         self.exchange_id: str = exchange_id.lower()
         self.api_key: str = api_key
         self.api_secret: str = api_secret
-        self.exchange: Optional[ccxt.Exchange] = None
+        self.exchange: Optional[Any] = None
+        self.registry: Optional[SymbolRegistry] = None
+        load_ccxt()
 
     async def initialize_exchange(self):
         """Asynchronously initializes the exchange with API credentials."""
         if self.exchange is None:  # Check if the exchange has already been initialized
+            from apps.trading.paper_exchange import PaperExchange, is_paper_exchange
+
             try:
-                exchange_class = getattr(ccxt, self.exchange_id)()
-                await exchange_class.load_markets()
+                if is_paper_exchange(self.exchange_id):
+                    exchange_class = PaperExchange(self.exchange_id)
+                else:
+                    exchange_class = getattr(ccxt, self.exchange_id)()
+                registry = get_registry(self.exchange_id)
+                if registry is None:
+                    await exchange_class.load_markets()
+                    registry = set_registry(self.exchange_id, exchange_class.markets, exchange_class.currencies)
+                else:
+                    # Reuse the markets cached by an earlier instance instead of reloading them
+                    exchange_class.set_markets(registry.markets, registry.currencies)
+                self.registry = registry
                 exchange_class.apiKey = self.api_key
                 exchange_class.secret = self.api_secret
                 exchange_class.enableRateLimit = True
@@ -48,7 +82,7 @@ class CCXTService:
     async def create_order(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Processes a trade order based on the given payload."""
         # Extracting order details from the payload
-        symbol = payload.get('symbol', '').rstrip('.P')  # Remove trailing '.P' if present
+        symbol = self.format_symbol(payload.get('symbol', ''))
         order_type = payload['type']
         side = payload['order_side']
         amount = payload['order_size']
@@ -60,10 +94,27 @@ class CCXTService:
             if order_type in ['limit', 'market']:
                 logger.info(f"Order received")
 
+                # Round to exchange precision and check limits locally so the exchange never rejects for them
+                market = self.registry.resolve(symbol) if self.registry else None
+                if market is not None:
+                    amount = float(self.exchange.amount_to_precision(symbol, amount))
+                    if price is not None:
+                        price = float(self.exchange.price_to_precision(symbol, price))
+                    reference_price = price
+                    if reference_price is None and SymbolRegistry.min_cost(market):
+                        # Market orders carry no price: value them at the current one so the
+                        # minimum notional still applies
+                        reference_price = await self.current_price(symbol)
+                    limit_error = SymbolRegistry.check_limits(market, amount, reference_price)
+                    if limit_error:
+                        logger.warning(limit_error)
+                        return {"success": False, "error": limit_error}
+
                 # Using the generalized create_order method for both limit and market orders
                 order = await self.exchange.create_order(symbol, order_type, side, amount, price)
                 logger.info(f"Order processed successfully: {order}")
-                return {"success": True, "order": order}
+                # The amount and price actually sent, after rounding; record these rather than the payload's
+                return {"success": True, "order": order, "amount": amount, "price": price}
             else:
                 logger.warning(f"Invalid order type: {order_type}")
                 raise ValueError("Invalid order type")
@@ -77,10 +128,19 @@ class CCXTService:
             # Close the exchange to release all resources
             await self.exchange.close()
 
+    async def current_price(self, symbol: str) -> Optional[float]:
+        """Mark (or last) price of a symbol from its ticker, or None if it can't be fetched."""
+        try:
+            ticker = (await self.exchange.fetch_tickers([symbol])).get(symbol) or {}
+        except (ExchangeError, NetworkError) as e:
+            logger.warning(f"Could not fetch the price of {symbol}: {e}")
+            return None
+        price = ticker.get('markPrice') or ticker.get('last') or ticker.get('close')
+        return float(price) if price else None
+
     async def get_order(self, order_id: str, symbol: str) -> Dict[str, Any]:
         """Fetches a specific order by its ID and symbol."""
-        if symbol.endswith('.P'):
-            symbol = symbol[:-2]
+        symbol = self.format_symbol(symbol)
         try:
             logger.warning(f"Received parameters: {order_id}, {symbol}")
             order = await self.exchange.fetch_order(order_id, symbol)
@@ -213,10 +273,13 @@ class CCXTService:
         - symbol (str): The original symbol that may contain exchange-specific suffixes or formats.
 
         Returns:
-        - str: The formatted symbol without any exchange-specific suffixes.
+        - str: The unified CCXT symbol (e.g. 'BTC/USDT:USDT' for 'BTCUSDT.P') when the market is known,
+               otherwise the symbol with the '.P' suffix removed.
         """
-        # This example removes a specific suffix; adjust as needed
-        return symbol.rstrip('.P')
+        market = self.registry.resolve(symbol) if self.registry else None
+        if market is not None:
+            return market['symbol']
+        return strip_suffix(symbol)
 
 
     async def fetch_open_orders(self, symbol: Optional[str] = None, since: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, Any]:
@@ -456,6 +519,35 @@ class CCXTService:
                 await self.exchange.close()
             
 
+    async def fetch_tickers(self, symbols: List[str]) -> Dict[str, Any]:
+        """
+        Fetches tickers for many symbols in one request.
+
+        Parameters:
+        - symbols (List[str]): Symbols as stored on positions (e.g., 'BTCUSDT.P'); they are resolved to unified symbols.
+
+        Returns:
+        - Dict[str, Any]: A dictionary with the tickers keyed by the symbols as given, or an error message.
+        """
+        if not self.exchange:
+            logger.error("Exchange not initialized.")
+            return {"success": False, "error": "Exchange not initialized"}
+
+        unified = {self.format_symbol(symbol): symbol for symbol in symbols}
+        try:
+            tickers = await self.exchange.fetch_tickers(list(unified))
+            return {"success": True, "tickers": {unified[key]: ticker for key, ticker in tickers.items() if key in unified}}
+        except (ExchangeError, NetworkError) as e:
+            logger.error(f"An error occurred while fetching tickers: {e}")
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while fetching tickers: {e}")
+            return {"success": False, "error": "An unexpected error occurred"}
+        finally:
+            # Close the exchange to release all resources
+            await self.exchange.close()
+
+
     async def set_leverage(self, leverage: int, symbol: str) -> Dict[str, Any]:
         """
         Sets the leverage for a specific symbol if the exchange supports it.
@@ -1,6 +1,8 @@
 import ccxt
 from datetime import datetime
 
+from apps.trading.candles import get_candle_store, to_rows
+
 class CCXTServiceB:
     def __init__(self, exchange_id, api_key, api_secret):
         self.exchange = getattr(ccxt, exchange_id)({
@@ -44,12 +46,17 @@ class CCXTServiceB:
         except ccxt.BaseError as e:
             return {'error': str(e)}
 
-    def fetch_market_data(self, symbol):
-        """Fetches detailed market data for the given symbol."""
+    def fetch_market_data(self, symbol, timeframe='1d', since=None):
+        """
+        Fetches OHLCV candles for the given symbol through the local candle store,
+        downloading only the bars not stored yet.
+        """
+        store = get_candle_store()
         try:
-            return self.exchange.fetch_ohlcv(symbol, '1d')  # Example: Daily data
+            store.sync(self.exchange.fetch_ohlcv, self.exchange.id, symbol, timeframe, since)
         except ccxt.BaseError as e:
             return {'error': str(e)}
+        return to_rows(store.read(self.exchange.id, symbol, timeframe, since=since))
 
     def check_exchange_status(self):
         """Checks the operational status of the exchange."""
@@ -0,0 +1,177 @@
+"""
+In-process fanout of per-bot deltas to live dashboards.
+
+process_order publishes compact events after each commit ('order',
+'position', 'pnl'); /trading/events streams them to the bot owner's open
+dashboards as server-sent events and /trading/events/poll long-polls them.
+
+Publishing never waits on a consumer. A subscription buffers at most
+SSE_QUEUE_MAX_EVENTS events and SSE_QUEUE_MAX_BYTES bytes; one that falls
+further behind drops its backlog and receives a single 'resync' event
+telling the page to reload.
+
+Each stream or long-poll holds a request thread for as long as it is open.
+Together they may take at most SSE_MAX_CONNECTIONS of a worker's threads,
+by default all but SSE_RESERVED_THREADS of them, so pages and webhooks
+are still served while dashboards are open.
+
+Events only reach connections in the process that published them. Streams
+also compare the user's bot cache versions (TradingBot.cache_version) every
+SSE_VERSION_POLL_SECONDS, so changes processed by other workers still
+surface as 'bot_changed'.
+"""
+
+import itertools
+import json
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+from apps.serialization import dumps
+
+SSE_QUEUE_MAX_EVENTS = int(os.getenv('SSE_QUEUE_MAX_EVENTS', 256))
+SSE_QUEUE_MAX_BYTES = int(os.getenv('SSE_QUEUE_MAX_BYTES', 64 * 1024))
+# Request threads per worker, exported by gunicorn-cfg.py; unset under servers
+# that start a thread per request (flask run)
+SERVER_WORKER_THREADS = int(os.getenv('SERVER_WORKER_THREADS', 0))
+SSE_RESERVED_THREADS = int(os.getenv('SSE_RESERVED_THREADS', 2))
+# Streams and long-polls open at once in this process; past this, clients are told to retry later
+SSE_MAX_CONNECTIONS = int(os.getenv('SSE_MAX_CONNECTIONS') or (
+    max(0, SERVER_WORKER_THREADS - SSE_RESERVED_THREADS) if SERVER_WORKER_THREADS else 32))
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+SSE_VERSION_POLL_SECONDS = float(os.getenv('SSE_VERSION_POLL_SECONDS', 5))
+# Reconnect delay sent to browsers, and Retry-After when no connection slot is free
+SSE_RETRY_SECONDS = int(os.getenv('SSE_RETRY_SECONDS', 5))
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+class Event:
+    """One delta, serialized once at publish time and shared by every subscriber."""
+    __slots__ = ('id', 'type', 'data')
+
+    def __init__(self, event_id: int, event_type: str, data: bytes):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+    def to_sse(self) -> bytes:
+        return b'id: %d\nevent: %s\ndata: %s\n\n' % (self.id, self.type.encode(), self.data)
+
+    def to_dict(self):
+        return {'id': self.id, 'type': self.type, 'data': json.loads(self.data)}
+
+
+class Subscription:
+    """Bounded buffer of events for one connection."""
+
+    def __init__(self, broker: 'EventBroker', user_id: int):
+        self.broker = broker
+        self.user_id = user_id
+        self.condition = threading.Condition()
+        self.events = deque()
+        self.size = 0
+        self.overflowed = False
+
+    def push(self, event: Event):
+        with self.condition:
+            if not self.overflowed:
+                if len(self.events) >= SSE_QUEUE_MAX_EVENTS or self.size + len(event.data) > SSE_QUEUE_MAX_BYTES:
+                    # The client is too far behind for deltas to be useful; it reloads instead
+                    self.events.clear()
+                    self.size = 0
+                    self.overflowed = True
+                else:
+                    self.events.append(event)
+                    self.size += len(event.data)
+            self.condition.notify()
+
+    def drain(self, timeout: float) -> Tuple[List[Event], bool]:
+        """Wait up to timeout for events; returns (events, overflowed) and empties the buffer."""
+        with self.condition:
+            if not self.events and not self.overflowed:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            self.size = 0
+            overflowed, self.overflowed = self.overflowed, False
+        return events, overflowed
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBroker:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers: Dict[int, Set[Subscription]] = {}
+        self.connections = 0
+        self.ids = itertools.count(1)
+
+    def at_capacity(self, limit: int) -> bool:
+        return self.connections >= limit
+
+    def subscribe(self, user_id: int, limit: Optional[int] = None) -> Subscription:
+        """Register a connection; raises TooManyConnections when limit connections are already open."""
+        subscription = Subscription(self, user_id)
+        with self.lock:
+            if limit is not None and self.connections >= limit:
+                raise TooManyConnections()
+            self.subscribers.setdefault(user_id, set()).add(subscription)
+            self.connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.user_id)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self.connections -= 1
+                if not subscriptions:
+                    del self.subscribers[subscription.user_id]
+
+    def event(self, event_type: str, data: dict) -> Event:
+        return Event(next(self.ids), event_type, dumps(data))
+
+    def publish(self, user_id: int, event_type: str, data: dict):
+        with self.lock:
+            subscriptions = tuple(self.subscribers.get(user_id, ()))
+        if not subscriptions:
+            return  # Nobody watching: skip serialization entirely
+        event = self.event(event_type, data)
+        for subscription in subscriptions:
+            subscription.push(event)
+
+
+broker = EventBroker()
+
+
+def publish_order_events(bot, order, position, account=None):
+    """Deltas for one processed signal; account is passed when PnL was realized."""
+    if bot.user_id not in broker.subscribers:
+        return
+    broker.publish(bot.user_id, 'order', {
+        'bot_id': bot.id, 'order_id': order.order_id, 'symbol': order.symbol, 'side': order.side,
+        'quantity': order.quantity, 'price': order.entry_price, 'status': order.status, 'time': order.created_at,
+    })
+    broker.publish(bot.user_id, 'position', {
+        'bot_id': bot.id, 'position_id': position.id, 'symbol': position.symbol, 'pos_type': position.pos_type,
+        'status': position.status, 'position_size': position.position_size,
+        'average_entry_price': position.average_entry_price, 'exit_price': position.exit_price,
+    })
+    if account is not None:
+        broker.publish(bot.user_id, 'pnl', {
+            'bot_id': bot.id, 'position_id': position.id, 'profit_loss': position.profit_loss,
+            'percent_profit_loss': position.percent_profit_loss,
+            'account_id': account.id, 'balance': account.balance,
+        })
@@ -0,0 +1,96 @@
+"""
+Scaled-integer fixed-point arithmetic for prices, sizes and PnL.
+
+Values are plain ints counting ticks of 10**-decimals. Rounding is always
+ROUND_HALF_UP (ties away from zero), matching the Decimal.quantize calls the
+signal and PnL paths used before, but every intermediate result is exact.
+"""
+
+from decimal import Decimal
+from fractions import Fraction
+
+# Scales of the Numeric columns prices/sizes/PnL are stored in
+PRICE_DECIMALS = 8
+SIZE_DECIMALS = 3
+PNL_DECIMALS = 2
+
+_POW10 = tuple(10 ** i for i in range(40))
+
+
+def div_round_half_up(numerator: int, denominator: int) -> int:
+    """Integer division rounding half away from zero; denominator must be positive."""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if 2 * remainder >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def to_fixed(value, decimals: int) -> int:
+    """
+    Convert a str/int/float/Decimal to ticks of 10**-decimals.
+    Equivalent to int(Decimal(value).quantize(Decimal(10) ** -decimals, ROUND_HALF_UP).scaleb(decimals)).
+    """
+    if value.__class__ is str:
+        whole, _, frac = value.partition('.')
+        negative = whole[:1] == '-'
+        if negative or whole[:1] == '+':
+            whole = whole[1:]
+        if (whole.isdigit() or not whole and frac) and (frac.isdigit() or not frac):
+            extra = len(frac) - decimals
+            if extra <= 0:
+                ticks = int(whole + frac) * _POW10[-extra]
+            else:
+                ticks = div_round_half_up(int(whole + frac), _POW10[extra])
+            return -ticks if negative else ticks
+        # Exponent notation, surrounding whitespace and other forms Decimal accepts
+        numerator, denominator = Fraction(value.strip()).as_integer_ratio()
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return value * _POW10[decimals]
+    else:
+        # float and Decimal expose their exact value as a ratio
+        numerator, denominator = value.as_integer_ratio()
+
+    return div_round_half_up(numerator * _POW10[decimals], denominator)
+
+
+def to_decimal(ticks: int, decimals: int) -> Decimal:
+    """Exact Decimal view of a tick count, with the same exponent quantize() would give."""
+    return Decimal(ticks).scaleb(-decimals)
+
+
+def weighted_average_price(avg_ticks: int, size_lots: int, price_ticks: int, added_lots: int) -> int:
+    """Average entry price after adding to a position, in price ticks."""
+    total_cost = avg_ticks * size_lots + price_ticks * added_lots
+    return div_round_half_up(total_cost, size_lots + added_lots)
+
+
+def position_pnl(pos_type: str, entry_ticks: int, exit_ticks: int, size_lots: int, maker_fee, taker_fee,
+                 price_decimals: int = PRICE_DECIMALS, size_decimals: int = SIZE_DECIMALS):
+    """
+    Net PnL of a closed position after maker (entry) and taker (exit) fees.
+    Fees are percentages given as floats, taken at their exact binary value
+    like Decimal(float) does.
+    :return: Tuple of (profit_loss, percent_profit_loss), both in hundredths.
+    """
+    maker_num, maker_den = float(maker_fee).as_integer_ratio()
+    taker_num, taker_den = float(taker_fee).as_integer_ratio()
+    abs_size = abs(size_lots)
+
+    if pos_type == 'long':
+        gross = (exit_ticks - entry_ticks) * size_lots
+    elif pos_type == 'short':
+        gross = (entry_ticks - exit_ticks) * size_lots
+    else:
+        raise ValueError(f'Unknown position type: {pos_type}')
+
+    # Every term over the common denominator maker_den * taker_den * 100 * 10**(price+size decimals)
+    notional_scale = 10 ** (price_decimals + size_decimals)
+    denominator = maker_den * taker_den * 100 * notional_scale
+    net = (gross * maker_den * taker_den * 100
+           - maker_num * taker_den * entry_ticks * abs_size
+           - taker_num * maker_den * exit_ticks * abs_size)
+
+    scale = 10 ** PNL_DECIMALS
+    profit_loss = div_round_half_up(net * scale, denominator)
+    percent_profit_loss = div_round_half_up(net * 100 * scale * notional_scale, denominator * entry_ticks * abs_size)
+    return profit_loss, percent_profit_loss
@@ -1,8 +1,9 @@
 from datetime import datetime, timedelta
 from decimal import Decimal
-from sqlalchemy import Numeric
+from sqlalchemy import Numeric, update
 from sqlalchemy.orm import relationship
 from apps import db
+from apps.serialization import model_serializer
 from sqlalchemy.ext.hybrid import hybrid_property
 
 # from datetime import datetime, timedelta
@@ -20,12 +21,32 @@ class TradingBot(db.Model):
     exchange_account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False, index=True)
     status = db.Column(db.String(50), default='active', index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    webhook_secret = db.Column(db.String(64), nullable=True)  # HMAC key for signed webhook signals
+    # Bumped whenever what the dashboard shows for this bot changes; part of its fragment cache keys
+    cache_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     strategy = db.relationship('Strategy', back_populates='trading_bots')
     user = db.relationship('User', backref='trading_bots')
     account = db.relationship('Account', backref='trading_bots')
     positions = db.relationship('Position', back_populates='trading_bot', cascade="all, delete-orphan")
 
+    @classmethod
+    def cache_version_bump(cls, bot_id=None, account_id=None, strategy_id=None):
+        """
+        UPDATE statement bumping cache_version of one bot, or of every bot trading on an
+        account or running a strategy (their pages show the account's balance and name and
+        the strategy's details). Execute it in the caller's transaction, on either the sync
+        or the async session.
+        """
+        if bot_id is not None:
+            condition = cls.id == bot_id
+        elif account_id is not None:
+            condition = cls.exchange_account_id == account_id
+        else:
+            condition = cls.strategy_id == strategy_id
+        return update(cls).where(condition).values(cache_version=cls.cache_version + 1) \
+            .execution_options(synchronize_session=False)
+
     @property
     def total_profit_loss(self):
         return sum(position.profit_loss for position in self.positions if position.closed_at is not None)
@@ -91,29 +112,48 @@ class TradingBot(db.Model):
         positions = [p for p in self.positions if p.closed_at is not None and start_date <= p.closed_at <= end_date]
         return sum(p.profit_loss for p in positions)
 
+    def position_totals(self):
+        """
+        The position aggregates above, computed in one pass over the positions
+        instead of one pass per property.
+        """
+        now = datetime.utcnow()
+        today, month_start = now.date(), now.replace(day=1)
+        totals = dict.fromkeys(('total_profit_loss', 'total_percent_profit_loss', 'percent_profit_daily',
+                                'percent_profit_monthly', 'profit_loss_daily', 'profit_loss_monthly'), 0)
+        closed = wins = 0
+        has_open_position = False
+        for position in self.positions:
+            if position.status == 'closed':
+                closed += 1
+                wins += position.profit_loss > 0
+            elif position.status == 'open':
+                has_open_position = True
+            closed_at = position.closed_at
+            if closed_at is None:
+                continue
+            profit_loss, percent_profit_loss = position.profit_loss, position.percent_profit_loss
+            totals['total_profit_loss'] += profit_loss
+            totals['total_percent_profit_loss'] += percent_profit_loss
+            if closed_at.date() == today:
+                totals['profit_loss_daily'] += profit_loss
+                totals['percent_profit_daily'] += percent_profit_loss
+            if month_start <= closed_at <= now:
+                totals['profit_loss_monthly'] += profit_loss
+                totals['percent_profit_monthly'] += percent_profit_loss
+        totals['win_rate'] = (wins / closed) * 100 if closed else 0
+        totals['closed_trades'] = closed
+        totals['has_open_position'] = has_open_position
+        return totals
+
     def to_dict(self):
-        days_running = (datetime.utcnow() - self.created_at).days if self.created_at else 0
-        return {
-            'id': self.id,
-            'name': self.name,
-            'strategy': self.strategy.to_dict_bot() if self.strategy else None,
-            'account': self.account.to_dict() if self.account else None,
-            'positions': [position.to_dict() for position in self.positions] if self.positions else [],
-            'user_id': self.user_id,
-            'exchange_account_id': self.exchange_account_id,
-            'status': self.status,
-            'total_profit_loss': self.total_profit_loss,
-            'total_percent_profit_loss': self.total_percent_profit_loss,
-            'win_rate': self.calculate_win_rate(),
-            'closed_trades': self.closed_trades_count,
-            'has_open_position': self.has_open_position,
-            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
-            'days_running': days_running,
-            'percent_profit_daily': self.percent_profit_daily,
-            'percent_profit_monthly': self.percent_profit_monthly,
-            'profit_loss_daily': self.profit_loss_daily,
-            'profit_loss_monthly': self.profit_loss_monthly,
-        }
+        data = _serialize_bot(self)
+        data['strategy'] = self.strategy.to_dict_bot() if self.strategy else None
+        data['account'] = self.account.to_dict() if self.account else None
+        data['positions'] = [_serialize_position(position) for position in self.positions]
+        data.update(self.position_totals())
+        data['days_running'] = (datetime.utcnow() - self.created_at).days if self.created_at else 0
+        return data
     
 class Position(db.Model):
     __tablename__ = 'positions'
@@ -137,22 +177,7 @@ class Position(db.Model):
     trading_bot = db.relationship('TradingBot', back_populates='positions')
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'trading_bot_id': self.trading_bot_id,
-            'symbol': self.symbol,
-            'pos_type': self.pos_type,
-            'status': self.status,
-            'signal': self.signal,
-            'created_at': self.created_at,
-            'closed_at': self.closed_at,
-            'average_entry_price': float(self.average_entry_price) if self.average_entry_price else None,
-            'position_size': float(self.position_size),
-            'initial_size': float(self.initial_size),
-            'profit_loss': float(self.profit_loss),
-            'percent_profit_loss': float(self.percent_profit_loss),
-            'exit_price': float(self.exit_price) if self.exit_price else None,
-        }
+        return _serialize_position(self)
 
 
 class Order(db.Model):
@@ -178,21 +203,69 @@ class Order(db.Model):
     position = db.relationship('Position', back_populates='orders')
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'order_id': self.order_id,
-            'position_id': self.position_id,
-            'symbol': self.symbol,
-            'order_type': self.order_type,
-            'side': self.side,
-            'quantity': str(self.quantity),
-            'entry_price': str(self.entry_price) if self.entry_price else None,
-            'status': self.status,
-            'created_at': self.created_at,
-            'executed_at': self.executed_at,
-            'bot_id': self.bot_id,
-            'bot_name': self.bot_name,
-            'exchange': self.exchange,
-            'timeframe': self.timeframe,
-            'params': self.params,
-        }
+        return _serialize_order(self)
+
+
+class MarkPrice(db.Model):
+    """Latest mark price per exchange symbol, written by the ticker refresher and read by every worker."""
+    __tablename__ = 'mark_prices'
+    __table_args__ = (
+        db.UniqueConstraint('exchange', 'symbol', name='uq_mark_prices_exchange_symbol'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    exchange = db.Column(db.String(64), nullable=False)
+    symbol = db.Column(db.String(20), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    @classmethod
+    def bulk_upsert(cls, exchange, prices, commit=True):
+        """
+        Write the latest prices for one exchange in a single statement.
+        :param exchange: Exchange name as stored on the Exchange model.
+        :param prices: Mapping of position symbol -> price.
+        """
+        if not prices:
+            return 0
+        now = datetime.utcnow()
+        rows = [{'exchange': exchange, 'symbol': symbol, 'price': price, 'updated_at': now}
+                for symbol, price in prices.items()]
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(cls.__table__).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['exchange', 'symbol'],
+                set_={'price': stmt.excluded.price, 'updated_at': stmt.excluded.updated_at}
+            )
+            db.session.execute(stmt)
+        else:
+            ids = dict(
+                db.session.query(cls.symbol, cls.id).filter(cls.exchange == exchange, cls.symbol.in_(prices)).all()
+            )
+            db.session.bulk_insert_mappings(cls, [r for r in rows if r['symbol'] not in ids])
+            db.session.bulk_update_mappings(cls, [dict(r, id=ids[r['symbol']]) for r in rows if r['symbol'] in ids])
+        if commit:
+            db.session.commit()
+        return len(rows)
+
+
+def _nonzero_float(value):
+    # Positions have always sent a zero price as null
+    return float(value) if value else None
+
+
+def _nonzero_str(value):
+    return str(value) if value else None
+
+
+# Column projections built once per model rather than per instance
+_serialize_bot = model_serializer(TradingBot, fields=[
+    'id', 'name', 'user_id', 'exchange_account_id', 'status', 'created_at'
+], converters={'created_at': lambda value: value.strftime('%Y-%m-%d %H:%M:%S')})
+_serialize_position = model_serializer(Position, converters={
+    'average_entry_price': _nonzero_float, 'exit_price': _nonzero_float})
+_serialize_order = model_serializer(Order, converters={'quantity': str, 'entry_price': _nonzero_str})
@@ -0,0 +1,462 @@
+"""
+In-process paper-trading exchange implementing the subset of the async CCXT
+API that CCXTService uses, for load and soak tests without a live exchange.
+
+Select it with an exchange id of 'paper' (or 'paper_<name>' for independent
+books). Orders fill against an OHLCV-driven price feed, with configurable
+latency, partial fills and rate-limit errors:
+
+    PAPER_LATENCY_MS                 fixed latency or a 'min-max' range, default 0
+    PAPER_PARTIAL_FILL_PROBABILITY   chance each fill is partial, default 0
+    PAPER_RATE_LIMIT                 requests per second before RateLimitExceeded, 0 disables
+    PAPER_SEED                       random seed for reproducible runs
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from ccxt.base.errors import BadSymbol, InvalidOrder, OrderNotFound, RateLimitExceeded
+
+from apps.trading.fixedpoint import div_round_half_up, to_decimal, to_fixed
+
+logger = logging.getLogger(__name__)
+
+PAPER_EXCHANGE_PREFIX = 'paper'
+
+DEFAULT_SYMBOLS = ('BTC/USDT', 'ETH/USDT', 'BTC/USDT:USDT', 'ETH/USDT:USDT')
+DEFAULT_PRICES = {'BTC': 60000.0, 'ETH': 3000.0}
+
+# exchange_id -> PaperBook, shared by every PaperExchange instance with that id
+_books = {}
+
+
+def is_paper_exchange(exchange_id: str) -> bool:
+    return exchange_id == PAPER_EXCHANGE_PREFIX or exchange_id.startswith(PAPER_EXCHANGE_PREFIX + '_')
+
+
+def build_market(symbol: str, amount_decimals: int = 3, price_decimals: int = 2) -> Dict[str, Any]:
+    """CCXT-shaped market dict for a unified symbol such as 'BTC/USDT' or 'BTC/USDT:USDT'."""
+    pair, _, settle = symbol.partition(':')
+    base, quote = pair.split('/')
+    swap = bool(settle)
+    return {
+        'id': base + quote,
+        'symbol': symbol,
+        'base': base,
+        'quote': quote,
+        'settle': settle or None,
+        'type': 'swap' if swap else 'spot',
+        'spot': not swap,
+        'swap': swap,
+        'contract': swap,
+        'linear': True if swap else None,
+        'contractSize': 1 if swap else None,
+        'active': True,
+        'precision': {'amount': amount_decimals, 'price': price_decimals},
+        'limits': {
+            'amount': {'min': 10 ** -amount_decimals, 'max': None},
+            'price': {'min': 10 ** -price_decimals, 'max': None},
+            'cost': {'min': 5, 'max': None},
+            'leverage': {'min': 1, 'max': 125},
+        },
+    }
+
+
+class OHLCVPriceFeed:
+    """
+    Price source for the simulator. Each symbol walks forward through its
+    candles, one per tick; symbols without candles follow a seeded random walk.
+    Candles are CCXT rows: [timestamp, open, high, low, close, volume].
+    """
+
+    def __init__(self, candles: Optional[Dict[str, List[list]]] = None, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
+        self.candles = {symbol: list(rows) for symbol, rows in (candles or {}).items()}
+        self.cursor = {}
+        self.synthetic = {}
+
+    def set_candles(self, symbol: str, candles: List[list]):
+        self.candles[symbol] = list(candles)
+        self.cursor[symbol] = 0
+
+    def current(self, symbol: str) -> list:
+        """The candle the symbol is currently trading in."""
+        rows = self.candles.get(symbol)
+        if rows:
+            return rows[min(self.cursor.get(symbol, 0), len(rows) - 1)]
+        if symbol not in self.synthetic:
+            base = symbol.split('/')[0]
+            price = DEFAULT_PRICES.get(base, 100.0)
+            self.synthetic[symbol] = [int(time.time() * 1000), price, price, price, price, 0.0]
+        return self.synthetic[symbol]
+
+    def tick(self, symbol: str) -> list:
+        """Advance the symbol by one candle and return it."""
+        rows = self.candles.get(symbol)
+        if rows:
+            # Wrap around so long soak tests keep running on a finite history
+            self.cursor[symbol] = (self.cursor.get(symbol, 0) + 1) % len(rows)
+            return rows[self.cursor[symbol]]
+        previous = self.current(symbol)
+        close = previous[4]
+        new_close = max(close * (1 + self.rng.gauss(0, 0.001)), 1e-8)
+        high = max(close, new_close) * (1 + abs(self.rng.gauss(0, 0.0005)))
+        low = min(close, new_close) * (1 - abs(self.rng.gauss(0, 0.0005)))
+        candle = [previous[0] + 60000, close, high, low, new_close, self.rng.uniform(1, 100)]
+        self.synthetic[symbol] = candle
+        return candle
+
+    def last_price(self, symbol: str) -> float:
+        return self.current(symbol)[4]
+
+
+class PaperBook:
+    """Orders, trades, positions and the price feed of one simulated account."""
+
+    def __init__(self, exchange_id: str, seed: Optional[int] = None):
+        self.exchange_id = exchange_id
+        self.rng = random.Random(seed)
+        self.feed = OHLCVPriceFeed(rng=self.rng)
+        self.markets = {symbol: build_market(symbol) for symbol in DEFAULT_SYMBOLS}
+        self.orders = {}
+        self.trades = []
+        self.positions = {}
+        self.leverage = {}
+        self.ids = itertools.count(1)
+        self.request_times = deque()
+
+
+def get_book(exchange_id: str) -> PaperBook:
+    book = _books.get(exchange_id)
+    if book is None:
+        seed = os.getenv('PAPER_SEED')
+        book = _books[exchange_id] = PaperBook(exchange_id, int(seed) if seed else None)
+    return book
+
+
+def reset_book(exchange_id: Optional[str] = None):
+    if exchange_id is None:
+        _books.clear()
+    else:
+        _books.pop(exchange_id, None)
+
+
+def _parse_latency(value: str):
+    low, _, high = (value or '0').partition('-')
+    return float(low) / 1000, float(high or low) / 1000
+
+
+class PaperExchange:
+    """
+    Drop-in for a ccxt.async_support exchange instance. State lives in a
+    PaperBook shared per exchange id, so orders survive close() and a new
+    CCXTService can fetch what an earlier one created.
+    """
+
+    precisionMode = 2  # ccxt DECIMAL_PLACES: market precision is a count of decimals
+
+    has = {
+        'createOrder': True, 'fetchOrder': True, 'cancelOrder': True, 'fetchOrders': True,
+        'fetchOpenOrders': True, 'fetchClosedOrders': True, 'fetchMyTrades': True,
+        'fetchPositions': True, 'fetchPosition': True, 'setLeverage': True, 'createPosition': False,
+        'fetchOHLCV': True, 'fetchTickers': True,
+    }
+
+    def __init__(self, exchange_id: str = PAPER_EXCHANGE_PREFIX, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.id = exchange_id
+        self.book = get_book(exchange_id)
+        self.latency = config.get('latency', _parse_latency(os.getenv('PAPER_LATENCY_MS')))
+        self.partial_fill_probability = float(
+            config.get('partialFillProbability', os.getenv('PAPER_PARTIAL_FILL_PROBABILITY', 0)))
+        self.rate_limit = float(config.get('rateLimitPerSecond', os.getenv('PAPER_RATE_LIMIT', 0)))
+        self.apiKey = None
+        self.secret = None
+        self.enableRateLimit = True
+        self.markets = None
+        self.currencies = None
+        for symbol, candles in (config.get('candles') or {}).items():
+            self.add_market(symbol)
+            self.book.feed.set_candles(symbol, candles)
+
+    # Markets
+
+    async def load_markets(self, reload=False):
+        await self._request()
+        self.set_markets(self.book.markets)
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = dict(markets)
+        self.currencies = currencies or {}
+        return self.markets
+
+    def add_market(self, symbol: str, amount_decimals: int = 3, price_decimals: int = 2):
+        self.book.markets[symbol] = build_market(symbol, amount_decimals, price_decimals)
+        if self.markets is not None:
+            self.markets[symbol] = self.book.markets[symbol]
+
+    def market(self, symbol: str) -> Dict[str, Any]:
+        market = self.book.markets.get(symbol)
+        if market is None:
+            raise BadSymbol(f'{self.id} does not have market symbol {symbol}')
+        return market
+
+    def amount_to_precision(self, symbol: str, amount) -> str:
+        """Truncate like CCXT does for amounts."""
+        decimals = self.market(symbol)['precision']['amount']
+        lots = to_fixed(amount, decimals + 9) // 10 ** 9
+        if lots <= 0:
+            raise InvalidOrder(f'{self.id} amount of {symbol} must be greater than minimum amount precision')
+        return str(to_decimal(lots, decimals))
+
+    def price_to_precision(self, symbol: str, price) -> str:
+        decimals = self.market(symbol)['precision']['price']
+        return str(to_decimal(to_fixed(price, decimals), decimals))
+
+    def set_candles(self, symbol: str, candles: List[list]):
+        """Drive a symbol's price from OHLCV rows, e.g. from fetch_ohlcv or the candle store."""
+        if symbol not in self.book.markets:
+            self.add_market(symbol)
+        self.book.feed.set_candles(symbol, candles)
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = '1m', since=None, limit=None, params={}):
+        await self._request()
+        self.market(symbol)
+        feed = self.book.feed
+        rows = feed.candles.get(symbol)
+        history = rows[:feed.cursor.get(symbol, 0) + 1] if rows else [feed.current(symbol)]
+        history = [list(row) for row in history if since is None or row[0] >= since]
+        return history[-limit:] if limit else history
+
+    async def fetch_tickers(self, symbols=None, params={}):
+        await self._request()
+        tickers = {}
+        for symbol in symbols or list(self.book.markets):
+            self.market(symbol)
+            candle = self.book.feed.current(symbol)
+            tickers[symbol] = {
+                'symbol': symbol, 'timestamp': int(candle[0]), 'datetime': _iso8601(int(candle[0])),
+                'high': candle[2], 'low': candle[3], 'open': candle[1], 'close': candle[4], 'last': candle[4],
+                'bid': None, 'ask': None, 'markPrice': candle[4], 'baseVolume': candle[5], 'info': {},
+            }
+        return tickers
+
+    async def close(self):
+        pass
+
+    # Simulation internals
+
+    async def _request(self):
+        """Apply latency and the rate limit the way a real round trip would."""
+        low, high = self.latency
+        if high > 0:
+            await asyncio.sleep(self.book.rng.uniform(low, high))
+        if self.rate_limit > 0:
+            now = time.monotonic()
+            window = self.book.request_times
+            while window and window[0] <= now - 1:
+                window.popleft()
+            if len(window) >= self.rate_limit:
+                raise RateLimitExceeded(f'{self.id} rate limit of {self.rate_limit:g} requests/second exceeded')
+            window.append(now)
+
+    def _fill(self, order: Dict[str, Any], candle: list):
+        """Fill some or all of an open order if the candle trades through its price."""
+        if order['status'] != 'open':
+            return
+        _, _, high, low, close, _ = candle
+        if order['type'] == 'market':
+            fill_price = close
+        elif order['side'] == 'buy' and low <= order['price']:
+            fill_price = min(order['price'], candle[1])
+        elif order['side'] == 'sell' and high >= order['price']:
+            fill_price = max(order['price'], candle[1])
+        else:
+            return
+
+        decimals = self.market(order['symbol'])['precision']['amount']
+        remaining = to_fixed(order['remaining'], decimals)
+        quantity = remaining
+        if remaining > 1 and self.book.rng.random() < self.partial_fill_probability:
+            quantity = max(1, div_round_half_up(remaining * self.book.rng.randint(10, 90), 100))
+        amount = float(to_decimal(quantity, decimals))
+
+        timestamp = int(candle[0])
+        trade = {
+            'id': str(next(self.book.ids)),
+            'order': order['id'],
+            'timestamp': timestamp,
+            'datetime': _iso8601(timestamp),
+            'symbol': order['symbol'],
+            'type': order['type'],
+            'side': order['side'],
+            'takerOrMaker': 'taker' if order['type'] == 'market' else 'maker',
+            'price': fill_price,
+            'amount': amount,
+            'cost': fill_price * amount,
+            'fee': None,
+            'info': {},
+        }
+        self.book.trades.append(trade)
+        order['trades'].append(trade)
+        order['filled'] = float(to_decimal(to_fixed(order['filled'], decimals) + quantity, decimals))
+        order['remaining'] = float(to_decimal(remaining - quantity, decimals))
+        order['cost'] += trade['cost']
+        order['average'] = order['cost'] / order['filled']
+        order['lastTradeTimestamp'] = timestamp
+        if quantity == remaining:
+            order['status'] = 'closed'
+        self._apply_to_position(order['symbol'], order['side'], amount, fill_price)
+
+    def _apply_to_position(self, symbol: str, side: str, amount: float, price: float):
+        """Net one-way position: buys add, sells subtract; entry price is volume-weighted."""
+        signed = amount if side == 'buy' else -amount
+        contracts, entry = self.book.positions.get(symbol, (0.0, 0.0))
+        new_contracts = round(contracts + signed, 12)
+        if contracts == 0 or (contracts > 0) == (signed > 0):
+            entry = (entry * abs(contracts) + price * amount) / abs(new_contracts)
+        elif abs(signed) > abs(contracts):
+            # Flipped through zero: the remainder opens at the fill price
+            entry = price
+        if new_contracts == 0:
+            self.book.positions.pop(symbol, None)
+        else:
+            self.book.positions[symbol] = (new_contracts, entry)
+
+    def _advance(self, symbol: str):
+        candle = self.book.feed.tick(symbol)
+        for order in self.book.orders.values():
+            if order['symbol'] == symbol:
+                self._fill(order, candle)
+
+    def _get_order(self, order_id: str) -> Dict[str, Any]:
+        order = self.book.orders.get(str(order_id))
+        if order is None:
+            raise OrderNotFound(f'{self.id} order {order_id} not found')
+        return order
+
+    # Trading API
+
+    async def create_order(self, symbol: str, type: str, side: str, amount, price=None, params={}):
+        await self._request()
+        self.market(symbol)
+        if type not in ('market', 'limit'):
+            raise InvalidOrder(f'{self.id} does not support order type {type}')
+        if side not in ('buy', 'sell'):
+            raise InvalidOrder(f'{self.id} invalid order side {side}')
+        if type == 'limit' and price is None:
+            raise InvalidOrder(f'{self.id} limit orders require a price')
+        amount = float(self.amount_to_precision(symbol, amount))
+        timestamp = int(self.book.feed.current(symbol)[0])
+        order = {
+            'id': str(next(self.book.ids)),
+            'clientOrderId': (params or {}).get('clientOrderId'),
+            'timestamp': timestamp,
+            'datetime': _iso8601(timestamp),
+            'lastTradeTimestamp': None,
+            'symbol': symbol,
+            'type': type,
+            'side': side,
+            'price': float(self.price_to_precision(symbol, price)) if price is not None else None,
+            'average': None,
+            'amount': amount,
+            'filled': 0.0,
+            'remaining': amount,
+            'cost': 0.0,
+            'status': 'open',
+            'fee': None,
+            'trades': [],
+            'info': {},
+        }
+        self.book.orders[order['id']] = order
+        # Fill against the candle the order arrived in; partial remainders fill on later ticks
+        self._fill(order, self.book.feed.current(symbol))
+        return dict(order)
+
+    async def fetch_order(self, id: str, symbol: Optional[str] = None, params={}):
+        await self._request()
+        order = self._get_order(id)
+        if order['status'] == 'open':
+            self._advance(order['symbol'])
+        return dict(order)
+
+    async def cancel_order(self, id: str, symbol: Optional[str] = None, params={}):
+        await self._request()
+        order = self._get_order(id)
+        if order['status'] != 'open':
+            raise OrderNotFound(f'{self.id} order {id} is already {order["status"]}')
+        order['status'] = 'canceled'
+        return dict(order)
+
+    def _select_orders(self, symbol, since, limit, status=None):
+        orders = [order for order in self.book.orders.values()
+                  if (symbol is None or order['symbol'] == symbol)
+                  and (since is None or order['timestamp'] >= since)
+                  and (status is None or order['status'] in status)]
+        return [dict(order) for order in (orders[-limit:] if limit else orders)]
+
+    async def fetch_orders(self, symbol=None, since=None, limit=None, params={}):
+        await self._request()
+        return self._select_orders(symbol, since, limit)
+
+    async def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        await self._request()
+        return self._select_orders(symbol, since, limit, ('open',))
+
+    async def fetch_closed_orders(self, symbol=None, since=None, limit=None, params={}):
+        await self._request()
+        return self._select_orders(symbol, since, limit, ('closed', 'canceled'))
+
+    async def fetch_my_trades(self, symbol=None, since=None, limit=None, params={}):
+        await self._request()
+        trades = [trade for trade in self.book.trades
+                  if (symbol is None or trade['symbol'] == symbol)
+                  and (since is None or trade['timestamp'] >= since)]
+        return trades[-limit:] if limit else trades
+
+    async def fetch_positions(self, symbols=None, params={}):
+        await self._request()
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        positions = []
+        for symbol, (contracts, entry) in self.book.positions.items():
+            if symbols and symbol not in symbols:
+                continue
+            mark = self.book.feed.last_price(symbol)
+            leverage = self.book.leverage.get(symbol, 1)
+            notional = abs(contracts) * mark
+            positions.append({
+                'symbol': symbol,
+                'side': 'long' if contracts > 0 else 'short',
+                'contracts': abs(contracts),
+                'contractSize': 1,
+                'entryPrice': entry,
+                'markPrice': mark,
+                'notional': notional,
+                'leverage': leverage,
+                'initialMargin': notional / leverage,
+                'unrealizedPnl': (mark - entry) * contracts,
+                'timestamp': int(self.book.feed.current(symbol)[0]),
+                'info': {},
+            })
+        return positions
+
+    async def set_leverage(self, leverage, symbol: Optional[str] = None, params={}):
+        await self._request()
+        self.market(symbol)
+        max_leverage = self.book.markets[symbol]['limits']['leverage']['max']
+        if not 1 <= leverage <= max_leverage:
+            raise InvalidOrder(f'{self.id} leverage must be between 1 and {max_leverage}')
+        self.book.leverage[symbol] = leverage
+        return {'symbol': symbol, 'leverage': leverage}
+
+
+def _iso8601(timestamp: int) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(timestamp // 1000)) + f'.{timestamp % 1000:03d}Z'
@@ -1,26 +1,54 @@
+import asyncio
 import json
 import logging
-import os
-from flask import request, jsonify, redirect, url_for, flash, render_template
+import time
+import click
+from flask import Response, request, jsonify, redirect, url_for, flash, render_template, stream_with_context
 from flask_login import current_user, login_required
+from apps.serialization import json_response, streaming_json_response
+from apps import db
+from apps.cache import FRAGMENT_CACHE_TTL, fragment_cache
+from apps.trading import tickers
+from apps.trading.events import (SSE_HEARTBEAT_SECONDS, SSE_MAX_CONNECTIONS, SSE_RETRY_SECONDS,
+                                 SSE_VERSION_POLL_SECONDS, TooManyConnections, broker)
 from apps.trading.service import TradingService
+from apps.trading.webhooks import BAD_SIZE, WEBHOOK_MAX_BODY_BYTES, is_signed, validate_webhook
 from apps.trading import blueprint
 from typing import Tuple, Dict, Any
 
 from apps.trading.utillity import  send_message_to_queue
 
 logger = logging.getLogger(__name__)
-EXPECTED_PASSPHRASE = os.environ.get('WEBHOOK_PASSPHRASE')
+
+
+def fragment_ttl(bots):
+    """Pages showing an open position carry unrealized PnL, which moves with the mark prices."""
+    if any(position.get('status') == 'open' for bot in bots for position in bot.get('positions') or ()):
+        return tickers.MARK_PRICE_CACHE_TTL
+    return FRAGMENT_CACHE_TTL
 
 
 @blueprint.route('/list_bots')
 @login_required
 def list_bots():
     user_id = current_user.id
+    if request.args.get('stream'):
+        totals = {}
+        return streaming_json_response(TradingService.iter_bots(user_id, totals), key='bots',
+                                       trailer=lambda: {'totals': totals})
+
+    # Keyed by user as well: the layout shows the username
+    cache_key = f'bots:{user_id}:{TradingService.bots_cache_version(user_id)}'
+    html = fragment_cache.get(cache_key)
+    if html is not None:
+        return html
+
     response = TradingService.list_bots(user_id)
     
     if response['status'] == 'success':
-        return render_template('trading/bots.html', data=response['data'])
+        html = render_template('trading/bots.html', data=response['data'])
+        fragment_cache.set(cache_key, html, fragment_ttl(response['data']['bots']))
+        return html
     else:
         logger.error(f"Failed to list trading bots for user {user_id}: {response['message']}")
         flash(response['message'], 'error')
@@ -58,10 +86,19 @@ def create_bot():
 @login_required
 def view_bot(bot_id):
     try:
+        version = TradingService.bot_cache_version(bot_id)
+        cache_key = f'bot-details:{current_user.id}:{bot_id}:{version}'
+        html = fragment_cache.get(cache_key) if version is not None else None
+        if html is not None:
+            return html
+
         response = TradingService.get_bot(bot_id)
         if response['status'] == 'success':
             logger.info(f"{response['status']}: {response['message']}")
-            return render_template('trading/bot-details.html', bot=response['message'])
+            html = render_template('trading/bot-details.html', bot=response['message'])
+            if version is not None:
+                fragment_cache.set(cache_key, html, fragment_ttl([response['message']]))
+            return html
         else:
             flash(response['message'], 'warning')
             logger.error(f"{response['status']}: {response['message']}")
@@ -72,30 +109,150 @@ def view_bot(bot_id):
         return redirect(url_for('trading_blueprint.list_bots'))
 
 
-@blueprint.route('/webhook', methods=['POST'])
-async def webhook() -> Tuple[Dict[str, Any], int]:
-    payload: Dict[str, Any] = request.get_json()
-    if not payload:
-        return jsonify({"errorCode": "bad_request", "message": "No payload provided"}), 400
+def too_many_connections():
+    response = json_response({'errorCode': 'too_many_connections',
+                              'message': 'Too many live connections, retry later'}, 503)
+    response.headers['Retry-After'] = str(SSE_RETRY_SECONDS)
+    return response
 
-    if payload.get('passphrase') != EXPECTED_PASSPHRASE:
-        return jsonify({"errorCode": "unauthorized", "message": "Unauthorized access"}), 401
 
-    required_fields = ['exchange', 'symbol', 'order_price', 'order_size', 'order_side', 'pos_size', 'pos_type', 'bot_id', 'type']
-    if any(field not in payload for field in required_fields):
-        return jsonify({"errorCode": "missing_field", "message": "Missing required field(s)"}), 400
+@blueprint.route('/events')
+@login_required
+def events():
+    """Server-sent events with live deltas for the current user's bots."""
+    user_id = current_user.id
+    if broker.at_capacity(SSE_MAX_CONNECTIONS):
+        return too_many_connections()
+    resume = request.headers.get('Last-Event-ID') is not None
+
+    def stream():
+        # Subscribed only once the body is iterated: a response that never is
+        # (HEAD, client gone before the first chunk) holds no connection slot
+        try:
+            subscription = broker.subscribe(user_id, limit=SSE_MAX_CONNECTIONS)
+        except TooManyConnections:
+            # Lost the race for the last slot; the browser reconnects after the retry delay
+            yield b'retry: %d\n\n' % (SSE_RETRY_SECONDS * 1000)
+            return
+        with subscription:
+            versions = TradingService.bot_cache_versions(user_id)
+            # Don't pin a pooled connection for the lifetime of the stream
+            db.session.remove()
+            yield b'retry: %d\n\n' % (SSE_RETRY_SECONDS * 1000)
+            if resume:
+                # Event ids don't survive a reconnect (or a different worker); reload instead
+                yield broker.event('resync', {}).to_sse()
+            pushed = set()
+            last_poll = last_write = time.monotonic()
+            while True:
+                events, overflowed = subscription.drain(min(SSE_HEARTBEAT_SECONDS, SSE_VERSION_POLL_SECONDS))
+                chunk = [broker.event('resync', {}).to_sse()] if overflowed else []
+                for event in events:
+                    pushed.add(json.loads(event.data).get('bot_id'))
+                    chunk.append(event.to_sse())
+
+                now = time.monotonic()
+                if now - last_poll >= SSE_VERSION_POLL_SECONDS:
+                    # Changes processed by other workers only show up in the bot versions
+                    current = TradingService.bot_cache_versions(user_id)
+                    db.session.remove()
+                    for bot_id in current.keys() | versions.keys():
+                        if current.get(bot_id) != versions.get(bot_id) and bot_id not in pushed:
+                            chunk.append(broker.event('bot_changed', {
+                                'bot_id': bot_id, 'version': current.get(bot_id)}).to_sse())
+                    versions, last_poll = current, now
+                    pushed.clear()
+
+                if chunk:
+                    yield b''.join(chunk)
+                    last_write = now
+                elif now - last_write >= SSE_HEARTBEAT_SECONDS:
+                    # Keeps proxies from timing out the connection and detects clients that left
+                    yield b': ping\n\n'
+                    last_write = now
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Tell nginx not to buffer the stream
+    })
+
+
+@blueprint.route('/events/poll')
+@login_required
+def poll_events():
+    """
+    Long-poll fallback for /trading/events. Pass the last returned version as since;
+    changed is true when the page should reload rather than apply the events.
+    """
+    user_id = current_user.id
+    since = request.args.get('since')
+    timeout = min(max(request.args.get('timeout', 25, type=float), 0), 55)
+
+    version = TradingService.bots_cache_version(user_id)
+    if since != version:
+        return json_response({'events': [], 'version': version, 'changed': True})
+    db.session.remove()
+
+    try:
+        subscription = broker.subscribe(user_id, limit=SSE_MAX_CONNECTIONS)
+    except TooManyConnections:
+        return too_many_connections()
+    with subscription:
+        events, overflowed = subscription.drain(timeout)
+    version = TradingService.bots_cache_version(user_id)
+    return json_response({
+        'events': [event.to_dict() for event in events],
+        'version': version,
+        'changed': overflowed or (version != since and not events),
+    })
+
+
+@blueprint.route('/webhook', methods=['POST'])
+async def webhook() -> Tuple[Dict[str, Any], int]:
+    # Async views run on asgiref's loop thread, not the request thread whose
+    # scoped session teardown_request removes, so clean up this one here.
+    try:
+        return await _handle_webhook()
+    finally:
+        db.session.remove()
+
+
+async def _handle_webhook() -> Tuple[Dict[str, Any], int]:
+    if request.content_length is None or request.content_length > WEBHOOK_MAX_BODY_BYTES:
+        return jsonify(BAD_SIZE[0]), BAD_SIZE[1]
+
+    signature = request.headers.get('X-Signature')
+    signed_bot_id = request.headers.get('X-Bot-Id')
+    timestamp = request.headers.get('X-Signature-Timestamp')
+    body = request.get_data(cache=True)
+    # Signed signals: verify HMAC over the timestamp and raw body before decoding any JSON
+    signature_valid = is_signed(signature, signed_bot_id) and \
+        TradingService.verify_webhook_signature(signed_bot_id, timestamp, body, signature)
+    payload, error = validate_webhook(body, signature, signed_bot_id, signature_valid)
+    if error:
+        return jsonify(error[0]), error[1]
 
     try:
         logger.info(f"Moving to TradingService")
         response = await TradingService.process_order(payload)
         logger.info(f"{response['status']}: {response['message']}")
-        return jsonify(response), 200
+        return json_response(response, 200)
 
     except Exception as e:
         logger.error(f"Exception: {str(e)}")
         return jsonify({"errorCode": "server_error", "message": str(e)}), 500
 
 
+@blueprint.route('/rotate_webhook_secret/<int:bot_id>', methods=['POST'])
+@login_required
+def rotate_webhook_secret(bot_id):
+    response = TradingService.rotate_webhook_secret(bot_id, current_user.id)
+    if response['status'] == 'success':
+        return jsonify({'status': 'success', 'secret': response['secret']}), 200
+    status = 404 if response['status'] == 'not_found' else 400
+    return jsonify({'status': 'error', 'message': response['message']}), status
+
+
 @blueprint.route('/activate_bot/<int:bot_id>', methods=['POST'])
 def activate_bot(bot_id):
     TradingService.activate_bot(bot_id)
@@ -182,3 +339,24 @@ def view_alert(alert_id):
     flash('Alert viewed successfully!', 'info')
     return redirect(url_for('dashboard.show_alerts'))
 
+
+
+# CLI
+
+@blueprint.cli.command('refresh-mark-prices')
+@click.option('--interval', type=float, default=0,
+              help='Keep refreshing every INTERVAL seconds instead of running once.')
+def refresh_mark_prices(interval):
+    """Fetch mark prices for all symbols with open positions and store them for the web workers."""
+    while True:
+        try:
+            written = asyncio.run(tickers.refresh_mark_prices())
+            print(f'> Stored {written} mark prices')
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Failed to refresh mark prices: {str(e)}')
+            if not interval:
+                raise
+        if not interval:
+            break
+        time.sleep(interval)
@@ -1,11 +1,24 @@
 from datetime import datetime
-from decimal import Decimal, getcontext, ROUND_HALF_UP
+from decimal import Decimal, getcontext
+import hashlib
+import hmac
 import logging
-from typing import Any, Dict
+import secrets
+from typing import Any, Dict, Optional
 import uuid
+from sqlalchemy.orm import joinedload, selectinload
+from apps.exchanges.models import Account
 from apps.trading.ccxt_client import CCXTService
+from apps.trading.fixedpoint import (
+    PNL_DECIMALS, PRICE_DECIMALS, SIZE_DECIMALS, position_pnl, to_decimal, to_fixed, weighted_average_price
+)
+from apps.trading.events import publish_order_events
 from apps.trading.models import Order, Position, TradingBot
+from apps.trading.tickers import value_open_positions
+from apps.trading.webhooks import normalize_signature, timestamp_fresh, webhook_secrets
+from apps.strategies.models import Strategy
 from apps import db
+from apps.database import STREAM_YIELD_PER, read_replica
 
 logger = logging.getLogger(__name__)
 # Set decimal precision to avoid floating-point precision errors
@@ -15,6 +28,7 @@ getcontext().prec = 28
 class TradingService:
 
     @staticmethod
+    @read_replica
     def list_bots(user_id):
         """ Retrieve all trading bots associated with a given user ID and return them in a standardized format. """
         try:
@@ -47,6 +61,7 @@ class TradingService:
                 'percent_profit_monthly': total_percent_profit_monthly,
                 'profit_loss_daily': total_profit_loss_daily,
                 'profit_loss_monthly': total_profit_loss_monthly,
+                'unrealized_profit_loss': value_open_positions(bots_data),
             }
 
 
@@ -60,11 +75,60 @@ class TradingService:
             logger.error(f'Error retrieving bots for user {user_id}: {str(e)}')
             return {'status': 'error', 'message': str(e)}
 
-        finally:
-            db.session.remove()  # Ensure the session is closed after processing
+    # Per-bot figures that list_bots sums into its totals, under the same names
+    BOT_TOTAL_FIELDS = ('total_profit_loss', 'total_percent_profit_loss', 'percent_profit_daily',
+                        'percent_profit_monthly', 'profit_loss_daily', 'profit_loss_monthly')
+
+    @staticmethod
+    @read_replica
+    def iter_bots(user_id, totals):
+        """
+        A user's bots serialized like list_bots, streamed from a server-side cursor.
+        totals is filled in along the way with the list_bots totals and is complete
+        once the iterator is exhausted. Positions are loaded per batch of bots and
+        open positions are valued against the mark prices a batch at a time.
+        """
+        totals.update(dict.fromkeys(TradingService.BOT_TOTAL_FIELDS, 0))
+        totals.update(total_balance=0, unrealized_profit_loss=0.0)
+        seen_accounts = set()
+        bots = TradingBot.query.filter_by(user_id=user_id) \
+            .options(joinedload(TradingBot.strategy), joinedload(TradingBot.account).joinedload(Account.exchange),
+                     selectinload(TradingBot.positions)) \
+            .order_by(TradingBot.id).yield_per(STREAM_YIELD_PER)
+
+        batch = []
+        for bot in bots:
+            batch.append(bot.to_dict())
+            if bot.account.id not in seen_accounts:
+                totals['total_balance'] += bot.account.balance
+                seen_accounts.add(bot.account.id)
+            if len(batch) == STREAM_YIELD_PER:
+                yield from TradingService._total_bots(batch, totals)
+                batch = []
+        yield from TradingService._total_bots(batch, totals)
+
+    @staticmethod
+    def _total_bots(bots_data, totals):
+        totals['unrealized_profit_loss'] += value_open_positions(bots_data)
+        for data in bots_data:
+            for field in TradingService.BOT_TOTAL_FIELDS:
+                totals[field] += data[field]
+        return bots_data
 
 
 
+    @staticmethod
+    @read_replica
+    def bot_cache_versions(user_id) -> Dict[int, int]:
+        """bot id -> cache_version for each of a user's bots."""
+        return dict(db.session.query(TradingBot.id, TradingBot.cache_version).filter_by(user_id=user_id).all())
+
+    @staticmethod
+    def bots_cache_version(user_id) -> str:
+        """Digest of a user's bot cache versions; changes whenever any bot does or one is added or removed."""
+        versions = sorted(TradingService.bot_cache_versions(user_id).items())
+        return hashlib.sha1(','.join(f'{bot_id}:{version}' for bot_id, version in versions).encode()).hexdigest()[:16]
+
     @staticmethod
     def create_bot(user_id, strategy_id, exchange_account_id, bot_name):
         """ Create a new trading bot and save it to the database """
@@ -74,34 +138,40 @@ class TradingService:
                 strategy_id=strategy_id,
                 exchange_account_id=exchange_account_id,
                 name=bot_name,
-                created_at=datetime.utcnow()
+                created_at=datetime.utcnow(),
+                webhook_secret=secrets.token_hex(32)
             )
             db.session.add(new_bot)
+            Strategy.adjust_counters(strategy_id, bot_count=1)
             db.session.commit()
+            TradingService.invalidate_webhook_secret(new_bot.id)
             return {'status': 'success', 'message': 'Trading bot created successfully.'}
         except Exception as e:
             db.session.rollback()
             logger.error(f'Error creating bot: {str(e)}')
             return {'status': 'error', 'message': 'Failed to create trading bot.'}
-        
-        finally:
-            db.session.remove()  # Ensure the session is closed after processing
 
     @staticmethod
+    @read_replica
     def get_bot(bot_id):
         """ Retrieve a single trading bot by its ID with standardized error handling. """
         try:
             bot = TradingBot.query.get(bot_id)
             if bot:
-                return {'status': 'success', 'message': bot.to_dict()}
+                bot_data = bot.to_dict()
+                value_open_positions([bot_data])
+                return {'status': 'success', 'message': bot_data}
             else:
                 return {'status': 'error', 'message': 'Bot not found.'}
         except Exception as e:
             logger.error(f'Failed to retrieve bot {bot_id}: {str(e)}')
             return {'status': 'error', 'message': str(e)}
-        
-        finally:
-            db.session.remove()  # Ensure the session is closed after processing
+
+    @staticmethod
+    @read_replica
+    def bot_cache_version(bot_id) -> Optional[int]:
+        """cache_version of a bot, or None if it does not exist."""
+        return db.session.query(TradingBot.cache_version).filter_by(id=bot_id).scalar()
 
     @staticmethod
     async def process_order(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -123,11 +193,15 @@ class TradingService:
             # Step 5: Commit Order with Position ID
             order.position_id = position.id
             db.session.add(order)
+            db.session.execute(TradingBot.cache_version_bump(bot_id=bot.id))
             db.session.commit()
 
             # Step 6: Calculate PnL
             TradingService.calculate_pnl(position, parsed_data['order_price'], parsed_data['order_side'])
 
+            # Push the deltas to the owner's live dashboards
+            publish_order_events(bot, order, position, bot.account if TradingService.needs_pnl(position) else None)
+
             # Step 7: Manage Risk (Optional)
             TradingService.manage_risk(parsed_data, position)
 
@@ -141,8 +215,57 @@ class TradingService:
             db.session.rollback()
             return {'status': 'error', 'message': str(e)}
 
-        finally:
-            db.session.remove()  # Ensure the session is closed after processing
+    @staticmethod
+    def get_webhook_secret(bot_id: int) -> bytes:
+        """Return a bot's webhook secret (b'' if it has none) through the shared per-process cache."""
+        secret = webhook_secrets.lookup(bot_id)
+        if secret is None:
+            secret = webhook_secrets.store(
+                bot_id, db.session.query(TradingBot.webhook_secret).filter_by(id=bot_id).scalar())
+        return secret
+
+    @staticmethod
+    def invalidate_webhook_secret(bot_id: int):
+        """Drop this process's cached secret; other processes pick up a rotation within WEBHOOK_SECRET_CACHE_TTL."""
+        webhook_secrets.invalidate(int(bot_id))
+
+    @staticmethod
+    def verify_webhook_signature(bot_id: str, timestamp: str, body: bytes, signature: str) -> bool:
+        """
+        Check an 'X-Signature: sha256=<hex>' header against HMAC-SHA256(secret, '<timestamp>.<raw body>')
+        for a timestamp within WEBHOOK_SIGNATURE_TOLERANCE. Runs before the body is JSON-decoded;
+        the comparison is constant-time.
+        """
+        if not bot_id or not signature or not timestamp_fresh(timestamp):
+            return False
+        try:
+            secret = TradingService.get_webhook_secret(int(bot_id))
+        except ValueError:
+            return False
+        if not secret:
+            return False
+        return TradingService.signature_matches(secret, timestamp, body, signature)
+
+    @staticmethod
+    def signature_matches(secret: bytes, timestamp: str, body: bytes, signature: str) -> bool:
+        expected = hmac.new(secret, timestamp.encode() + b'.' + body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, normalize_signature(signature))
+
+    @staticmethod
+    def rotate_webhook_secret(bot_id, user_id):
+        """Issue a new webhook secret for a bot owned by the user."""
+        try:
+            bot = TradingBot.query.get(bot_id)
+            if not bot or bot.user_id != user_id:
+                return {'status': 'not_found', 'message': 'Bot not found.'}
+            bot.webhook_secret = secrets.token_hex(32)
+            db.session.commit()
+            TradingService.invalidate_webhook_secret(bot_id)
+            return {'status': 'success', 'message': 'Webhook secret rotated.', 'secret': bot.webhook_secret}
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f'Error rotating webhook secret for bot {bot_id}: {str(e)}')
+            return {'status': 'error', 'message': 'Failed to rotate webhook secret.'}
 
     @staticmethod
     def get_trading_bot(bot_id: int) -> TradingBot:
@@ -150,20 +273,27 @@ class TradingService:
 
     @staticmethod
     def parse_signal(data: Dict[str, Any]) -> Dict[str, Any]:
-        def to_decimal(value: str) -> Decimal:
-            return Decimal(value).quantize(Decimal('0.001'), rounding=ROUND_HALF_UP)
-        def price_to_decimal(value: str) -> Decimal:
-            return Decimal(value).quantize(Decimal('0.00000001'), rounding=ROUND_HALF_UP)
+        """
+        Prices and sizes are parsed to fixed-point ticks (see apps.trading.fixedpoint)
+        and kept alongside their Decimal views, which are what the ORM columns store.
+        """
         def parse_time(value: str) -> datetime:
             return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+        order_price_ticks = to_fixed(data.get('order_price'), PRICE_DECIMALS)
+        order_size_lots = to_fixed(data.get('order_size'), SIZE_DECIMALS)
+        pos_size_lots = to_fixed(data.get('pos_size'), SIZE_DECIMALS)
         return {
             'exchange': data.get('exchange'),
             'symbol': data.get('symbol'),
             'order_id': data.get('order_id') or str(uuid.uuid4()),  # Ensure unique order_id
-            'order_price': price_to_decimal(data.get('order_price')),
+            'signal_id': data.get('signal_id'),
+            'order_price': to_decimal(order_price_ticks, PRICE_DECIMALS),
+            'order_price_ticks': order_price_ticks,
             'order_side': data.get('order_side'),
-            'order_size': to_decimal(data.get('order_size')),
-            'pos_size': to_decimal(data.get('pos_size')),
+            'order_size': to_decimal(order_size_lots, SIZE_DECIMALS),
+            'order_size_lots': order_size_lots,
+            'pos_size': to_decimal(pos_size_lots, SIZE_DECIMALS),
+            'pos_size_lots': pos_size_lots,
             'pos_type': data.get('pos_type'),
             'type': data.get('type'),
             'timeframe': data.get('timeframe'),
@@ -176,7 +306,9 @@ class TradingService:
     @staticmethod
     def execute_order(data: Dict[str, Any], bot: TradingBot) -> Order:
         new_order = Order(
-            order_id=str(uuid.uuid4()),
+            # A signed signal's id is its signature, so the unique order id also rejects
+            # replays that reach a worker which has not seen the signature
+            order_id=data['signal_id'] or str(uuid.uuid4()),
             position_id=None,  # This will be set when the position is updated
             symbol=data['symbol'],
             order_type=data['type'],
@@ -196,97 +328,113 @@ class TradingService:
 
     @staticmethod
     def update_position(bot_id: int, data: Dict[str, Any], order: Order) -> Position:
-        position = Position.query.filter_by(trading_bot_id=bot_id, symbol=data['symbol'], status='open').first()
-        
-        if not position:
-            if abs(data['order_size']) == abs(data['pos_size']):
-                position = Position(
-                    trading_bot_id=bot_id,
-                    symbol=data['symbol'],
-                    pos_type=data['pos_type'],
-                    status='open',
-                    created_at=data['time'],
-                    average_entry_price=data['order_price'],
-                    position_size=data['order_size'],
-                    initial_size=data['order_size']
-                )
-                db.session.add(position)
-            else:
-                raise ValueError("Order size mismatch, cannot open or update position")
+        # Locked until the caller commits: concurrent fills on a position apply one after the other
+        position = Position.query.filter_by(trading_bot_id=bot_id, symbol=data['symbol'], status='open') \
+            .with_for_update().first()
 
+        if not position:
+            position = TradingService.open_position_from_signal(bot_id, data)
+            db.session.add(position)
         else:
-            if position.pos_type == 'long':
-                if data['order_side'] == 'buy':
-                    total_cost = position.average_entry_price * position.position_size + data['order_price'] * data['order_size']
-                    position.position_size += data['order_size']
-                    position.initial_size += data['order_size']
-                    position.average_entry_price = total_cost / position.position_size
-                elif data['order_side'] == 'sell':
-                    position.position_size -= data['order_size']
-                    position.exit_price = data['order_price']
-            elif position.pos_type == 'short':
-                if data['order_side'] == 'sell':
-                    total_cost = position.average_entry_price * position.position_size + data['order_price'] * data['order_size']
-                    position.position_size += data['order_size']
-                    position.initial_size += data['order_size']
-                    position.average_entry_price = total_cost / position.position_size
-                elif data['order_side'] == 'buy':
-                    position.position_size -= data['order_size']
-                    position.exit_price = data['order_price']
-
-            if position.position_size <= 0:
-                position.status = 'closed'
-                position.closed_at = data['time']
-                position.exit_price = data['order_price']
-                position.position_size = Decimal('0.0')
+            TradingService.apply_fill(position, data)
 
         db.session.flush()  # Replacing commit with flush
 
         return position
 
     @staticmethod
-    def calculate_pnl(position: Position, price: Decimal, side: str):
-        if position.status == 'closed' or position.exit_price is not None:
-            logger.info(f"Calculating PnL for position {position.id}:")
-            logger.info(f"Position type: {position.pos_type}, Average entry price: {position.average_entry_price}, Exit price: {price}, Initial size: {position.initial_size}")
-
-            # Fetch account details to get fee rates
-            bot = TradingBot.query.get(position.trading_bot_id)
-            account = bot.account
-
-            # Convert fee percentages into decimal rates
-            maker_fee_rate = Decimal(account.maker_fee) / Decimal('100')
-            taker_fee_rate = Decimal(account.taker_fee) / Decimal('100')
-
-            # Calculate fees
-            entry_fee = maker_fee_rate * position.average_entry_price * abs(position.initial_size)
-            exit_fee = taker_fee_rate * price * abs(position.initial_size)
-            total_fees = entry_fee + exit_fee
-
-            if position.pos_type == 'long':
-                gross_pnl = (price - position.average_entry_price) * position.initial_size
-            elif position.pos_type == 'short':
-                gross_pnl = (position.average_entry_price - price) * position.initial_size
-
-            logger.info(f"Gross PnL: {gross_pnl}, Total fees: {total_fees}")
-
-            net_pnl = gross_pnl - total_fees
+    def open_position_from_signal(bot_id: int, data: Dict[str, Any]) -> Position:
+        """New position for a signal that opens one; shared by the sync and async order paths."""
+        if abs(data['order_size']) != abs(data['pos_size']):
+            raise ValueError("Order size mismatch, cannot open or update position")
+        return Position(
+            trading_bot_id=bot_id,
+            symbol=data['symbol'],
+            pos_type=data['pos_type'],
+            status='open',
+            created_at=data['time'],
+            average_entry_price=data['order_price'],
+            position_size=data['order_size'],
+            initial_size=data['order_size']
+        )
 
-            position.profit_loss = net_pnl
+    @staticmethod
+    def apply_fill(position: Position, data: Dict[str, Any]):
+        """Add to or reduce an open position with a parsed signal, closing it when the size reaches zero."""
+        order_lots = data['order_size_lots']
+        size_lots = to_fixed(position.position_size, SIZE_DECIMALS)
+        adding = (position.pos_type == 'long' and data['order_side'] == 'buy') or \
+            (position.pos_type == 'short' and data['order_side'] == 'sell')
+        reducing = (position.pos_type == 'long' and data['order_side'] == 'sell') or \
+            (position.pos_type == 'short' and data['order_side'] == 'buy')
+
+        if adding:
+            average_ticks = weighted_average_price(
+                to_fixed(position.average_entry_price, PRICE_DECIMALS), size_lots,
+                data['order_price_ticks'], order_lots)
+            size_lots += order_lots
+            position.position_size = to_decimal(size_lots, SIZE_DECIMALS)
+            position.initial_size = to_decimal(
+                to_fixed(position.initial_size, SIZE_DECIMALS) + order_lots, SIZE_DECIMALS)
+            position.average_entry_price = to_decimal(average_ticks, PRICE_DECIMALS)
+        elif reducing:
+            size_lots -= order_lots
+            position.position_size = to_decimal(size_lots, SIZE_DECIMALS)
+            position.exit_price = data['order_price']
+
+        if size_lots <= 0:
+            position.status = 'closed'
+            position.closed_at = data['time']
+            position.exit_price = data['order_price']
+            position.position_size = Decimal('0.0')
 
-            logger.info(f"Calculated profit/loss: {position.profit_loss}")
+    @staticmethod
+    def needs_pnl(position: Position) -> bool:
+        return position.status == 'closed' or position.exit_price is not None
 
-            position.percent_profit_loss = (net_pnl / (position.average_entry_price * abs(position.initial_size))) * Decimal('100')
+    @staticmethod
+    def calculate_pnl(position: Position, price: Decimal, side: str):
+        if TradingService.needs_pnl(position):
+            # Re-read the position under a row lock: apply_pnl credits the change from its stored
+            # PnL, and two fills reading the same stored PnL would both credit the same change
+            position = Position.query.filter_by(id=position.id).with_for_update().populate_existing().one()
+            # Fetch account details to get fee rates
+            bot = TradingBot.query.get(position.trading_bot_id)
+            credit = TradingService.apply_pnl(position, price, bot.account)
+            db.session.execute(TradingBot.cache_version_bump(account_id=bot.exchange_account_id))
+            for statement in credit:
+                db.session.execute(statement)
+            db.session.commit()
 
-            # Correct precision issues
-            position.profit_loss = position.profit_loss.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            position.percent_profit_loss = position.percent_profit_loss.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    @staticmethod
+    def apply_pnl(position: Position, price: Decimal, account):
+        """
+        Set realized PnL on a position. Returns the Account.balance_credit statements for
+        the change in its PnL, for the caller to execute (last) and commit.
+        """
+        logger.info(f"Calculating PnL for position {position.id}:")
+        logger.info(f"Position type: {position.pos_type}, Average entry price: {position.average_entry_price}, Exit price: {price}, Initial size: {position.initial_size}")
+
+        # Exact integer math over fixed-point ticks, rounded half-up to hundredths once at the end
+        profit_loss, percent_profit_loss = position_pnl(
+            position.pos_type,
+            to_fixed(position.average_entry_price, PRICE_DECIMALS),
+            to_fixed(price, PRICE_DECIMALS),
+            to_fixed(position.initial_size, SIZE_DECIMALS),
+            account.maker_fee,
+            account.taker_fee,
+        )
+        # Recalculated on every reducing fill: credit only what changed since the last time
+        previous_profit_loss = position.profit_loss or Decimal('0')
+        position.profit_loss = to_decimal(profit_loss, PNL_DECIMALS)
+        position.percent_profit_loss = to_decimal(percent_profit_loss, PNL_DECIMALS)
 
-            logger.info(f"Calculated percent profit/loss: {position.percent_profit_loss}")
+        logger.info(f"Calculated profit/loss: {position.profit_loss}, percent profit/loss: {position.percent_profit_loss}")
 
-            # Update account balance
-            account.balance += position.profit_loss
-            db.session.commit()
+        delta = position.profit_loss - previous_profit_loss
+        if not delta:
+            return ()
+        return Account.balance_credit(account.id, delta, 'realized_pnl', position.id)
 
     @staticmethod
     def manage_risk(data: Dict[str, Any], position: Position):
@@ -319,8 +467,10 @@ class TradingService:
         try:
             bot = TradingBot.query.get(bot_id)
             if bot:
+                Strategy.adjust_counters(bot.strategy_id, bot_count=-1)
                 db.session.delete(bot)
                 db.session.commit()
+                TradingService.invalidate_webhook_secret(bot_id)
                 logger.info(f"Deleted bot {bot_id} and its related positions and orders.")
                 return {"status": "success", "message": f"Bot {bot_id} and its related positions and orders were deleted successfully."}
             else:
@@ -0,0 +1,107 @@
+"""
+Symbol registry built from an exchange's loaded CCXT markets.
+
+Maps TradingView tickers ('BTCUSDT.P', 'BTCUSDT'), exchange market ids and
+unified symbols to the unified CCXT market with a single dict lookup, and is
+cached per exchange id so markets are loaded once per process per TTL.
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# TradingView suffix for perpetual contracts
+PERPETUAL_SUFFIX = '.P'
+
+MARKETS_CACHE_TTL = int(os.getenv('MARKETS_CACHE_TTL', 3600))
+
+# exchange_id -> (expires_at, SymbolRegistry)
+_registries = {}
+
+
+def strip_suffix(symbol: str) -> str:
+    """Remove the TradingView '.P' suffix, and only that suffix."""
+    if symbol.endswith(PERPETUAL_SUFFIX):
+        return symbol[:-len(PERPETUAL_SUFFIX)]
+    return symbol
+
+
+class SymbolRegistry:
+    """Lookup table from every known alias of a market to the CCXT market dict."""
+
+    def __init__(self, markets: Dict[str, Dict[str, Any]], currencies: Optional[Dict[str, Any]] = None):
+        self.markets = markets
+        self.currencies = currencies
+        self._index = {}
+        # Spot markets are indexed first so a bare 'BTCUSDT' resolves to spot,
+        # while 'BTCUSDT.P' always resolves to the perpetual contract.
+        ordered = sorted(markets.values(), key=lambda market: bool(market.get('contract')))
+        for market in ordered:
+            market_id = market.get('id') or ''
+            aliases = [market['symbol'], market_id, market_id.replace('_', '').replace('-', '')]
+            if market.get('swap'):
+                aliases += [alias + PERPETUAL_SUFFIX for alias in aliases[1:]]
+                # 'BTC/USDT:USDT' is also reachable as 'BTC/USDT.P'
+                aliases.append(market['symbol'].split(':')[0] + PERPETUAL_SUFFIX)
+            for alias in aliases:
+                if alias:
+                    self._index.setdefault(alias.upper(), market)
+
+    def resolve(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Return the market for a ticker, market id or unified symbol, or None if unknown."""
+        if not symbol:
+            return None
+        market = self._index.get(symbol.upper())
+        if market is None and symbol.endswith(PERPETUAL_SUFFIX):
+            market = self._index.get(strip_suffix(symbol).upper())
+        return market
+
+    @staticmethod
+    def min_cost(market: Dict[str, Any]) -> Optional[float]:
+        return ((market.get('limits') or {}).get('cost') or {}).get('min')
+
+    @staticmethod
+    def check_limits(market: Dict[str, Any], amount: float, price: Optional[float]) -> Optional[str]:
+        """
+        Validate a rounded order against the market's minimum amount and minimum notional.
+        :param price: The limit price, or the current price for market orders; the notional
+                      is only checked when a price is known.
+        :return: An error message, or None if the order is within limits.
+        """
+        limits = market.get('limits') or {}
+        min_amount = (limits.get('amount') or {}).get('min')
+        if min_amount and amount < min_amount:
+            return f"Order amount {amount} is below the minimum {min_amount} for {market['symbol']}"
+        min_cost = SymbolRegistry.min_cost(market)
+        if min_cost and price:
+            # Contract markets quote notional per contract
+            notional = amount * price * (market.get('contractSize') or 1)
+            if notional < min_cost:
+                return f"Order notional {notional} is below the minimum {min_cost} for {market['symbol']}"
+        return None
+
+
+def get_registry(exchange_id: str) -> Optional[SymbolRegistry]:
+    """Return the cached registry for an exchange, or None if missing or expired."""
+    entry = _registries.get(exchange_id)
+    if entry is None or entry[0] <= time.monotonic():
+        return None
+    return entry[1]
+
+
+def set_registry(exchange_id: str, markets, currencies=None) -> SymbolRegistry:
+    """Build and cache the registry for an exchange from freshly loaded markets."""
+    registry = SymbolRegistry(markets, currencies)
+    _registries[exchange_id] = (time.monotonic() + MARKETS_CACHE_TTL, registry)
+    logger.info(f"Cached {len(markets)} markets for {exchange_id}")
+    return registry
+
+
+def invalidate_registry(exchange_id: Optional[str] = None):
+    if exchange_id is None:
+        _registries.clear()
+    else:
+        _registries.pop(exchange_id, None)
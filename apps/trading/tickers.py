@@ -0,0 +1,144 @@
+"""
+Mark prices for open positions and their unrealized PnL.
+
+A single refresher process (flask trading refresh-mark-prices) polls one
+batched fetch_tickers call per exchange for every symbol with an open
+position and upserts the results into the mark_prices table. Web workers
+share those rows, reading the whole table at most once per
+MARK_PRICE_CACHE_TTL seconds, and value every open position in one
+vectorized pass instead of one ticker request per position.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from apps import db
+from apps.exchanges.models import Account, Exchange
+from apps.trading.ccxt_client import CCXTService
+from apps.trading.models import MarkPrice, Position, TradingBot
+
+logger = logging.getLogger(__name__)
+
+MARK_PRICE_CACHE_TTL = float(os.getenv('MARK_PRICE_CACHE_TTL', 5))
+MARK_PRICE_MAX_AGE = int(os.getenv('MARK_PRICE_MAX_AGE', 300))  # Older prices are treated as missing
+
+# 'prices' -> (expires_at, {(exchange name, symbol): price})
+_mark_price_cache = {}
+
+
+def get_mark_prices() -> Dict[Tuple[str, str], float]:
+    """All fresh mark prices, loaded with one query per TTL per process."""
+    now = time.monotonic()
+    entry = _mark_price_cache.get('prices')
+    if entry is None or entry[0] <= now:
+        cutoff = datetime.utcnow() - timedelta(seconds=MARK_PRICE_MAX_AGE)
+        rows = db.session.query(MarkPrice.exchange, MarkPrice.symbol, MarkPrice.price) \
+            .filter(MarkPrice.updated_at >= cutoff).all()
+        entry = (now + MARK_PRICE_CACHE_TTL, {(exchange, symbol): price for exchange, symbol, price in rows})
+        _mark_price_cache['prices'] = entry
+    return entry[1]
+
+
+def invalidate_mark_prices():
+    _mark_price_cache.clear()
+
+
+def open_position_symbols() -> Dict[str, List[str]]:
+    """Exchange name -> symbols with at least one open position."""
+    rows = db.session.query(Exchange.name, Position.symbol) \
+        .join(TradingBot, Position.trading_bot_id == TradingBot.id) \
+        .join(Account, TradingBot.exchange_account_id == Account.id) \
+        .join(Exchange, Account.exchange_id == Exchange.id) \
+        .filter(Position.status == 'open') \
+        .distinct().all()
+    symbols = defaultdict(list)
+    for exchange, symbol in rows:
+        symbols[exchange].append(symbol)
+    return dict(symbols)
+
+
+async def _fetch_exchange_prices(exchange: str, symbols: List[str]) -> Dict[str, float]:
+    service = CCXTService(exchange, None, None)
+    try:
+        await service.initialize_exchange()
+    except Exception as e:
+        logger.warning(f"Skipping mark prices for {exchange}: {e}")
+        return {}
+    result = await service.fetch_tickers(symbols)
+    if not result['success']:
+        logger.warning(f"Failed to fetch tickers from {exchange}: {result['error']}")
+        return {}
+    prices = {}
+    for symbol, ticker in result['tickers'].items():
+        price = ticker.get('markPrice') or ticker.get('last') or ticker.get('close')
+        if price:
+            prices[symbol] = float(price)
+    return prices
+
+
+async def refresh_mark_prices() -> int:
+    """
+    Fetch tickers for every open-position symbol, one request per exchange with
+    the exchanges queried concurrently, and store them.
+    :return: Number of prices written.
+    """
+    symbols = open_position_symbols()
+    exchanges = list(symbols)
+    results = await asyncio.gather(*(_fetch_exchange_prices(exchange, symbols[exchange]) for exchange in exchanges))
+    written = 0
+    for exchange, prices in zip(exchanges, results):
+        written += MarkPrice.bulk_upsert(exchange, prices, commit=False)
+    db.session.commit()
+    invalidate_mark_prices()
+    return written
+
+
+def value_open_positions(bots: List[Dict[str, Any]]) -> float:
+    """
+    Add mark_price, unrealized_profit_loss and unrealized_percent_profit_loss to
+    every open position in serialized bots (TradingBot.to_dict output), and an
+    unrealized_profit_loss total to each bot. Positions without a fresh mark
+    price get None. Fees are not deducted; they are charged when the position closes.
+    :return: Unrealized PnL summed over all bots.
+    """
+    open_positions = []
+    owners = []
+    for index, bot in enumerate(bots):
+        bot['unrealized_profit_loss'] = 0.0
+        exchange = (bot.get('account') or {}).get('exchange_name')
+        for position in bot.get('positions') or []:
+            if position.get('status') == 'open':
+                open_positions.append((exchange, position))
+                owners.append(index)
+    if not open_positions:
+        return 0.0
+
+    prices = get_mark_prices()
+    count = len(open_positions)
+    marks = np.fromiter((prices.get((exchange, p['symbol']), np.nan) for exchange, p in open_positions), 'f8', count)
+    entries = np.fromiter((p.get('average_entry_price') or np.nan for _, p in open_positions), 'f8', count)
+    sizes = np.fromiter((p.get('position_size') or 0.0 for _, p in open_positions), 'f8', count)
+    directions = np.fromiter((-1.0 if p.get('pos_type') == 'short' else 1.0 for _, p in open_positions), 'f8', count)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pnl = (marks - entries) * sizes * directions
+        percent = pnl / (entries * np.abs(sizes)) * 100
+
+    per_bot = np.zeros(len(bots))
+    np.add.at(per_bot, np.asarray(owners), np.nan_to_num(pnl))
+
+    for (_, position), mark, value, value_percent in zip(open_positions, marks.tolist(), pnl.tolist(), percent.tolist()):
+        valued = not np.isnan(value)
+        position['mark_price'] = mark if valued else None
+        position['unrealized_profit_loss'] = round(value, 8) if valued else None
+        position['unrealized_percent_profit_loss'] = round(value_percent, 8) if valued and np.isfinite(value_percent) else None
+    for bot, value in zip(bots, per_bot.tolist()):
+        bot['unrealized_profit_loss'] = value
+    return float(per_bot.sum())
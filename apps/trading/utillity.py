@@ -3,7 +3,6 @@ import hashlib
 import json
 import logging
 import time
-from cryptography.fernet import Fernet
 import os
 
 from flask import app
@@ -16,16 +15,22 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 def generate_key():
     """Generate a new encryption key."""
+    from cryptography.fernet import Fernet  # Deferred: cryptography is slow to import
+
     return Fernet.generate_key()
 
 def encrypt_message(message, key):
     """Encrypt a message using a key."""
+    from cryptography.fernet import Fernet
+
     fernet = Fernet(key)
     encrypted_message = fernet.encrypt(message.encode())
     return encrypted_message.decode()
 
 def decrypt_message(encrypted_message, key):
     """Decrypt an encrypted message using a key."""
+    from cryptography.fernet import Fernet
+
     fernet = Fernet(key)
     decrypted_message = fernet.decrypt(encrypted_message.encode())
     return decrypted_message.decode()
@@ -0,0 +1,168 @@
+"""
+Webhook signal authentication and validation shared by the WSGI route and
+the native ASGI endpoint, so both accept exactly the same requests.
+
+Signed signals carry X-Bot-Id, X-Signature-Timestamp (unix seconds) and
+X-Signature: sha256=HMAC-SHA256(bot secret, "<timestamp>.<raw body>").
+Signals timestamped more than WEBHOOK_SIGNATURE_TOLERANCE seconds away from
+now are rejected, and so is a signature seen before: by this process from
+memory, and by any process through the order id it is recorded under.
+
+Bot secrets are cached per process for WEBHOOK_SECRET_CACHE_TTL seconds, which
+bounds how long other workers keep verifying with a secret after rotation.
+"""
+
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from apps.cache import LRUCache
+
+EXPECTED_PASSPHRASE = os.environ.get('WEBHOOK_PASSPHRASE')
+WEBHOOK_MAX_BODY_BYTES = int(os.environ.get('WEBHOOK_MAX_BODY_BYTES', 16384))
+WEBHOOK_SIGNATURE_TOLERANCE = int(os.environ.get('WEBHOOK_SIGNATURE_TOLERANCE', 300))
+WEBHOOK_SECRET_CACHE_TTL = int(os.environ.get('WEBHOOK_SECRET_CACHE_TTL', 5))
+WEBHOOK_SECRET_MISSING_TTL = int(os.environ.get('WEBHOOK_SECRET_MISSING_TTL', 1))
+WEBHOOK_SECRET_CACHE_MAX_SIZE = int(os.environ.get('WEBHOOK_SECRET_CACHE_MAX_SIZE', 10000))
+
+REQUIRED_FIELDS = ('exchange', 'symbol', 'order_price', 'order_size', 'order_side', 'pos_size', 'pos_type', 'bot_id', 'type')
+
+BAD_SIZE = ({"errorCode": "bad_request", "message": "Invalid payload size"}, 400)
+UNAUTHORIZED = ({"errorCode": "unauthorized", "message": "Unauthorized access"}, 401)
+NO_PAYLOAD = ({"errorCode": "bad_request", "message": "No payload provided"}, 400)
+MISSING_FIELD = ({"errorCode": "missing_field", "message": "Missing required field(s)"}, 400)
+REPLAYED = ({"errorCode": "replayed", "message": "Signal already received"}, 409)
+
+
+def is_signed(signature: Optional[str], signed_bot_id: Optional[str]) -> bool:
+    return bool(signature or signed_bot_id)
+
+
+def normalize_signature(signature: str) -> str:
+    if signature.startswith('sha256='):
+        signature = signature[len('sha256='):]
+    return signature.strip().lower()
+
+
+def timestamp_fresh(timestamp: Optional[str]) -> bool:
+    """Whether an X-Signature-Timestamp is within WEBHOOK_SIGNATURE_TOLERANCE of now."""
+    try:
+        return abs(time.time() - int(timestamp)) <= WEBHOOK_SIGNATURE_TOLERANCE
+    except (TypeError, ValueError):
+        return False
+
+
+class RecentSignatures:
+    """
+    Signatures accepted in the last two tolerance windows; older ones fail the
+    timestamp check anyway. Only verified signatures are added, so its size
+    follows the legitimate signal rate.
+    """
+
+    def __init__(self, ttl: float = 2 * WEBHOOK_SIGNATURE_TOLERANCE):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # signature -> expires_at, oldest first
+
+    def remember(self, signature: str) -> bool:
+        """Record a signature; False if it was already recorded."""
+        now = time.monotonic()
+        with self.lock:
+            while self.entries and next(iter(self.entries.values())) <= now:
+                self.entries.popitem(last=False)
+            if signature in self.entries:
+                return False
+            self.entries[signature] = now + self.ttl
+            return True
+
+
+recent_signatures = RecentSignatures()
+
+
+class WebhookSecretCache:
+    """
+    Bot id -> webhook secret, shared by the sync and async services, which only
+    differ in how they load a miss. Bots without a secret (including X-Bot-Id
+    values that match no bot) are remembered briefly in their own smaller LRU,
+    so a stream of made-up ids cannot evict the secrets of real bots.
+    """
+
+    def __init__(self, max_entries: int = WEBHOOK_SECRET_CACHE_MAX_SIZE, ttl: int = WEBHOOK_SECRET_CACHE_TTL,
+                 missing_ttl: int = WEBHOOK_SECRET_MISSING_TTL):
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.secrets = LRUCache(max_entries)
+        self.missing = LRUCache(max(1, max_entries // 10))
+
+    def lookup(self, bot_id: int) -> Optional[bytes]:
+        """The cached secret, b'' for a bot known to have none, or None when it must be loaded."""
+        secret = self.secrets.get(bot_id)
+        if secret is not None:
+            return secret
+        return b'' if self.missing.get(bot_id) else None
+
+    def store(self, bot_id: int, secret: Optional[str]) -> bytes:
+        """Cache a secret as loaded from the database (None when the bot or its secret is missing)."""
+        if not secret:
+            self.missing.set(bot_id, True, self.missing_ttl)
+            return b''
+        encoded = secret.encode()
+        self.secrets.set(bot_id, encoded, self.ttl)
+        return encoded
+
+    def invalidate(self, bot_id: int):
+        self.secrets.delete(bot_id)
+        self.missing.delete(bot_id)
+
+
+webhook_secrets = WebhookSecretCache()
+
+
+def _decode(body: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def validate_webhook(body: bytes, signature: Optional[str], signed_bot_id: Optional[str],
+                     signature_valid: bool) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[Dict[str, str], int]]]:
+    """
+    Authenticate and decode a signal.
+    Signed signals (X-Signature/X-Bot-Id headers) must carry a valid, fresh HMAC, checked by
+    the caller before this decodes any JSON, a matching bot_id and a signature not seen before;
+    their signal_id is the signature, which becomes the order id. Unsigned ones fall back to
+    the constant-time passphrase check (TradingView alerts cannot set headers).
+    :return: (payload, None) on success, or (None, (error body, status)).
+    """
+    if is_signed(signature, signed_bot_id):
+        if not signature_valid:
+            return None, UNAUTHORIZED
+        payload = _decode(body)
+        if not payload:
+            return None, NO_PAYLOAD
+        if str(payload.get('bot_id')) != signed_bot_id:
+            return None, UNAUTHORIZED
+        signal_id = normalize_signature(signature)
+        if not recent_signatures.remember(signal_id):
+            return None, REPLAYED
+        payload['signal_id'] = signal_id
+    else:
+        if not EXPECTED_PASSPHRASE:
+            return None, UNAUTHORIZED
+        payload = _decode(body)
+        if not payload:
+            return None, NO_PAYLOAD
+        passphrase = str(payload.get('passphrase', ''))
+        if not hmac.compare_digest(passphrase.encode(), EXPECTED_PASSPHRASE.encode()):
+            return None, UNAUTHORIZED
+        payload.pop('signal_id', None)
+
+    if any(field not in payload for field in REQUIRED_FIELDS):
+        return None, MISSING_FIELD
+    return payload, None
@@ -0,0 +1,12 @@
+# -*- encoding: utf-8 -*-
+"""
+ASGI entry point: uvicorn asgi:application
+
+Signals posted to /trading/webhook are handled natively on the event loop
+with AsyncSession; every other route is the WSGI app from run.py.
+"""
+
+from apps.asgi import create_asgi_app
+from run import app
+
+application = create_asgi_app(app)
@@ -0,0 +1,150 @@
+"""
+Serving benchmark: requests/sec and latency per gunicorn deployment profile
+(see gunicorn-cfg.py) under a mixed load of dashboard pages and webhooks.
+
+    python benchmarks/serving.py                                # web and webhook profiles
+    python benchmarks/serving.py --profiles web --duration 30 --concurrency 128
+    python benchmarks/serving.py --bot-id 1 --passphrase $WEBHOOK_PASSPHRASE
+
+Each profile is started as its own gunicorn master on a free port. By default
+webhooks carry a wrong passphrase, which measures the request path up to
+validation without touching an exchange. For full order processing, pass the
+id of a bot whose account is on the 'paper' exchange (apps/trading/paper_exchange.py)
+together with the real passphrase.
+
+Uses aiohttp, which ccxt already depends on.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# profile -> gunicorn app
+PROFILE_APPS = {
+    'web': 'run:app',
+    'webhook': 'asgi:application',
+    'dev': 'run:app',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def webhook_body(bot_id, passphrase):
+    """Signal in the shape TradingService.parse_signal expects; opens and flips a small paper position."""
+    side = random.choice(('buy', 'sell'))
+    return json.dumps({
+        'bot_id': bot_id, 'passphrase': passphrase, 'exchange': 'paper', 'symbol': 'BTCUSDT.P', 'type': 'market',
+        'order_id': f'bench-{random.getrandbits(48)}', 'order_side': side, 'order_price': '60000',
+        'order_size': '0.001', 'pos_size': '0.001', 'pos_type': 'long' if side == 'buy' else 'short',
+        'timeframe': '1', 'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    })
+
+
+def start_server(profile, port):
+    env = dict(os.environ, SERVER_PROFILE=profile, PORT=str(port), GUNICORN_LOGLEVEL='warning')
+    process = subprocess.Popen(
+        ['gunicorn', '--config', 'gunicorn-cfg.py', '--access-logfile', '/dev/null', PROFILE_APPS[profile]],
+        cwd=ROOT, env=env, start_new_session=True,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f'gunicorn exited with {process.returncode} for profile {profile}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    stop_server(process)
+    sys.exit(f'profile {profile} did not start listening within 60s')
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    process.wait(timeout=60)
+
+
+async def run_load(base_url, args):
+    """Closed-loop load: each client sends its next request as soon as the last completes."""
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    stop_at = time.monotonic() + args.duration
+    warm_until = time.monotonic() + args.warmup
+
+    async def client(session):
+        while time.monotonic() < stop_at:
+            kind = 'webhook' if random.random() < args.webhook_ratio else 'page'
+            started = time.perf_counter()
+            if kind == 'webhook':
+                request = session.post(base_url + '/trading/webhook', data=webhook_body(args.bot_id, args.passphrase),
+                                       headers={'Content-Type': 'application/json'})
+            else:
+                request = session.get(base_url + args.page)
+            try:
+                async with request as response:
+                    await response.read()
+                    status = response.status
+            except aiohttp.ClientError:
+                status = 'error'
+            if time.monotonic() >= warm_until:
+                latencies[kind].append(time.perf_counter() - started)
+                statuses[kind][status] += 1
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(client(session) for _ in range(args.concurrency)))
+    return latencies, statuses
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', default='web,webhook', help='comma-separated gunicorn-cfg.py profiles')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load per profile, warm-up included')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds excluded from the results')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--webhook-ratio', type=float, default=0.5, help='share of requests that are webhooks')
+    parser.add_argument('--page', default='/login', help='page requested by the non-webhook share')
+    parser.add_argument('--bot-id', type=int, default=1)
+    parser.add_argument('--passphrase', default='benchmark-wrong-passphrase')
+    args = parser.parse_args()
+
+    measured = args.duration - args.warmup
+    print(f'{"profile":<10}{"kind":<10}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}  statuses')
+    for profile in args.profiles.split(','):
+        port = free_port()
+        process = start_server(profile, port)
+        try:
+            latencies, statuses = asyncio.run(run_load(f'http://127.0.0.1:{port}', args))
+        finally:
+            stop_server(process)
+        for kind in sorted(latencies):
+            values = latencies[kind]
+            print(f'{profile:<10}{kind:<10}{len(values) / measured:>10.1f}'
+                  f'{statistics.median(values) * 1000:>10.1f}{percentile(values, 0.99) * 1000:>10.1f}'
+                  f'  {dict(statuses[kind])}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Startup-time benchmark: how long a fresh interpreter takes to import the app
+and which modules that time goes to.
+
+    python benchmarks/startup.py                  # import run (the WSGI app)
+    python benchmarks/startup.py --module asgi    # the ASGI entry point
+    python benchmarks/startup.py --top 40 --runs 5
+
+Each run is a new interpreter started with -X importtime. The table lists the
+slowest top-level packages by cumulative import time (median over runs) and
+the modules that are expected to stay lazy, flagging any that were imported.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported only on the code paths that need them; startup should not pull them in
+LAZY_MODULES = ('pandas', 'ccxt', 'cryptography')
+
+TIMER = (
+    'import time; started = time.perf_counter(); import {module}; '
+    'print("startup_seconds", time.perf_counter() - started)'
+)
+
+
+def run_once(module):
+    """Import module in a fresh interpreter; return (wall seconds, {module: cumulative us})."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', TIMER.format(module=module)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f'import {module} failed:\n{result.stderr[-2000:]}')
+
+    wall = next(float(line.split()[1]) for line in result.stdout.splitlines() if line.startswith('startup_seconds'))
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+    return wall, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='run', help='module to import (default: run)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=25, help='number of packages to list')
+    args = parser.parse_args()
+
+    walls = []
+    samples = defaultdict(list)
+    for _ in range(args.runs):
+        wall, cumulative = run_once(args.module)
+        walls.append(wall)
+        for name, micros in cumulative.items():
+            samples[name].append(micros)
+
+    # Top-level packages only: their cumulative time already includes their submodules
+    packages = {name: statistics.median(values) for name, values in samples.items() if '.' not in name}
+    print(f'import {args.module}: {statistics.median(walls):.3f}s median over {args.runs} runs\n')
+    print(f'{"package":<32}{"cumulative ms":>14}')
+    for name, micros in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f'{name:<32}{micros / 1000:>14.1f}')
+
+    print('\nlazy modules:')
+    for name in LAZY_MODULES:
+        status = f'IMPORTED ({packages[name] / 1000:.1f} ms)' if name in packages else 'not imported'
+        print(f'  {name:<30}{status}')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,3 +5,14 @@ set -o errexit
 python -m pip install --upgrade pip
 
 pip install -r requirements.txt
+
+# Minify and fingerprint static CSS/JS
+FLASK_APP=${FLASK_APP:-run.py} flask build-assets
+
+# Create any missing tables (the app no longer does this on its first request),
+# then add the columns create_all can't add to tables that already exist
+FLASK_APP=${FLASK_APP:-run.py} flask init-db
+FLASK_APP=${FLASK_APP:-run.py} flask db upgrade
+
+# Open balance ledgers for accounts created before them, before any new credit lands
+FLASK_APP=${FLASK_APP:-run.py} flask accounts compact-ledger
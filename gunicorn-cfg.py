@@ -1,11 +1,113 @@
 # -*- encoding: utf-8 -*-
 """
 Copyright (c) 2019 - present AppSeed.us
+
+Gunicorn deployment profiles, selected with SERVER_PROFILE:
+
+    web       sync pages (and the Flask webhook view) on threaded workers
+              gunicorn --config gunicorn-cfg.py run:app
+    webhook   the native-async webhook path on uvicorn workers
+              SERVER_PROFILE=webhook gunicorn --config gunicorn-cfg.py asgi:application
+    dev       one reloading sync worker with debug logging
+
+Worker counts follow the CPUs available to the container (cgroup quota and
+affinity). Overrides: WEB_CONCURRENCY (workers), GUNICORN_THREADS,
+GUNICORN_MAX_WORKERS, GUNICORN_MAX_REQUESTS, GUNICORN_TIMEOUT, PORT.
+
+Profiles with preload load the app once in the master and fork workers from
+it, so workers share its memory copy-on-write. SIGHUP then restarts workers
+but does not re-import code; deploy new code with a zero-downtime upgrade:
+kill -USR2 <master>, then kill -WINCH and -QUIT the old master.
 """
 
-bind = '0.0.0.0:5005'
-workers = 1
+import math
+import os
+
+PROFILES = {
+    'web': {
+        'worker_class': 'gthread',
+        'workers_per_cpu': 2,
+        'threads': 4,
+        'preload_app': True,
+        'loglevel': 'info',
+    },
+    'webhook': {
+        # Event-loop workers: one per CPU serves many concurrent signals
+        'worker_class': 'uvicorn.workers.UvicornWorker',
+        'workers_per_cpu': 1,
+        'threads': 1,
+        'preload_app': True,
+        'loglevel': 'info',
+    },
+    'dev': {
+        'worker_class': 'sync',
+        'workers': 1,
+        'threads': 1,
+        'preload_app': False,
+        'reload': True,
+        'loglevel': 'debug',
+    },
+}
+
+
+def available_cpus():
+    """CPUs this process may use, honouring a cgroup v2 quota (containers) and affinity."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+profile_name = os.getenv('SERVER_PROFILE', 'web')
+profile = PROFILES[profile_name]
+cpus = available_cpus()
+
+bind = '0.0.0.0:' + os.getenv('PORT', '5005')
+worker_class = profile['worker_class']
+workers = int(os.getenv('WEB_CONCURRENCY') or profile.get('workers') or profile['workers_per_cpu'] * cpus + 1)
+workers = min(workers, int(os.getenv('GUNICORN_MAX_WORKERS', 16)))
+threads = int(os.getenv('GUNICORN_THREADS', profile['threads']))
+preload_app = profile['preload_app']
+reload = profile.get('reload', False)
+if worker_class in ('gthread', 'sync'):
+    # Live dashboard streams size their connection limit from this (apps/trading/events.py)
+    os.environ['SERVER_WORKER_THREADS'] = str(threads)
+
+# Recycle workers to bound slow leaks; jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+# Heartbeat files on tmpfs; a disk-backed /tmp can stall workers under Docker
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+pidfile = os.getenv('GUNICORN_PIDFILE')
+
 accesslog = '-'
-loglevel = 'debug'
+loglevel = os.getenv('GUNICORN_LOGLEVEL', profile['loglevel'])
 capture_output = True
 enable_stdio_inheritance = True
+
+
+def when_ready(server):
+    server.log.info(f'Profile {profile_name}: {workers} x {worker_class} workers, '
+                    f'{threads} threads, {cpus} CPUs, preload={preload_app}')
+    if preload_app:
+        # Import ccxt once in the master so forked workers share it
+        from apps.trading.ccxt_client import load_ccxt
+        load_ccxt()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        # ccxt is imported lazily; start loading it now so the first webhook doesn't wait on it
+        from apps.trading.ccxt_client import warm_ccxt
+        warm_ccxt()
@@ -0,0 +1,99 @@
+"""Strategy counters and normalized performance metric columns
+
+Denormalized subscriber, rating and bot counters on strategies; updated_date
+and the indexed hot metric columns on strategy_performance_metrics.
+
+Revision ID: 3f1a2c9d0e28
+Revises:
+Create Date: 2026-10-19 12:41:17
+
+"""
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from apps.strategies.models import StrategyPerformanceMetrics
+from apps.strategies.util import normalize_metrics
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a2c9d0e28'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+COUNTERS = ('subscriber_count', 'rating_sum', 'rating_count', 'bot_count')
+HOT_METRICS = tuple(StrategyPerformanceMetrics.HOT_METRICS)
+
+
+def existing_columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    existing = existing_columns('strategies')
+    missing = [name for name in COUNTERS if name not in existing]
+    for name in missing:
+        op.add_column('strategies', sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+    if missing:
+        backfill_counters()
+
+    existing = existing_columns('strategy_performance_metrics')
+    if 'updated_date' not in existing:
+        op.add_column('strategy_performance_metrics', sa.Column('updated_date', sa.DateTime(), nullable=True))
+    missing = [name for name in HOT_METRICS if name not in existing]
+    for name in missing:
+        op.add_column('strategy_performance_metrics', sa.Column(name, sa.Float(), nullable=True))
+        op.create_index(f'ix_strategy_performance_metrics_{name}', 'strategy_performance_metrics', [name])
+    if missing or 'updated_date' not in existing:
+        backfill_metrics()
+
+
+def backfill_counters():
+    """The UPDATE of `flask strategies repair-counters`, on the migration's connection."""
+    strategies = sa.table('strategies', sa.column('id'), *(sa.column(name) for name in COUNTERS))
+    subscriptions = sa.table('subscriptions', sa.column('id'), sa.column('strategy_id'))
+    reviews = sa.table('strategy_reviews', sa.column('id'), sa.column('strategy_id'), sa.column('rating'))
+    bots = sa.table('trading_bots', sa.column('id'), sa.column('strategy_id'))
+    op.execute(strategies.update().values(
+        subscriber_count=sa.select(sa.func.count(subscriptions.c.id))
+        .where(subscriptions.c.strategy_id == strategies.c.id).scalar_subquery(),
+        rating_sum=sa.select(sa.func.coalesce(sa.func.sum(reviews.c.rating), 0))
+        .where(reviews.c.strategy_id == strategies.c.id).scalar_subquery(),
+        rating_count=sa.select(sa.func.count(reviews.c.id))
+        .where(reviews.c.strategy_id == strategies.c.id).scalar_subquery(),
+        bot_count=sa.select(sa.func.count(bots.c.id))
+        .where(bots.c.strategy_id == strategies.c.id).scalar_subquery(),
+    ))
+
+
+def backfill_metrics():
+    """What `flask strategies normalize-metrics` does for rows without updated_date, on the migration's connection."""
+    metrics_table = sa.table('strategy_performance_metrics', sa.column('id'), sa.column('settings', sa.JSON),
+                             sa.column('metrics', sa.JSON), sa.column('updated_date'),
+                             *(sa.column(name) for name in HOT_METRICS))
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(metrics_table.c.id, metrics_table.c.settings, metrics_table.c.metrics)
+                        .where(metrics_table.c.updated_date.is_(None))).fetchall()
+    now = datetime.utcnow()
+    for row_id, settings, metrics in rows:
+        # Rows written before ingest-time normalization hold JSON text
+        metrics = normalize_metrics((json.loads(metrics) if isinstance(metrics, str) else metrics) or {})
+        values = {'metrics': metrics, 'updated_date': now}
+        if settings is not None:
+            values['settings'] = normalize_metrics(json.loads(settings) if isinstance(settings, str) else settings)
+        for column, key in StrategyPerformanceMetrics.HOT_METRICS.items():
+            value = metrics.get(key)
+            values[column] = float(value) if isinstance(value, (int, float)) else None
+        bind.execute(metrics_table.update().where(metrics_table.c.id == row_id).values(**values))
+
+
+def downgrade():
+    for name in reversed(HOT_METRICS):
+        op.drop_index(f'ix_strategy_performance_metrics_{name}', 'strategy_performance_metrics')
+        op.drop_column('strategy_performance_metrics', name)
+    op.drop_column('strategy_performance_metrics', 'updated_date')
+    for name in reversed(COUNTERS):
+        op.drop_column('strategies', name)
@@ -0,0 +1,29 @@
+"""API token hash on users
+
+Revision ID: 8b4e61d7a9c3
+Revises: 3f1a2c9d0e28
+Create Date: 2026-10-19 12:43:55
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e61d7a9c3'
+down_revision = '3f1a2c9d0e28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'api_token_hash' not in existing:
+        # Stays NULL until the user issues a token through POST /api-token
+        op.add_column('users', sa.Column('api_token_hash', sa.String(length=64), nullable=True))
+        op.create_index('ix_users_api_token_hash', 'users', ['api_token_hash'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_users_api_token_hash', 'users')
+    op.drop_column('users', 'api_token_hash')
@@ -0,0 +1,37 @@
+"""Per-bot webhook secret on trading_bots
+
+Revision ID: c27d9e04f5b1
+Revises: 8b4e61d7a9c3
+Create Date: 2026-10-19 12:47:02
+
+"""
+import secrets
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27d9e04f5b1'
+down_revision = '8b4e61d7a9c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('trading_bots')}
+    if 'webhook_secret' not in existing:
+        op.add_column('trading_bots', sa.Column('webhook_secret', sa.String(length=64), nullable=True))
+    backfill_secrets()
+
+
+def backfill_secrets():
+    """Give every bot without a secret its own, as TradingService.create_bot does for new bots."""
+    bots = sa.table('trading_bots', sa.column('id'), sa.column('webhook_secret'))
+    bind = op.get_bind()
+    for (bot_id,) in bind.execute(sa.select(bots.c.id).where(bots.c.webhook_secret.is_(None))).fetchall():
+        bind.execute(bots.update().where(bots.c.id == bot_id).values(webhook_secret=secrets.token_hex(32)))
+
+
+def downgrade():
+    op.drop_column('trading_bots', 'webhook_secret')
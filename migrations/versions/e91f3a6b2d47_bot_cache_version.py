@@ -0,0 +1,27 @@
+"""Fragment cache version on trading_bots
+
+Revision ID: e91f3a6b2d47
+Revises: c27d9e04f5b1
+Create Date: 2026-10-19 12:52:30
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91f3a6b2d47'
+down_revision = 'c27d9e04f5b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('trading_bots')}
+    if 'cache_version' not in existing:
+        # The server default fills existing rows; any start value works since keys only need to change
+        op.add_column('trading_bots', sa.Column('cache_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('trading_bots', 'cache_version')
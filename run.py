@@ -6,7 +6,6 @@ Copyright (c) 2019 - present AppSeed.us
 import logging
 import os
 from   flask_migrate import Migrate
-from   flask_minify  import Minify
 from   sys import exit
 
 from apps.config import config_dict
@@ -33,12 +32,8 @@ except KeyError:
 app = create_app(app_config)
 Migrate(app, db)
 
-if not DEBUG:
-    Minify(app=app, html=True, js=False, cssless=False)
-    
 if DEBUG:
     app.logger.info('DEBUG            = ' + str(DEBUG)             )
-    app.logger.info('Page Compression = ' + 'FALSE' if DEBUG else 'TRUE' )
     app.logger.info('DBMS             = ' + app_config.SQLALCHEMY_DATABASE_URI)
     app.logger.info('ASSETS_ROOT      = ' + app_config.ASSETS_ROOT )
 